@@ -0,0 +1,158 @@
+# Background jobs for the Gemini-AI Prompt Engineering Toolkit.
+#
+# Long generations, file processing waits and chat replies run on one process-wide worker pool instead of
+# the Streamlit script thread, so reruns and widget interactions no longer block on them or abandon them.
+# Each submission returns a Job handle that the app keeps in session state and polls for status, progress
+# and partial results. Job functions never call st.*; they report through their handle.
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+BACKGROUND_MAX_WORKERS = int(os.getenv("BACKGROUND_MAX_WORKERS", 16))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class JobCancelled(Exception):
+    """Raised from Job.update or Job.check_cancelled inside a job function once its job is cancelled."""
+
+
+class Job:
+    """Handle to one background job: status, progress, partial and final results, and cancellation."""
+
+    def __init__(self, kind, label, key=None, info=None):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.label = label
+        self.key = key
+        self.info = info or {}  # context the submitter wants to render alongside the job
+        self.status = QUEUED
+        self.progress = None  # fraction done, when the job can tell
+        self.message = ""
+        self.partial = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self._future = None
+
+    @classmethod
+    def succeeded(cls, kind, label, result, info=None):
+        """A job that is already finished, for results that need no background work (e.g. read from a local store)."""
+        job = cls(kind, label, info=info)
+        job.result = result
+        job.started_at = job.created_at
+        job._finish(SUCCEEDED)
+        return job
+
+    @property
+    def done(self):
+        return self.status in (SUCCEEDED, FAILED, CANCELLED)
+
+    @property
+    def elapsed(self):
+        """Seconds since the job started running (or was queued, if it hasn't started), until it finished."""
+        return (self.finished_at or time.time()) - (self.started_at or self.created_at)
+
+    def update(self, progress=None, message=None, partial=None):
+        """Reports progress from inside the job function; raises JobCancelled once the job has been cancelled."""
+        if progress is not None:
+            self.progress = progress
+        if message is not None:
+            self.message = message
+        if partial is not None:
+            self.partial = partial
+        self.check_cancelled()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    def cancel(self):
+        """Asks the job to stop. A queued job never starts; a running one stops at its next update.
+
+        A job that finishes without another update keeps its result, so cancelling it comes too late.
+        """
+        self.cancel_event.set()
+        if self._future is not None and self._future.cancel():
+            self._finish(CANCELLED)
+
+    def _finish(self, status):
+        self.finished_at = time.time()
+        self.status = status
+
+    def _run(self, fn, args, kwargs):
+        if self.cancel_event.is_set():
+            self._finish(CANCELLED)
+            return
+        self.started_at = time.time()
+        self.status = RUNNING
+        try:
+            self.result = fn(self, *args, **kwargs)
+        except JobCancelled:
+            self._finish(CANCELLED)
+        except Exception as e:
+            self.error = e
+            self._finish(FAILED)
+        else:
+            self._finish(SUCCEEDED)
+
+
+class JobExecutor:
+    """Process-wide worker pool shared by every session.
+
+    Jobs submitted with a key are deduplicated: while a job with the same key is unfinished, submitting
+    again returns that job, e.g. so two sessions never resume the same dataset at once.
+    """
+
+    def __init__(self, max_workers=BACKGROUND_MAX_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="background-job")
+        self._lock = threading.Lock()
+        self._active = {}  # key -> unfinished Job
+
+    def submit(self, kind, label, fn, *args, key=None, info=None, **kwargs):
+        """Runs fn(job, *args, **kwargs) on the pool and returns the Job handle."""
+        with self._lock:
+            if key is not None:
+                existing = self._active.get(key)
+                if existing is not None and not existing.done:
+                    return existing
+            job = Job(kind, label, key, info)
+            if key is not None:
+                self._active[key] = job
+            job._future = self._pool.submit(job._run, fn, args, kwargs)
+        job._future.add_done_callback(lambda _: self._release(job))
+        return job
+
+    def find(self, key):
+        """Returns the unfinished job with this key, if any."""
+        with self._lock:
+            job = self._active.get(key)
+            return job if job is not None and not job.done else None
+
+    def _release(self, job):
+        with self._lock:
+            if job.key is not None and self._active.get(job.key) is job:
+                del self._active[job.key]
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Returns the process-wide executor, so jobs outlive the script run and session that started them."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = JobExecutor()
+        return _executor
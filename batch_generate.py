@@ -0,0 +1,125 @@
+# Batch prompt generation for the Gemini-AI Prompt Engineering Toolkit.
+#
+# Reads a JSONL file of {"task": ..., "variables": ...} objects (an optional "id" names each task),
+# generates a COT prompt for every task concurrently, and appends one JSON result per line to the output
+# file as soon as it finishes. Tasks whose id already has a successful result in the output are skipped,
+# so an interrupted run picks up where it stopped when started again with the same arguments.
+#
+#     python batch_generate.py tasks.jsonl prompts.jsonl [--concurrency 8] [--model gemini-1.5-pro-exp-0827]
+#
+# With --metrics-port, per-call latency, queue time and token metrics are served for Prometheus while it runs.
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+
+import gemini_toolkit as toolkit
+import metrics
+from gemini_toolkit import GenerationSettings
+
+
+def read_tasks(path, done_ids):
+    """Yields each task in the input file that has no successful result yet. Ids default to the line number."""
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            task = json.loads(line)
+            if isinstance(task, str):
+                task = {"task": task}
+            task.setdefault("id", line_number)
+            if str(task["id"]) not in done_ids:
+                yield task
+
+
+def read_done_ids(path):
+    """Returns the ids that already have a successful result in the output file."""
+    done_ids = set()
+    if not os.path.exists(path):
+        return done_ids
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a partial line left by an interrupted run
+            if record.get("error") is None:
+                done_ids.add(str(record.get("id")))
+    return done_ids
+
+
+def make_record(task, result, error):
+    return {
+        "id": task["id"],
+        "task": task["task"],
+        "variables": task.get("variables", ""),
+        "prompt": result.text if result else None,
+        "cached": result.cached if result else False,
+        "latency_s": round(result.latency, 3) if result and result.latency is not None else None,
+        "ttft_s": round(result.time_to_first_token, 3) if result and result.time_to_first_token is not None else None,
+        "queue_s": round(result.queue_time, 3) if result and result.queue_time is not None else None,
+        "retries": result.retries if result else None,
+        "input_tokens": result.input_tokens if result else None,
+        "output_tokens": result.output_tokens if result else None,
+        "error": str(error) if error else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate COT prompts for a JSONL file of tasks.")
+    parser.add_argument("input", help="JSONL file of {\"task\", \"variables\", \"id\"} objects")
+    parser.add_argument("output", help="JSONL file results are appended to")
+    parser.add_argument("--model", default=toolkit.DEFAULT_MODEL_VERSION)
+    parser.add_argument("--temperature", type=float, default=0.5)
+    parser.add_argument("--max-output-tokens", type=int, default=8192)
+    parser.add_argument("--concurrency", type=int, default=8, help="max requests in flight")
+    parser.add_argument("--api-key", help="defaults to the GEMINI_API_KEY environment variable")
+    parser.add_argument("--cache", default=toolkit.RESPONSE_CACHE_PATH, help="response cache shared with the app")
+    parser.add_argument("--no-cache", action="store_true", help="don't read or write the response cache")
+    parser.add_argument("--refresh", action="store_true", help="ignore cached responses but store the new ones")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this port while running")
+    args = parser.parse_args()
+
+    load_dotenv()
+    api_key = args.api_key or os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        parser.error("no API key: pass --api-key or set GEMINI_API_KEY")
+    toolkit.genai.configure(api_key=api_key)
+
+    cache = None
+    if not args.no_cache:
+        cache = toolkit.open_response_cache(args.cache)
+    settings = GenerationSettings(args.model, args.temperature, args.max_output_tokens)
+    if args.metrics_port:
+        metrics.serve_metrics(args.metrics_port)
+        print(f"Serving metrics on http://localhost:{args.metrics_port}/metrics", file=sys.stderr)
+
+    done_ids = read_done_ids(args.output)
+    if done_ids:
+        print(f"Skipping {len(done_ids)} tasks already in {args.output}", file=sys.stderr)
+
+    start = time.perf_counter()
+    succeeded = failed = 0
+    tasks = read_tasks(args.input, done_ids)
+    with open(args.output, "a", encoding="utf-8") as out:
+        for task, result, error in toolkit.run_prompt_batch(settings, tasks, args.concurrency, cache, args.refresh):
+            out.write(json.dumps(make_record(task, result, error)) + "\n")
+            out.flush()
+            if error:
+                failed += 1
+                print(f"[{task['id']}] failed: {error}", file=sys.stderr)
+            else:
+                succeeded += 1
+            if (succeeded + failed) % 100 == 0:
+                print(f"{succeeded + failed} done ({failed} failed) in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    print(f"Finished: {succeeded} succeeded, {failed} failed in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
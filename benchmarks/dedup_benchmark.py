@@ -0,0 +1,78 @@
+# Near-duplicate index throughput benchmark for the Gemini-AI Prompt Engineering Toolkit.
+#
+# Feeds synthetic conversation pairs, a fraction of them near-duplicates of earlier ones, into a DedupIndex
+# in dataset-sized shards and reports ingestion throughput as the index grows. Fails if throughput at the
+# final size drops below --min-ratio of the throughput at the first checkpoint.
+#
+#     python benchmarks/dedup_benchmark.py [--pairs 100000] [--shard-size 50] [--duplicate-rate 0.2]
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dedup  # noqa: E402
+
+WORDS = (
+    "model prompt data train answer question explain step reason token context window cache stream latency "
+    "batch shard topic pair human assistant example detail summary result method value system user output"
+).split()
+
+
+def make_pair(rng):
+    return {
+        "human": " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))) + "?",
+        "ai": " ".join(rng.choice(WORDS) for _ in range(rng.randint(30, 80))) + ".",
+    }
+
+
+def near_duplicate(pair, rng):
+    words = pair["ai"].split()
+    words[rng.randrange(len(words))] = rng.choice(WORDS)
+    return {"human": pair["human"], "ai": " ".join(words)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pairs", type=int, default=100_000)
+    parser.add_argument("--shard-size", type=int, default=50)
+    parser.add_argument("--duplicate-rate", type=float, default=0.2, help="fraction of pairs that are near-duplicates")
+    parser.add_argument("--checkpoints", type=int, default=5, help="throughput reports over the run")
+    parser.add_argument("--min-ratio", type=float, default=0.5, help="min final/first throughput ratio")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    index = dedup.DedupIndex()
+    history = []
+    fed = duplicates = 0
+    checkpoint = max(args.pairs // args.checkpoints, args.shard_size)
+    window_start, window_pairs = time.perf_counter(), 0
+    rates = []
+    print(f"{'pairs fed':>10}{'index size':>12}{'duplicates':>12}{'pairs/s':>10}")
+    while fed < args.pairs:
+        shard = [
+            near_duplicate(rng.choice(history), rng) if history and rng.random() < args.duplicate_rate else make_pair(rng)
+            for _ in range(args.shard_size)
+        ]
+        kept, _ = index.add([dedup.pair_text(pair) for pair in shard])
+        history.extend(shard[i] for i in kept[:5])  # a sample of kept pairs to duplicate later
+        duplicates += len(shard) - len(kept)
+        fed += len(shard)
+        window_pairs += len(shard)
+        if fed % checkpoint < args.shard_size:
+            rate = window_pairs / (time.perf_counter() - window_start)
+            rates.append(rate)
+            print(f"{fed:>10}{index.size:>12}{duplicates:>12}{rate:>10.0f}")
+            window_start, window_pairs = time.perf_counter(), 0
+
+    ratio = rates[-1] / rates[0]
+    print(f"final/first throughput: {ratio:.2f} (min {args.min_ratio})")
+    if ratio < args.min_ratio:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
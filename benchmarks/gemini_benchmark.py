@@ -0,0 +1,287 @@
+# Offline latency and throughput benchmark for the Gemini-AI Prompt Engineering Toolkit.
+#
+# Runs the app's own generation, upload/activation and file parsing code against the local mock Gemini
+# server in mock_gemini.py, so results cost no quota and carry no network noise. Reports p50/p95/p99
+# latency and throughput per scenario and compares them with a stored baseline, exiting non-zero when a
+# scenario regresses beyond the tolerance.
+#
+#     python benchmarks/gemini_benchmark.py [--iterations 40] [--concurrency 8] [--scenarios generate_prompt,parse_pdf]
+#     python benchmarks/gemini_benchmark.py --save-baseline    # record the current results as the baseline
+
+import argparse
+import io
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import file_processing  # noqa: E402
+import gemini_toolkit as toolkit  # noqa: E402
+from mock_gemini import MockConfig, MockGeminiServer, configure_client  # noqa: E402
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+COMPARED_METRICS = ["p50", "p95"]
+NOISE_FLOOR = 0.005  # seconds; smaller differences are never reported as regressions
+
+
+class UploadedBytes(io.BytesIO):
+    """Minimal stand-in for Streamlit's UploadedFile."""
+
+    def __init__(self, data, name, mime_type):
+        super().__init__(data)
+        self.name = name
+        self.type = mime_type
+
+
+def make_pdf(pages, seed=0):
+    """Builds a text-only PDF with `pages` pages of 40 lines each, without any PDF writing library."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{4 + 2 * page} 0 R" for page in range(pages))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for page in range(pages):
+        lines = " ".join(f"(Document {seed} page {page} line {line} with some ordinary words) Tj 0 -14 Td" for line in range(40))
+        content = f"BT /F1 10 Tf 72 740 Td {lines} ET".encode()
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * page} 0 R >>".encode())
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1) + b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return out
+
+
+def make_csv(rows, seed=0):
+    lines = ["id,name,city,score,notes"]
+    lines.extend(f"{row},user{seed}_{row},city{row % 97},{(row * 7919) % 1000 / 10},some free text for row {row}" for row in range(rows))
+    return ("\n".join(lines) + "\n").encode()
+
+
+def build_scenarios(settings, upload_dir):
+    """Returns {name: (setup(iterations) -> inputs, run(input) -> extra metrics or None, network-bound)}."""
+
+    def generate_prompt(i):
+        toolkit.generate_prompt(settings, f"Write a product description for item {i}", "tone: friendly")
+
+    def generate_prompt_stream(i):
+        result = toolkit.generate_prompt(settings, f"Summarise report {i}", stream=True, on_text=lambda text: None)
+        return {"ttft": result.time_to_first_token}
+
+    def generate_test_data(i):
+        result = toolkit.generate_test_data(settings, f"customer support topic {i}", 20, stream=True)
+        return {"ttft": result.time_to_first_token}
+
+    def setup_uploads(iterations):
+        paths = []
+        for i in range(iterations):
+            path = os.path.join(upload_dir, f"upload_{i}.txt")
+            with open(path, "wb") as f:
+                f.write(os.urandom(16) + b"benchmark upload " * 4096)
+            paths.append(path)
+        return paths
+
+    def upload_pipeline(path):
+        file = toolkit.upload_file(path)
+        toolkit.wait_for_file_active(file.name)
+
+    def parse(uploaded):
+        uploaded.seek(0)
+        file_processing.process_uploaded_file(uploaded, uploaded.type)
+
+    return {
+        "generate_prompt": (range, generate_prompt, True),
+        "generate_prompt_stream": (range, generate_prompt_stream, True),
+        "generate_test_data": (range, generate_test_data, True),
+        "upload_pipeline": (setup_uploads, upload_pipeline, True),
+        "parse_csv": (lambda n: [UploadedBytes(make_csv(50000, i), f"{i}.csv", "text/csv") for i in range(n)], parse, False),
+        # Each document is distinct, so every iteration extracts cold; parse_pdf_cached repeats one document
+        "parse_pdf": (lambda n: [UploadedBytes(make_pdf(100, i), f"{i}.pdf", "application/pdf") for i in range(n)], parse, False),
+        "parse_pdf_cached": (lambda n: [UploadedBytes(make_pdf(100, -1), "cached.pdf", "application/pdf")] * n, parse, False),
+    }
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def summarize(latencies, extras, errors, wall):
+    summary = {"n": len(latencies), "errors": errors, "throughput": len(latencies) / wall if wall else 0.0}
+    if latencies:
+        summary.update(p50=percentile(latencies, 50), p95=percentile(latencies, 95), p99=percentile(latencies, 99), mean=sum(latencies) / len(latencies))
+    ttfts = [extra["ttft"] for extra in extras if extra and extra.get("ttft") is not None]
+    if ttfts:
+        summary.update(ttft_p50=percentile(ttfts, 50), ttft_p95=percentile(ttfts, 95))
+    return summary
+
+
+def run_scenario(setup, run, iterations, concurrency):
+    inputs = list(setup(iterations + 1))
+    # One untimed warm-up call absorbs client set-up, lazy imports and, for parse_pdf_cached, the cold extraction
+    run(inputs.pop(0))
+
+    def timed(item):
+        start = time.perf_counter()
+        extra = run(item)
+        return time.perf_counter() - start, extra
+
+    latencies, extras, errors = [], [], 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in as_completed([executor.submit(timed, item) for item in inputs]):
+            try:
+                latency, extra = future.result()
+            except Exception as e:
+                errors += 1
+                print(f"  error: {e}", file=sys.stderr)
+                continue
+            latencies.append(latency)
+            extras.append(extra)
+    return summarize(latencies, extras, errors, time.perf_counter() - start)
+
+
+def mismatched_parameters(report, baseline, network_bound):
+    """The run parameters a scenario's figures depend on that differ from the baseline's, as "--option value (baseline value)"."""
+    keys = ("iterations", "concurrency") if network_bound else ("parse_iterations",)
+    return [f"--{key.replace('_', '-')} {report[key]} (baseline {baseline.get(key)})" for key in keys if baseline.get(key) != report[key]]
+
+
+def compare(results, baseline, tolerance, skipped=()):
+    """Returns (scenario, metric, baseline, current) for every metric worse than baseline by more than tolerance.
+
+    Scenarios in `skipped`, e.g. run with other parameters than the baseline, are not compared.
+    """
+    regressions = []
+    for name, summary in results.items():
+        reference = baseline.get("results", {}).get(name)
+        if not reference or name in skipped:
+            continue
+        for metric in COMPARED_METRICS:
+            if metric in summary and metric in reference:
+                if summary[metric] > reference[metric] * (1 + tolerance) and summary[metric] - reference[metric] > NOISE_FLOOR:
+                    regressions.append((name, metric, reference[metric], summary[metric]))
+        if reference.get("throughput") and summary["throughput"] < reference["throughput"] / (1 + tolerance):
+            # Compare per-operation time so that sub-millisecond scenarios don't trip on scheduling noise
+            if summary["throughput"] == 0 or 1 / summary["throughput"] - 1 / reference["throughput"] > NOISE_FLOOR:
+                regressions.append((name, "throughput", reference["throughput"], summary["throughput"]))
+        if summary["errors"] > reference.get("errors", 0):
+            regressions.append((name, "errors", reference.get("errors", 0), summary["errors"]))
+    return regressions
+
+
+def print_table(results, baseline, skipped=()):
+    print(f"{'scenario':<24}{'n':>5}{'err':>5}{'p50':>9}{'p95':>9}{'p99':>9}{'ttft p50':>10}{'ops/s':>9}   vs baseline p50")
+    for name, summary in results.items():
+        reference = baseline.get("results", {}).get(name, {}) if baseline and name not in skipped else {}
+        change = f"{summary['p50'] / reference['p50'] - 1:+.0%}" if reference.get("p50") and summary.get("p50") else "-"
+        ttft = f"{summary['ttft_p50']:.3f}" if "ttft_p50" in summary else "-"
+        print(
+            f"{name:<24}{summary['n']:>5}{summary['errors']:>5}{summary.get('p50', 0):>9.3f}{summary.get('p95', 0):>9.3f}"
+            f"{summary.get('p99', 0):>9.3f}{ttft:>10}{summary['throughput']:>9.1f}   {change}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark against a local mock Gemini server.")
+    parser.add_argument("--scenarios", help="comma-separated subset of scenarios (default: all)")
+    parser.add_argument("--iterations", type=int, default=40)
+    parser.add_argument("--parse-iterations", type=int, default=5, help="iterations for the file parsing scenarios")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent calls for the network-bound scenarios")
+    parser.add_argument("--latency", type=float, default=MockConfig.latency)
+    parser.add_argument("--ttft", type=float, default=MockConfig.ttft)
+    parser.add_argument("--chunk-interval", type=float, default=MockConfig.chunk_interval)
+    parser.add_argument("--error-rate", type=float, default=MockConfig.error_rate)
+    parser.add_argument("--error-status", type=int, default=MockConfig.error_status)
+    parser.add_argument("--processing-delay", type=float, default=MockConfig.processing_delay)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="write the results to --baseline instead of comparing")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown before a regression is reported")
+    parser.add_argument("--output", help="also write the results as JSON to this path")
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency=args.latency,
+        ttft=args.ttft,
+        chunk_interval=args.chunk_interval,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        processing_delay=args.processing_delay,
+    )
+    settings = toolkit.GenerationSettings()
+    workdir = tempfile.mkdtemp(prefix="gemini-benchmark-")
+    # file_processing keeps its PDF page cache under the working directory; start every run cold
+    os.chdir(workdir)
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("mock_config") != asdict(config):
+            print("warning: the mock server settings differ from the baseline's; comparisons may be meaningless", file=sys.stderr)
+
+    results = {}
+    with MockGeminiServer(config) as server:
+        configure_client(server)
+        scenarios = build_scenarios(settings, workdir)
+        selected = args.scenarios.split(",") if args.scenarios else list(scenarios)
+        for name in selected:
+            setup, run, network_bound = scenarios[name]
+            iterations = args.iterations if network_bound else args.parse_iterations
+            print(f"running {name} ({iterations} iterations)...", file=sys.stderr)
+            results[name] = run_scenario(setup, run, iterations, args.concurrency if network_bound else 1)
+        scheduler_stats = dict(toolkit.get_scheduler().stats)
+        server_counts = dict(server.counts)
+
+    report = {
+        "mock_config": asdict(config),
+        "iterations": args.iterations,
+        "parse_iterations": args.parse_iterations,
+        "concurrency": args.concurrency,
+        "results": results,
+        "scheduler": scheduler_stats,
+        "server_requests": server_counts,
+    }
+    # Throughput and latency depend on how many calls run and how many at once, so scenarios run with other
+    # parameters than the baseline's are reported but not compared
+    skipped = {}
+    if baseline is not None:
+        for name in results:
+            mismatched = mismatched_parameters(report, baseline, scenarios[name][2])
+            if mismatched:
+                skipped[name] = mismatched
+    print_table(results, baseline, skipped)
+    print(f"scheduler: {scheduler_stats} | server requests: {server_counts}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline written to {args.baseline}")
+        return 0
+    if baseline is None:
+        print("no baseline to compare with; run with --save-baseline to record one")
+        return 0
+    for name, mismatched in skipped.items():
+        print(f"not compared with the baseline: {name} ran with {', '.join(mismatched)}")
+    regressions = compare(results, baseline, args.tolerance, skipped)
+    for name, metric, reference, current in regressions:
+        print(f"REGRESSION {name} {metric}: {reference:.3f} -> {current:.3f}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
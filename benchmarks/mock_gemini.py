@@ -0,0 +1,294 @@
+# Local stand-in for the Gemini REST API, used by the offline benchmarks.
+#
+# Serves generateContent, streamGenerateContent, countTokens, resumable file uploads (via a minimal discovery
+# document) and files.get on 127.0.0.1, with configurable latency, streaming chunk timing, error injection and
+# file processing delays. configure_client() points google.generativeai at it, so the app's own code paths run
+# unchanged and no quota is spent.
+
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+@dataclass
+class MockConfig:
+    latency: float = 0.2  # seconds until a non-streamed response is sent
+    ttft: float = 0.1  # seconds until the first streamed chunk
+    chunk_interval: float = 0.02  # seconds between streamed chunks
+    chunks: int = 10  # chunks per streamed response
+    output_words: int = 200  # words in a generated prompt
+    error_rate: float = 0.0  # fraction of generate calls that fail
+    error_status: int = 429  # 429 (with a retry hint) or a 5xx status
+    retry_delay: float = 0.05  # seconds suggested in 429 responses
+    processing_delay: float = 1.0  # seconds an uploaded file stays PROCESSING
+    upload_latency: float = 0.05
+
+
+ERROR_STATUS_NAMES = {429: "RESOURCE_EXHAUSTED", 500: "INTERNAL", 503: "UNAVAILABLE", 504: "DEADLINE_EXCEEDED"}
+
+
+def generated_text(prompt, config):
+    """Returns a plausible response for the app's prompt templates."""
+    pairs = re.search(r"Generate (\d+) pairs of conversation", prompt)
+    if pairs:
+        return json.dumps([
+            {"human": f"Question {i} about the topic, phrased naturally?", "ai": f"Answer {i}, with a short helpful explanation."}
+            for i in range(int(pairs.group(1)))
+        ])
+    count = re.search(r"List (\d+) distinct, non-overlapping sub-topics", prompt)
+    if count:
+        return json.dumps([f"sub-topic {i}" for i in range(int(count.group(1)))])
+    return " ".join(["Think step by step about the task and explain each step."] * (config.output_words // 10))
+
+
+def prompt_text(body):
+    return " ".join(part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", []))
+
+
+def response_chunk(text, prompt_tokens, output_tokens, finish=False):
+    candidate = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+    if finish:
+        candidate["finishReason"] = "STOP"
+    return {
+        "candidates": [candidate],
+        "usageMetadata": {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": output_tokens,
+            "totalTokenCount": prompt_tokens + output_tokens,
+        },
+    }
+
+
+class MockGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def config(self):
+        return self.server.config
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _maybe_fail(self):
+        if self.config.error_rate and random.random() < self.config.error_rate:
+            status = self.config.error_status
+            error = {"code": status, "message": "Injected error from the mock Gemini server", "status": ERROR_STATUS_NAMES.get(status, "UNKNOWN")}
+            if status == 429:
+                error["details"] = [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": f"{self.config.retry_delay}s"}]
+            self.server.record("errors")
+            self._send_json(status, {"error": error})
+            return True
+        return False
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/$discovery/rest":
+            self._send_json(200, self.server.discovery_document())
+        elif url.path.startswith("/v1beta/files/"):
+            self.server.record("get_file")
+            file = self.server.files.get(url.path[len("/v1beta/"):])
+            if file is None:
+                self._send_json(404, {"error": {"code": 404, "message": "File not found", "status": "NOT_FOUND"}})
+            else:
+                self._send_json(200, self.server.file_resource(file))
+        else:
+            self._send_json(404, {"error": {"code": 404, "message": f"Unknown path {url.path}", "status": "NOT_FOUND"}})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        body = self._read_body()
+        if url.path == "/upload/v1beta/files" and query.get("uploadType") == ["resumable"]:
+            # Resumable upload session: the metadata comes first, the bytes follow with a PUT
+            session = uuid.uuid4().hex
+            self.server.upload_sessions[session] = json.loads(body or b"{}").get("file", {})
+            location = f"{self.server.url}/upload/v1beta/files?uploadType=resumable&upload_id={session}"
+            self._send_json(200, {}, headers={"Location": location})
+        elif url.path.endswith(":countTokens"):
+            self.server.record("count_tokens")
+            request = json.loads(body or b"{}")
+            text = prompt_text(request.get("generateContentRequest", request))
+            self._send_json(200, {"totalTokens": len(text) // 4 + 1})
+        elif ":generateContent" in url.path or ":streamGenerateContent" in url.path:
+            self._generate(json.loads(body or b"{}"), stream=":streamGenerateContent" in url.path)
+        else:
+            self._send_json(404, {"error": {"code": 404, "message": f"Unknown path {url.path}", "status": "NOT_FOUND"}})
+
+    def do_PUT(self):
+        query = parse_qs(urlparse(self.path).query)
+        data = self._read_body()
+        metadata = self.server.upload_sessions.pop((query.get("upload_id") or [""])[0], None)
+        if metadata is None:
+            self._send_json(404, {"error": {"code": 404, "message": "Unknown upload session", "status": "NOT_FOUND"}})
+            return
+        time.sleep(self.config.upload_latency)
+        self.server.record("upload")
+        file = self.server.add_file(metadata, len(data), self.headers.get("Content-Type", "application/octet-stream"))
+        self._send_json(200, {"file": self.server.file_resource(file)})
+
+    def _generate(self, body, stream):
+        self.server.record("stream_generate" if stream else "generate")
+        if self._maybe_fail():
+            return
+        prompt = prompt_text(body)
+        text = generated_text(prompt, self.config)
+        prompt_tokens = len(prompt) // 4 + 1
+        output_tokens = len(text) // 4 + 1
+        if not stream:
+            time.sleep(self.config.latency)
+            self._send_json(200, response_chunk(text, prompt_tokens, output_tokens, finish=True))
+            return
+
+        # The REST transport reads a streamed JSON array of GenerateContentResponse objects
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        size = max(1, -(-len(text) // self.config.chunks))
+        pieces = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+        time.sleep(self.config.ttft)
+        for index, piece in enumerate(pieces):
+            if index:
+                time.sleep(self.config.chunk_interval)
+            last = index == len(pieces) - 1
+            payload = ("[" if index == 0 else ",") + json.dumps(response_chunk(piece, prompt_tokens, output_tokens, finish=last))
+            if last:
+                payload += "]"
+            self._write_chunk(payload.encode("utf-8"))
+        self._write_chunk(b"")
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+class MockGeminiServer(ThreadingHTTPServer):
+    """Threaded mock Gemini API on 127.0.0.1; use as a context manager to run it in a background thread."""
+
+    daemon_threads = True
+
+    def __init__(self, config=None, port=0):
+        super().__init__(("127.0.0.1", port), MockGeminiHandler)
+        self.config = config or MockConfig()
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+        self.files = {}
+        self.upload_sessions = {}
+        self.counts = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def record(self, name):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def add_file(self, metadata, size, mime_type):
+        name = metadata.get("name") or f"files/{uuid.uuid4().hex[:12]}"
+        file = {
+            "name": name,
+            "displayName": metadata.get("displayName", name),
+            "mimeType": mime_type,
+            "sizeBytes": str(size),
+            "created": time.time(),
+        }
+        with self._lock:
+            self.files[name] = file
+        return file
+
+    def file_resource(self, file):
+        processing = time.time() - file["created"] < self.config.processing_delay
+        created = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(file["created"]))
+        expires = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(file["created"] + 48 * 3600))
+        return {
+            "name": file["name"],
+            "displayName": file["displayName"],
+            "mimeType": file["mimeType"],
+            "sizeBytes": file["sizeBytes"],
+            "createTime": created,
+            "updateTime": created,
+            "expirationTime": expires,
+            "uri": f"{self.url}/v1beta/{file['name']}",
+            "state": "PROCESSING" if processing else "ACTIVE",
+        }
+
+    def discovery_document(self):
+        """The smallest discovery document google.generativeai needs to build its media.upload call."""
+        return {
+            "kind": "discovery#restDescription",
+            "discoveryVersion": "v1",
+            "id": "generativelanguage:v1beta",
+            "name": "generativelanguage",
+            "version": "v1beta",
+            "rootUrl": f"{self.url}/",
+            "servicePath": "",
+            "batchPath": "batch",
+            "parameters": {
+                "key": {"type": "string", "location": "query"},
+                "alt": {"type": "string", "location": "query", "default": "json", "enum": ["json", "media", "proto"]},
+            },
+            "resources": {
+                "media": {
+                    "methods": {
+                        "upload": {
+                            "id": "generativelanguage.media.upload",
+                            "path": "v1beta/files",
+                            "flatPath": "v1beta/files",
+                            "httpMethod": "POST",
+                            "parameters": {},
+                            "parameterOrder": [],
+                            "request": {"$ref": "CreateFileRequest"},
+                            "response": {"$ref": "CreateFileResponse"},
+                            "supportsMediaUpload": True,
+                            "mediaUpload": {
+                                "accept": ["*/*"],
+                                "protocols": {
+                                    "simple": {"multipart": True, "path": "/upload/v1beta/files"},
+                                    "resumable": {"multipart": True, "path": "/upload/v1beta/files"},
+                                },
+                            },
+                        }
+                    }
+                }
+            },
+            "schemas": {
+                "CreateFileRequest": {"id": "CreateFileRequest", "type": "object", "properties": {"file": {"type": "object"}}},
+                "CreateFileResponse": {"id": "CreateFileResponse", "type": "object", "properties": {"file": {"type": "object"}}},
+            },
+        }
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+
+def configure_client(server, api_key="mock-key"):
+    """Points google.generativeai's generate, files and upload clients at the mock server."""
+    import google.generativeai as genai
+    import google.generativeai.client as genai_client
+
+    genai_client.GENAI_API_DISCOVERY_URL = f"{server.url}/$discovery/rest"
+    genai.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": server.url})
@@ -0,0 +1,73 @@
+# Startup and rerun time benchmark for the Gemini-AI Prompt Engineering Toolkit.
+#
+# Runs the app headlessly with Streamlit's AppTest while all network access is blocked, and fails
+# if the script raises, or if the cold start or the median rerun exceeds its time budget.
+#
+#     python benchmarks/startup_benchmark.py [--cold-budget 3.0] [--rerun-budget 0.5] [--reruns 10]
+
+import argparse
+import os
+import socket
+import statistics
+import sys
+import time
+
+from streamlit.testing.v1 import AppTest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(REPO_ROOT, "v1.90-gemini-prompt-engineer.py")
+HEAVY_MODULES = ["google.generativeai", "pandas", "PyPDF2", "langsmith", "tiktoken"]
+
+
+def block_network():
+    """Makes any outbound connection fail, so a startup that touches the network errors out."""
+    def refuse(*args, **kwargs):
+        raise ConnectionRefusedError("network access is blocked during the startup benchmark")
+    socket.socket.connect = refuse
+    socket.create_connection = refuse
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cold-budget", type=float, default=3.0, help="max seconds for the first run")
+    parser.add_argument("--rerun-budget", type=float, default=0.5, help="max median seconds per rerun")
+    parser.add_argument("--reruns", type=int, default=10)
+    args = parser.parse_args()
+
+    # The app resolves media/ and its cache folders relative to the working directory
+    os.chdir(REPO_ROOT)
+    block_network()
+
+    app = AppTest.from_file(APP_PATH, default_timeout=60)
+    start = time.perf_counter()
+    app.run()
+    cold = time.perf_counter() - start
+    if app.exception:
+        print(f"FAIL: app raised on startup: {app.exception[0].value}")
+        return 1
+    # Modules still behind importlib's LazyLoader have not actually been executed yet
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules and type(sys.modules[name]).__name__ != "_LazyModule"]
+
+    reruns = []
+    for _ in range(args.reruns):
+        start = time.perf_counter()
+        app.run()
+        reruns.append(time.perf_counter() - start)
+    rerun = statistics.median(reruns)
+
+    print(f"cold start: {cold:.3f}s (budget {args.cold_budget:.3f}s)")
+    print(f"rerun p50:  {rerun:.3f}s (budget {args.rerun_budget:.3f}s), max {max(reruns):.3f}s")
+    print(f"heavy modules imported at startup: {', '.join(loaded) or 'none'}")
+
+    failed = False
+    if cold > args.cold_budget:
+        print("FAIL: cold start is over budget")
+        failed = True
+    if rerun > args.rerun_budget:
+        print("FAIL: rerun time is over budget")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
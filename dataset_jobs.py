@@ -0,0 +1,381 @@
+# Resumable dataset generation jobs for the Gemini-AI Prompt Engineering Toolkit.
+#
+# A dataset job generates conversation pairs as concurrent, sub-topic seeded shards and checkpoints each
+# completed shard to disk under DATASETS_FOLDER: the pairs to <job_id>.jsonl, their MinHash signatures to
+# <job_id>.minhash and the shard plan and progress to <job_id>.json. An interrupted job resumes from its last
+# checkpoint, in this process or another. Exports are streamed from the JSONL file into DATASET_EXPORTS_FOLDER.
+# Nothing here depends on Streamlit; job bodies report progress through a background_jobs.Job handle.
+
+import gzip
+import importlib.util
+import io
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict
+
+import gemini_toolkit as toolkit
+from gemini_toolkit import GenerationSettings, lazy_import
+
+pd = lazy_import("pandas")
+dedup = lazy_import("dedup")  # numpy
+
+# Optional compression for dataset exports
+zstandard = lazy_import("zstandard") if importlib.util.find_spec("zstandard") else None
+
+DATASETS_FOLDER = "datasets"
+DATASET_EXPORTS_FOLDER = os.path.join(DATASETS_FOLDER, "exports")
+
+# Sharded dataset generation settings (shard sizing lives in gemini_toolkit)
+DATASET_MAX_CONCURRENCY = int(os.getenv("DATASET_MAX_CONCURRENCY", 4))
+DATASET_TOP_UP_ROUNDS = 3  # extra rounds for pairs still missing after the planned shards (dropped duplicates, failures)
+
+# Dataset export formats: label -> (file extension, MIME type)
+DATASET_EXPORT_FORMATS = {
+    "JSON": (".json", "application/json"),
+    "JSONL": (".jsonl", "application/jsonl"),
+    "JSONL (gzip)": (".jsonl.gz", "application/gzip"),
+}
+if zstandard is not None:
+    DATASET_EXPORT_FORMATS["JSONL (zstd)"] = (".jsonl.zst", "application/zstd")
+if importlib.util.find_spec("pyarrow"):  # pandas' Parquet engine
+    DATASET_EXPORT_FORMATS["Parquet"] = (".parquet", "application/vnd.apache.parquet")
+
+
+class DatasetJob:
+    """A dataset generation job checkpointed to disk.
+
+    Validated shards are appended to <job_id>.jsonl as they complete and the shard plan and progress are
+    saved to <job_id>.json after each one, so an interrupted job resumes from the last completed shard.
+    Near-duplicates of pairs already in the dataset are dropped from each shard; the MinHash signatures
+    of the kept pairs are appended to <job_id>.minhash and checkpointed with them.
+    """
+
+    def __init__(self, manifest):
+        self.manifest = manifest
+        self._dedup_index = None
+
+    @property
+    def job_id(self):
+        return self.manifest["job_id"]
+
+    @property
+    def data_path(self):
+        return os.path.join(DATASETS_FOLDER, f"{self.job_id}.jsonl")
+
+    @property
+    def manifest_path(self):
+        return os.path.join(DATASETS_FOLDER, f"{self.job_id}.json")
+
+    @property
+    def signatures_path(self):
+        return os.path.join(DATASETS_FOLDER, f"{self.job_id}.minhash")
+
+    @property
+    def pairs_written(self):
+        return self.manifest["pairs_written"]
+
+    @property
+    def is_complete(self):
+        return self.manifest["status"] == "complete"
+
+    @classmethod
+    def create(cls, topic, num_pairs, settings):
+        job = cls({
+            "job_id": uuid.uuid4().hex[:12],
+            "topic": topic,
+            "num_pairs": num_pairs,
+            "settings": asdict(settings),
+            "status": "running",
+            "created_at": time.time(),
+            "tokens_per_pair": None,
+            "subtopics": None,
+            "top_up_rounds": 0,
+            "shards": [],
+            "pairs_written": 0,
+            "bytes_written": 0,
+            "duplicates": 0,
+            "signature_bytes": 0,
+        })
+        os.makedirs(DATASETS_FOLDER, exist_ok=True)
+        open(job.data_path, "wb").close()
+        open(job.signatures_path, "wb").close()
+        job.save()
+        return job
+
+    @classmethod
+    def load(cls, job_id):
+        with open(os.path.join(DATASETS_FOLDER, f"{job_id}.json"), encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    @classmethod
+    def list_jobs(cls):
+        manifests = []
+        if not os.path.isdir(DATASETS_FOLDER):
+            return manifests
+        for name in os.listdir(DATASETS_FOLDER):
+            if name.endswith(".json"):
+                with open(os.path.join(DATASETS_FOLDER, name), encoding="utf-8") as f:
+                    manifests.append(json.load(f))
+        return sorted(manifests, key=lambda manifest: manifest["created_at"], reverse=True)
+
+    def save(self):
+        # Write-then-rename so a crash never leaves a half-written checkpoint
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def add_shards(self, sizes, subtopics=None):
+        first_index = len(self.manifest["shards"])
+        for offset, size in enumerate(sizes):
+            subtopic = subtopics[(first_index + offset) % len(subtopics)] if subtopics else None
+            self.manifest["shards"].append({"index": first_index + offset, "size": size, "subtopic": subtopic, "status": "pending"})
+        self.save()
+
+    def rollback_to_checkpoint(self):
+        """Drops anything appended after the last checkpoint (e.g. a shard interrupted mid-write)."""
+        with open(self.data_path, "r+b") as f:
+            f.truncate(self.manifest["bytes_written"])
+        if os.path.exists(self.signatures_path):
+            with open(self.signatures_path, "r+b") as f:
+                f.truncate(self.manifest.get("signature_bytes", 0))
+        self._dedup_index = None
+
+    def dedup_index(self):
+        """The near-duplicate index of the pairs written so far, loaded from <job_id>.minhash.
+
+        Jobs from before deduplication, or with a signature file that doesn't match the checkpoint, are
+        indexed from their JSONL file instead.
+        """
+        if self._dedup_index is None:
+            signature_bytes = self.manifest.get("signature_bytes")
+            if signature_bytes == self.pairs_written * dedup.SIGNATURE_BYTES and os.path.exists(self.signatures_path) \
+                    and os.path.getsize(self.signatures_path) >= signature_bytes:
+                signatures = dedup.load_signatures(self.signatures_path, self.pairs_written)
+            else:
+                signatures = dedup.signatures([dedup.pair_text(pair) for pair in self.read_pairs(limit=self.pairs_written)])
+                with open(self.signatures_path, "wb") as f:
+                    f.write(dedup.signature_bytes(signatures))
+                self.manifest["signature_bytes"] = len(signatures) * dedup.SIGNATURE_BYTES
+                self.save()
+            self._dedup_index = dedup.DedupIndex(signatures)
+        return self._dedup_index
+
+    def pending_shards(self):
+        return [shard for shard in self.manifest["shards"] if shard["status"] == "pending"]
+
+    def complete_shard(self, shard, pairs, tokens_per_pair=None):
+        """Appends the shard's pairs, minus near-duplicates of earlier pairs, and checkpoints the job."""
+        kept, signatures = self.dedup_index().add([dedup.pair_text(pair) for pair in pairs])
+        duplicates = len(pairs) - len(kept)
+        pairs = [pairs[index] for index in kept]
+        data = "".join(json.dumps(pair) + "\n" for pair in pairs).encode("utf-8")
+        signature_data = dedup.signature_bytes(signatures)
+        for path, chunk in ((self.data_path, data), (self.signatures_path, signature_data)):
+            with open(path, "ab") as f:
+                f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+        shard["status"] = "done"
+        shard["pairs"] = len(pairs)
+        shard["duplicates"] = duplicates
+        self.manifest["pairs_written"] += len(pairs)
+        self.manifest["bytes_written"] += len(data)
+        self.manifest["duplicates"] = self.manifest.get("duplicates", 0) + duplicates
+        self.manifest["signature_bytes"] = self.pairs_written * dedup.SIGNATURE_BYTES
+        if tokens_per_pair and not self.manifest["tokens_per_pair"]:
+            self.manifest["tokens_per_pair"] = tokens_per_pair
+        self.save()
+
+    def fail_shard(self, shard, error):
+        shard["status"] = "failed"
+        shard["error"] = str(error)
+        self.save()
+
+    def finish(self):
+        self.manifest["status"] = "complete"
+        self.save()
+
+    def read_pairs(self, limit=None):
+        """Yields the job's checkpointed pairs from disk, up to `limit` pairs (by default, the requested number)."""
+        limit = self.manifest["num_pairs"] if limit is None else limit
+        remaining_bytes = self.manifest["bytes_written"]
+        with open(self.data_path, "rb") as f:
+            for count, line in enumerate(f):
+                remaining_bytes -= len(line)
+                if count >= limit or remaining_bytes < 0:
+                    break
+                yield json.loads(line)
+
+    def duplicate_summary(self):
+        """Describes the near-duplicates dropped so far, or returns None if there were none."""
+        duplicates = self.manifest.get("duplicates", 0)
+        if not duplicates:
+            return None
+        generated = self.pairs_written + duplicates
+        return f"Dropped {duplicates} near-duplicate pairs ({duplicates / generated:.1%} of {generated} generated)."
+
+
+def export_dataset(job, export_format):
+    """Writes the job's pairs to an export file, streaming from its JSONL, and returns the file path.
+
+    Exports are named after the checkpointed pair count, so an unchanged job is only exported once per format.
+    Writing a newer export removes the job's older ones in that format.
+    """
+    extension, _ = DATASET_EXPORT_FORMATS[export_format]
+    name = f"{job.job_id}-{job.pairs_written}{extension}"
+    path = os.path.join(DATASET_EXPORTS_FOLDER, name)
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(DATASET_EXPORTS_FOLDER, exist_ok=True)
+    tmp_path = path + ".tmp"
+    if export_format == "JSON":
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("[")
+            for index, pair in enumerate(job.read_pairs()):
+                f.write(",\n  " if index else "\n  ")
+                f.write(json.dumps(pair))
+            f.write("\n]\n")
+    elif export_format == "Parquet":
+        pd.DataFrame.from_records(job.read_pairs(), columns=["human", "ai"]).to_parquet(tmp_path, index=False)
+    else:
+        if export_format == "JSONL (gzip)":
+            f = gzip.open(tmp_path, "wt", encoding="utf-8")
+        elif export_format == "JSONL (zstd)":
+            f = io.TextIOWrapper(zstandard.ZstdCompressor().stream_writer(open(tmp_path, "wb")), encoding="utf-8")
+        else:
+            f = open(tmp_path, "w", encoding="utf-8")
+        with f:
+            for pair in job.read_pairs():
+                f.write(json.dumps(pair) + "\n")
+    os.replace(tmp_path, path)
+    for stale_name in os.listdir(DATASET_EXPORTS_FOLDER):
+        pairs = stale_name[len(job.job_id) + 1:-len(extension)]
+        if stale_name.startswith(f"{job.job_id}-") and stale_name.endswith(extension) and pairs.isdigit() and stale_name != name:
+            try:
+                os.remove(os.path.join(DATASET_EXPORTS_FOLDER, stale_name))
+            except FileNotFoundError:
+                pass  # removed by another session's export
+    return path
+
+
+def read_dataset_export(job, export_format):
+    """Download-button callback: exports on first click and returns the file contents."""
+    with open(export_dataset(job, export_format), "rb") as f:
+        return f.read()
+
+
+def run_dataset_job(job, concurrency=DATASET_MAX_CONCURRENCY, cache=None, bypass_cache=False, on_shard=None):
+    """Runs (or resumes) a dataset job as concurrent, sub-topic seeded shards and returns warnings to show with it.
+
+    `on_shard(completed_shards, total_shards, total_pairs)` is called on the calling thread after each shard;
+    if it raises, shards that haven't started are dropped. Shard threads only generate; all checkpoint
+    writes happen on the calling thread.
+    """
+    settings = GenerationSettings(**job.manifest["settings"])
+    num_pairs = job.manifest["num_pairs"]
+
+    job.rollback_to_checkpoint()
+    if not job.manifest["shards"]:
+        # Calibrate the shard size on a first shard, using its measured output tokens per pair
+        job.add_shards(toolkit.plan_shards(num_pairs, toolkit.DATASET_TOKENS_PER_PAIR_ESTIMATE, settings.max_output_tokens)[:1])
+
+    failed = 0
+    while True:
+        pending = job.pending_shards()
+        if not pending:
+            remaining = num_pairs - job.pairs_written
+            # The first round after the calibration shard plans the dataset; only later rounds are top-ups
+            top_up = job.manifest["subtopics"] is not None
+            if remaining <= 0 or (top_up and job.manifest["top_up_rounds"] >= DATASET_TOP_UP_ROUNDS):
+                break
+            tokens_per_pair = job.manifest["tokens_per_pair"] or toolkit.DATASET_TOKENS_PER_PAIR_ESTIMATE
+            sizes = toolkit.plan_shards(remaining, tokens_per_pair, settings.max_output_tokens)
+            if top_up:
+                job.manifest["top_up_rounds"] += 1
+            else:
+                job.manifest["subtopics"] = toolkit.generate_subtopics(settings, job.manifest["topic"], len(sizes), priority=toolkit.BATCH)
+            job.add_shards(sizes, job.manifest["subtopics"])
+            continue
+
+        calibrating = job.manifest["tokens_per_pair"] is None and job.pairs_written == 0
+        batch = pending[:1] if calibrating else pending
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            futures = {
+                executor.submit(
+                    toolkit.generate_test_data, settings, job.manifest["topic"], shard["size"], shard["subtopic"], cache, bypass_cache,
+                    priority=toolkit.BATCH,
+                ): shard
+                for shard in batch
+            }
+            try:
+                for future in as_completed(futures):
+                    shard = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        job.fail_shard(shard, e)
+                        if calibrating:
+                            # Nothing has worked yet (bad key, quota, ...); stop instead of fanning out more calls
+                            raise
+                        failed += 1
+                    else:
+                        job.complete_shard(shard, result.pairs, result.tokens_per_pair)
+                    if on_shard is not None:
+                        shards = job.manifest["shards"]
+                        on_shard(sum(shard["status"] != "pending" for shard in shards), len(shards), job.pairs_written)
+            except BaseException:
+                # Don't start queued shards; the job resumes from its last checkpoint
+                executor.shutdown(cancel_futures=True)
+                raise
+
+    job.finish()
+    warnings = []
+    if failed:
+        warnings.append(f"{failed} shard(s) failed; the dataset has {min(job.pairs_written, num_pairs)} of the {num_pairs} requested pairs.")
+    elif job.pairs_written < num_pairs:
+        warnings.append(f"Generated {job.pairs_written} of the {num_pairs} requested pairs.")
+    return warnings
+
+
+def run_dataset_background(handle, job, concurrency, cache, bypass_cache, stream):
+    """Background job body: generates (or resumes) a dataset job, reporting progress through the job handle.
+
+    A new job small enough for one completion is generated in a single streamed request, with progress
+    per parsed pair; anything else is sharded by run_dataset_job. Returns warnings to show with the job.
+    """
+    num_pairs = job.manifest["num_pairs"]
+    if job.manifest["shards"] or num_pairs > toolkit.DATASET_MAX_PAIRS_PER_SHARD:
+        handle.update(message="Resuming..." if job.manifest["shards"] else "Calibrating shard size...")
+        return run_dataset_job(
+            job, concurrency, cache, bypass_cache,
+            on_shard=lambda completed, total, count: handle.update(completed / total, f"Shard {completed} of {total} done, {count} pairs so far"),
+        )
+
+    handle.update(0.0, "Waiting for the first pair...")
+    job.add_shards([num_pairs])
+    result = toolkit.generate_test_data(
+        GenerationSettings(**job.manifest["settings"]),
+        job.manifest["topic"],
+        num_pairs,
+        cache=cache,
+        bypass_cache=bypass_cache,
+        stream=stream,
+        on_pair=lambda pair, count: handle.update(count / num_pairs, f"Received {count} of {num_pairs} pairs"),
+    )
+    job.complete_shard(job.pending_shards()[0], result.pairs)
+    warnings = []
+    if result.truncated:
+        warnings.append(f"The response was cut off; kept the {len(result.pairs)} complete pairs.")
+    if result.invalid:
+        warnings.append(f"Skipped {result.invalid} objects without 'human' and 'ai' text.")
+    if job.pairs_written < num_pairs:
+        # Top up the pairs lost to truncation or near-duplicates with sub-topic seeded shards
+        handle.update(message="Topping up...")
+        return warnings + run_dataset_job(job, concurrency, cache, bypass_cache)
+    job.finish()
+    return warnings
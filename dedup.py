@@ -0,0 +1,148 @@
+# Near-duplicate detection for generated datasets.
+#
+# Each conversation pair is reduced to a MinHash signature over hashed word shingles, computed with numpy for
+# a whole batch of pairs at once. Signatures are split into LSH bands; a new pair that shares a band bucket
+# with a kept pair is a candidate, and counts as a duplicate when the Jaccard similarity estimated from the
+# two signatures reaches DUPLICATE_THRESHOLD. Bucket keys live in sorted runs that are merged as they grow,
+# so checking a pair costs a few binary searches whether the dataset holds a hundred pairs or 100,000.
+# Signatures are stored as raw little-endian uint32 rows, so a dataset's index can be appended to and
+# checkpointed alongside its JSONL file.
+
+import re
+import zlib
+
+import numpy as np
+
+NUM_PERM = 64
+BANDS = 16  # 4 rows per band: pairs from about 50% similar on become candidates
+DUPLICATE_THRESHOLD = 0.8  # estimated Jaccard similarity of two pairs' shingle sets
+SHINGLE_WORDS = 3
+HASH_BATCH_SIZE = 500  # pairs hashed per numpy pass, bounding temporary memory
+SIGNATURE_BYTES = NUM_PERM * 4
+
+# Fixed seed: signatures are persisted, so every process must use the same permutations
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240827)
+_PERM_A = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.uint64)
+_BAND_MIX = _rng.integers(1, 1 << 63, 2, dtype=np.uint64) | np.uint64(1)
+_BAND_SALT = _rng.integers(0, 1 << 63, BANDS, dtype=np.uint64)
+
+TERM_PATTERN = re.compile(r"\w+")
+
+
+def pair_text(pair):
+    return f"{pair['human']}\n{pair['ai']}"
+
+
+def shingles(text):
+    """Lowercased word SHINGLE_WORDS-grams of text; shorter texts are a single shingle."""
+    words = TERM_PATTERN.findall(text.lower())
+    if len(words) <= SHINGLE_WORDS:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def signatures(texts):
+    """MinHash signatures of the texts' shingle sets, as a (len(texts), NUM_PERM) uint32 array."""
+    result = np.empty((len(texts), NUM_PERM), dtype=np.uint32)
+    for start in range(0, len(texts), HASH_BATCH_SIZE):
+        hashes = [
+            np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles(text)), dtype=np.uint64)
+            for text in texts[start:start + HASH_BATCH_SIZE]
+        ]
+        offsets = np.cumsum([0] + [len(shingle_hashes) for shingle_hashes in hashes[:-1]])
+        flat = np.concatenate(hashes) % _PRIME
+        # (a * x + b) mod p for every permutation and shingle at once; every set has at least one shingle
+        permuted = (_PERM_A[:, None] * flat[None, :] + _PERM_B[:, None]) % _PRIME
+        result[start:start + len(hashes)] = np.minimum.reduceat(permuted, offsets, axis=1).T
+    return result
+
+
+def band_keys(signatures):
+    """One uint64 LSH bucket key per (pair, band), distinct across bands."""
+    halves = np.ascontiguousarray(signatures).reshape(len(signatures), BANDS, NUM_PERM // BANDS).view(np.uint64)
+    return halves[..., 0] * _BAND_MIX[0] + halves[..., 1] * _BAND_MIX[1] + _BAND_SALT
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of the shingle sets behind two signatures (or rows of them)."""
+    return np.mean(a == b, axis=-1)
+
+
+class DedupIndex:
+    """MinHash LSH index of the pairs kept so far.
+
+    Bucket keys are kept in sorted runs, each with the ids of the pairs they came from. A new run is merged
+    into the previous one while that is at most twice its size, so there are O(log n) runs and each key is
+    re-sorted O(log n) times.
+    """
+
+    def __init__(self, signatures=None):
+        self._signatures = np.empty((0, NUM_PERM), dtype=np.uint32)
+        self.size = 0
+        self._runs = []  # (sorted keys, pair ids)
+        if signatures is not None and len(signatures):
+            self._append(signatures)
+
+    def _append(self, new_signatures):
+        if self.size + len(new_signatures) > len(self._signatures):
+            grown = np.empty((max(2 * len(self._signatures), self.size + len(new_signatures)), NUM_PERM), dtype=np.uint32)
+            grown[:self.size] = self._signatures[:self.size]
+            self._signatures = grown
+        self._signatures[self.size:self.size + len(new_signatures)] = new_signatures
+        ids = np.repeat(np.arange(self.size, self.size + len(new_signatures), dtype=np.int64), BANDS)
+        self.size += len(new_signatures)
+
+        run = (band_keys(new_signatures).ravel(), ids)
+        while self._runs and len(self._runs[-1][0]) <= 2 * len(run[0]):
+            previous = self._runs.pop()
+            run = (np.concatenate([previous[0], run[0]]), np.concatenate([previous[1], run[1]]))
+        order = np.argsort(run[0], kind="stable")
+        self._runs.append((run[0][order], run[1][order]))
+
+    def _match(self, new_signatures, keys):
+        """Flags rows that are near-duplicates of an indexed pair, checking the first pair in each shared bucket."""
+        duplicate = np.zeros(len(new_signatures), dtype=bool)
+        flat_keys = keys.ravel()
+        rows = np.repeat(np.arange(len(new_signatures)), BANDS)
+        for run_keys, run_ids in self._runs:
+            positions = np.minimum(np.searchsorted(run_keys, flat_keys), len(run_keys) - 1)
+            hits = np.flatnonzero(run_keys[positions] == flat_keys)
+            if len(hits):
+                hit_rows = rows[hits]
+                similar = similarity(new_signatures[hit_rows], self._signatures[run_ids[positions[hits]]]) >= DUPLICATE_THRESHOLD
+                duplicate[hit_rows[similar]] = True
+        return duplicate
+
+    def add(self, texts):
+        """Indexes the texts that are not near-duplicates of an indexed text or of an earlier text in the batch.
+
+        Returns (indices of the kept texts, their signatures).
+        """
+        new_signatures = signatures(texts)
+        keys = band_keys(new_signatures)
+        duplicate = self._match(new_signatures, keys) if self.size else np.zeros(len(texts), dtype=bool)
+        buckets = {}  # bucket key -> first kept row in this batch
+        kept = []
+        for row in np.flatnonzero(~duplicate).tolist():
+            row_keys = keys[row].tolist()
+            candidates = {buckets[key] for key in row_keys if key in buckets}
+            if any(similarity(new_signatures[row], new_signatures[other]) >= DUPLICATE_THRESHOLD for other in candidates):
+                continue
+            for key in row_keys:
+                buckets.setdefault(key, row)
+            kept.append(row)
+        kept_signatures = new_signatures[kept]
+        if kept:
+            self._append(kept_signatures)
+        return kept, kept_signatures
+
+
+def signature_bytes(signatures):
+    return np.ascontiguousarray(signatures, dtype="<u4").tobytes()
+
+
+def load_signatures(path, count):
+    """Reads the first `count` signatures from a file of signature_bytes() rows."""
+    return np.fromfile(path, dtype="<u4", count=count * NUM_PERM).reshape(-1, NUM_PERM).astype(np.uint32)
@@ -0,0 +1,99 @@
+# Prompt evaluation for the Gemini-AI Prompt Engineering Toolkit, from the command line.
+#
+# Fills a prompt template's variable placeholders from each row of a JSON or JSONL conversation dataset,
+# runs every row through Gemini concurrently under the shared rate limits, scores the outputs against the
+# rows' expected responses and writes one JSON result per row to the output file as soon as it finishes.
+# Aggregate scores are printed as the run goes and at the end.
+#
+#     python evaluate_prompt.py prompt.txt dataset.jsonl results.jsonl [--variables question] [--concurrency 16]
+#
+# With --metrics-port, per-call latency, queue time and token metrics are served for Prometheus while it runs.
+
+import argparse
+import json
+import os
+import sys
+
+from dotenv import load_dotenv
+
+import evaluation
+import gemini_toolkit as toolkit
+import metrics
+from gemini_toolkit import GenerationSettings
+
+
+def format_summary(summary):
+    scores = ", ".join(
+        f"{name[len('mean_'):]} {value:.3f}" for name, value in summary.items() if name.startswith("mean_") and value is not None
+    )
+    return (
+        f"{summary['rows']} of {summary['total']} rows ({summary['failed']} failed) in {summary['elapsed_s']:.1f}s"
+        + (f" | {scores}" if scores else "")
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a prompt template against a JSON or JSONL dataset.")
+    parser.add_argument("template", help="text file with the prompt template")
+    parser.add_argument("dataset", help="JSON array or JSONL file of rows, e.g. {\"human\", \"ai\"} conversation pairs")
+    parser.add_argument("output", help="JSONL file the per-row results are written to")
+    parser.add_argument("--variables", default="", help="comma-separated variables filled with each row's input")
+    parser.add_argument("--metrics", default=",".join(evaluation.SCORERS), help="comma-separated metrics to score")
+    parser.add_argument("--input-field", default=evaluation.INPUT_FIELD)
+    parser.add_argument("--expected-field", default=evaluation.EXPECTED_FIELD)
+    parser.add_argument("--limit", type=int, help="evaluate only the first LIMIT rows")
+    parser.add_argument("--model", default=toolkit.DEFAULT_MODEL_VERSION)
+    parser.add_argument("--temperature", type=float, default=0.5)
+    parser.add_argument("--max-output-tokens", type=int, default=8192)
+    parser.add_argument("--concurrency", type=int, default=evaluation.EVALUATION_CONCURRENCY, help="max requests in flight")
+    parser.add_argument("--api-key", help="defaults to the GEMINI_API_KEY environment variable")
+    parser.add_argument("--cache", default=toolkit.RESPONSE_CACHE_PATH, help="response cache shared with the app")
+    parser.add_argument("--no-cache", action="store_true", help="don't read or write the response cache")
+    parser.add_argument("--refresh", action="store_true", help="ignore cached responses but store the new ones")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this port while running")
+    args = parser.parse_args()
+
+    metric_names = [name.strip() for name in args.metrics.split(",") if name.strip()]
+    unknown = [name for name in metric_names if name not in evaluation.SCORERS]
+    if unknown:
+        parser.error(f"unknown metrics: {', '.join(unknown)} (available: {', '.join(evaluation.SCORERS)})")
+
+    load_dotenv()
+    api_key = args.api_key or os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        parser.error("no API key: pass --api-key or set GEMINI_API_KEY")
+    toolkit.genai.configure(api_key=api_key)
+
+    cache = None
+    if not args.no_cache:
+        cache = toolkit.open_response_cache(args.cache)
+    settings = GenerationSettings(args.model, args.temperature, args.max_output_tokens)
+    if args.metrics_port:
+        metrics.serve_metrics(args.metrics_port)
+        print(f"Serving metrics on http://localhost:{args.metrics_port}/metrics", file=sys.stderr)
+
+    with open(args.template, encoding="utf-8") as f:
+        template = f.read()
+    with open(args.dataset, "rb") as f:
+        rows = evaluation.parse_dataset(f.read())[:args.limit]
+
+    summary = evaluation.EvaluationSummary(metric_names, total=len(rows))
+    records = evaluation.run_evaluation(
+        settings, template, rows, args.variables, metric_names, args.concurrency, cache, args.refresh, args.input_field, args.expected_field
+    )
+    with open(args.output, "w", encoding="utf-8") as out:
+        for record in records:
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            summary.add(record)
+            if record["error"]:
+                print(f"[{record['row']}] failed: {record['error']}", file=sys.stderr)
+            if summary.rows % 100 == 0:
+                print(format_summary(summary.as_dict()), file=sys.stderr)
+
+    print(f"Finished: {format_summary(summary.as_dict())}", file=sys.stderr)
+    return 1 if summary.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+# Prompt evaluation for the Gemini-AI Prompt Engineering Toolkit.
+#
+# Scores a prompt template against a conversation dataset: each row's fields fill the template's variable
+# placeholders, every row runs through Gemini concurrently at batch priority (so the shared scheduler's rate
+# limits and retries apply), and each output is scored against the row's expected response with local
+# metrics. Results are yielded as rows finish and folded into an EvaluationSummary, so aggregate scores can
+# be shown while the run goes on. Metrics are plain functions of (output, expected) registered with @scorer.
+
+import json
+import re
+import time
+from collections import Counter
+
+import gemini_toolkit as toolkit
+import metrics
+from gemini_toolkit import GenerationResult
+
+INPUT_FIELD = "human"
+EXPECTED_FIELD = "ai"
+EVALUATION_CONCURRENCY = 16
+
+PLACEHOLDER_PATTERN = re.compile(r"\{\{\s*(\w+)\s*\}\}|\{(\w+)\}")  # {name} or {{name}}
+WORD_PATTERN = re.compile(r"\w+")
+JSON_FENCE_PATTERN = re.compile(r"^```(?:json)?\s*(.*?)\s*```$", re.DOTALL)
+
+SCORERS = {}  # metric name -> fn(output, expected) -> float
+
+
+def scorer(name):
+    """Registers fn(output, expected) -> float as the metric `name`."""
+    def register(fn):
+        SCORERS[name] = fn
+        return fn
+    return register
+
+
+def words(text):
+    return WORD_PATTERN.findall(text.lower())
+
+
+@scorer("exact_match")
+def exact_match(output, expected):
+    """1.0 when output and expected have the same words, ignoring case, punctuation and spacing."""
+    return float(words(output) == words(expected))
+
+
+@scorer("token_overlap")
+def token_overlap(output, expected):
+    """F1 of the words output shares with expected."""
+    output_counts, expected_counts = Counter(words(output)), Counter(words(expected))
+    if not output_counts and not expected_counts:
+        return 1.0
+    common = sum((output_counts & expected_counts).values())
+    if not common:
+        return 0.0
+    precision = common / sum(output_counts.values())
+    recall = common / sum(expected_counts.values())
+    return 2 * precision * recall / (precision + recall)
+
+
+@scorer("length_ratio")
+def length_ratio(output, expected):
+    """Output length over expected length, in words; 1.0 is the expected length."""
+    return len(words(output)) / max(1, len(words(expected)))
+
+
+@scorer("json_valid")
+def json_valid(output, expected):
+    """1.0 when output, optionally in a ```json fence, parses as JSON."""
+    fenced = JSON_FENCE_PATTERN.match(output.strip())
+    try:
+        json.loads(fenced.group(1) if fenced else output)
+    except ValueError:
+        return 0.0
+    return 1.0
+
+
+def parse_variables(variables):
+    """Variable names from a comma-separated string, as entered on Generate Prompt."""
+    return [name.strip() for name in variables.split(",") if name.strip()]
+
+
+def parse_dataset(data):
+    """Rows of a dataset given as a JSON array or JSONL, in bytes or text. Raises ValueError for anything else."""
+    text = data.decode("utf-8") if isinstance(data, bytes) else data
+    if text.lstrip().startswith("["):
+        rows = json.loads(text)
+    else:
+        rows = [json.loads(line) for line in text.splitlines() if line.strip()]
+    if not all(isinstance(row, dict) for row in rows):
+        raise ValueError("Every dataset row must be a JSON object")
+    return rows
+
+
+def fill_template(template, row, variables=(), input_field=INPUT_FIELD):
+    """The prompt for one dataset row.
+
+    {name} and {{name}} placeholders are filled with the row's `name` field, or with its input field when
+    `name` is one of `variables` and the row has no such field. Other placeholders are left as they are. A
+    template without any filled placeholder gets the input appended.
+    """
+    filled = False
+
+    def replace(match):
+        nonlocal filled
+        name = match.group(1) or match.group(2)
+        if name in row:
+            value = row[name]
+        elif name in variables:
+            value = row.get(input_field, "")
+        else:
+            return match.group(0)
+        filled = True
+        return value if isinstance(value, str) else json.dumps(value)
+
+    prompt = PLACEHOLDER_PATTERN.sub(replace, template)
+    if not filled:
+        prompt += f"\n\n{row.get(input_field, '')}"
+    return prompt
+
+
+def evaluate_row(settings, prompt, expected, metric_names, cache=None, bypass_cache=False):
+    """Generates the output for one filled prompt and scores it. Returns (GenerationResult, scores)."""
+    cache_key = settings.cache_key(prompt)
+    cached = None if cache is None or bypass_cache else cache.get(cache_key)
+    if cached is not None:
+        result = GenerationResult(text=cached, cached=True)
+    else:
+        result = toolkit.call_gemini(settings, prompt, priority=toolkit.BATCH, operation="evaluate_prompt")
+        if cache is not None:
+            cache.set(cache_key, result.text)
+    return result, {name: SCORERS[name](result.text, expected) for name in metric_names}
+
+
+def make_record(index, row, result, scores, error, input_field=INPUT_FIELD, expected_field=EXPECTED_FIELD):
+    return {
+        "row": index,
+        "input": row.get(input_field),
+        "expected": row.get(expected_field),
+        "output": result.text if result else None,
+        "scores": scores,
+        "cached": result.cached if result else False,
+        "latency_s": round(result.latency, 3) if result and result.latency is not None else None,
+        "input_tokens": result.input_tokens if result else None,
+        "output_tokens": result.output_tokens if result else None,
+        "error": str(error) if error else None,
+    }
+
+
+def run_evaluation(settings, template, rows, variables="", metric_names=None, concurrency=EVALUATION_CONCURRENCY,
+                   cache=None, bypass_cache=False, input_field=INPUT_FIELD, expected_field=EXPECTED_FIELD):
+    """Runs every row of the dataset through the template concurrently, yielding a record per row as it finishes.
+
+    Rows are read ahead and run as in gemini_toolkit.run_bounded, so an arbitrarily long row stream runs in
+    bounded memory, and rows that haven't started when the caller stops iterating are dropped.
+    """
+    metric_names = list(SCORERS) if metric_names is None else metric_names
+    variables = parse_variables(variables)
+
+    def run(indexed_row):
+        _, row = indexed_row
+        prompt = fill_template(template, row, variables, input_field)
+        return evaluate_row(settings, prompt, str(row.get(expected_field, "")), metric_names, cache, bypass_cache)
+
+    for (index, row), outcome, error in toolkit.run_bounded(run, enumerate(rows), concurrency):
+        result, scores = outcome if error is None else (None, {})
+        yield make_record(index, row, result, scores, error, input_field, expected_field)
+
+
+class EvaluationSummary:
+    """Running aggregate of evaluation records: row counts, mean score per metric, latency, tokens and throughput."""
+
+    def __init__(self, metric_names, total=None):
+        self.metric_names = list(metric_names)
+        self.total = total
+        self.rows = self.failed = self.cached = 0
+        self.score_sums = dict.fromkeys(self.metric_names, 0.0)
+        self.latency = metrics.Histogram(metrics.LATENCY_BUCKETS)
+        self.input_tokens = self.output_tokens = 0
+        self.started_at = time.perf_counter()
+
+    def add(self, record):
+        self.rows += 1
+        if record["error"]:
+            self.failed += 1
+            return
+        self.cached += record["cached"]
+        for name in self.metric_names:
+            self.score_sums[name] += record["scores"][name]
+        if record["latency_s"] is not None:
+            self.latency.observe(record["latency_s"])
+        self.input_tokens += record["input_tokens"] or 0
+        self.output_tokens += record["output_tokens"] or 0
+
+    def as_dict(self):
+        scored = self.rows - self.failed
+        elapsed = time.perf_counter() - self.started_at
+        summary = {"rows": self.rows, "total": self.total, "failed": self.failed, "cached": self.cached}
+        summary.update({f"mean_{name}": self.score_sums[name] / scored if scored else None for name in self.metric_names})
+        summary.update(
+            p50_latency_s=self.latency.percentile(50),
+            p95_latency_s=self.latency.percentile(95),
+            input_tokens=self.input_tokens,
+            output_tokens=self.output_tokens,
+            elapsed_s=elapsed,
+            rows_per_s=self.rows / elapsed if elapsed else None,
+        )
+        return summary
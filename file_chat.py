@@ -0,0 +1,216 @@
+# Persistent Analyze File chat for the Gemini-AI Prompt Engineering Toolkit.
+#
+# A FileChatSession holds one conversation about a set of uploaded Gemini files across Streamlit reruns.
+# File sets of at least CONTEXT_CACHE_MIN_TOKENS are stored once in a Gemini context cache, whose TTL is
+# extended while the chat is in use, so each turn sends only the conversation; smaller sets are the first
+# turn of the chat history. The earliest turns are dropped when the conversation outgrows the model's
+# context window. Nothing here reads Streamlit state, so replies can be generated by a background job.
+
+import datetime
+import hashlib
+import os
+import time
+import uuid
+
+import gemini_toolkit as toolkit
+import metrics
+import token_accounting
+from gemini_toolkit import lazy_import
+
+genai = lazy_import("google.generativeai")
+
+# Analyze File chat: large file sets are kept in a Gemini context cache instead of being re-sent every turn
+CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("CONTEXT_CACHE_MIN_TOKENS", 32768))  # Gemini's minimum cacheable size
+CONTEXT_CACHE_TTL = int(os.getenv("CONTEXT_CACHE_TTL", 60 * 60))  # seconds
+CONTEXT_CACHE_REFRESH_MARGIN = 5 * 60  # extend the TTL once fewer seconds than this remain
+
+
+class FileChatSession:
+    """A chat about a set of uploaded Gemini files that is kept in session state across reruns.
+
+    If the files are at least CONTEXT_CACHE_MIN_TOKENS, they are stored once in a Gemini context cache,
+    and each turn sends only the conversation. Otherwise they are the first turn of the chat history.
+    `documents` names locally indexed documents whose passages are sent with each message instead.
+    Nothing here reads session state, so replies can be generated by a background job.
+    """
+
+    def __init__(self, files, documents=()):
+        self.chat_id = uuid.uuid4().hex[:12]
+        self.files = files
+        self.file_names = tuple(file.name for file in files)
+        self.documents = tuple(documents)
+        self.context_tokens = None
+        self.cached_content = None
+        self.cache_error = None
+        self.history = []  # turns after the files, carried over when the chat is rebuilt
+        self.trimmed_turns = 0  # earliest turns dropped to fit the context window
+        self._chat = None
+        self._config = None
+        self._files_turns = 0  # leading history entries that hold the files rather than conversation
+        self._replying = False  # the chat's own history is incomplete while a reply streams in
+
+    def matches(self, files, documents=()):
+        return tuple(file.name for file in files) == self.file_names and tuple(documents) == self.documents
+
+    @staticmethod
+    def _generation_config(settings):
+        return {
+            "temperature": settings.temperature,
+            "top_p": 0.95,
+            "top_k": 64,
+            "max_output_tokens": settings.max_output_tokens,
+            "response_mime_type": "text/plain",
+        }
+
+    def _count_context_tokens(self, model_version):
+        try:
+            return toolkit.count_input_tokens(model_version, [{"role": "user", "parts": self.files}])
+        except Exception:
+            return None
+
+    def _create_cache(self, model_version):
+        """Stores the files in a context cache. Falls back to sending them in the history if that fails."""
+        try:
+            with metrics.track_call("create_context_cache", model_version) as record:
+                record.input_tokens = self.context_tokens
+                self.cached_content = toolkit.get_scheduler().call(
+                    lambda: genai.caching.CachedContent.create(
+                        model=model_version if model_version.startswith("models/") else f"models/{model_version}",
+                        display_name=f"analyze-file-{hashlib.sha256(','.join(self.file_names).encode()).hexdigest()[:12]}",
+                        contents=[{"role": "user", "parts": self.files}],
+                        tools="code_execution",
+                        ttl=datetime.timedelta(seconds=CONTEXT_CACHE_TTL),
+                    ),
+                    model_version,
+                    self.context_tokens,
+                    record=record,
+                )
+        except Exception as e:
+            # e.g. a model without context caching support; don't retry on every rerun
+            self.cached_content = None
+            self.cache_error = str(e)
+
+    def _keep_cache_alive(self):
+        """Extends the cache TTL while the chat is in use, and recreates it if it has already expired."""
+        remaining = (self.cached_content.expire_time - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+        if remaining <= 0:
+            self.cached_content = None
+            self._chat = None
+        elif remaining < CONTEXT_CACHE_REFRESH_MARGIN:
+            try:
+                toolkit.update_context_cache(self.cached_content, datetime.timedelta(seconds=CONTEXT_CACHE_TTL))
+            except Exception:
+                self.cached_content = None
+                self._chat = None
+
+    def _ensure_chat(self, settings):
+        model_version = settings.model_version
+        config = (model_version, settings.temperature, settings.max_output_tokens)
+        if self._chat is not None:
+            self.history = self._chat.history[self._files_turns:]
+        if self._config is not None and self._config[0] != model_version:
+            # A context cache belongs to one model
+            self.close()
+            self.cache_error = None
+        elif self.cached_content is not None:
+            self._keep_cache_alive()
+        if self._chat is not None and config == self._config:
+            return
+        if self.context_tokens is None:
+            self.context_tokens = self._count_context_tokens(model_version) if self.files else 0
+        if self.cached_content is None and self.cache_error is None and (self.context_tokens or 0) >= CONTEXT_CACHE_MIN_TOKENS:
+            self._create_cache(model_version)
+        if self.cached_content is not None:
+            model = genai.GenerativeModel.from_cached_content(self.cached_content, generation_config=self._generation_config(settings))
+            self._chat = model.start_chat(history=self.history)
+            self._files_turns = 0
+        else:
+            model = genai.GenerativeModel(
+                model_name=model_version,
+                generation_config=self._generation_config(settings),
+                tools='code_execution',
+            )
+            files_turn = [{"role": "user", "parts": self.files}] if self.files else []
+            self._chat = model.start_chat(history=files_turn + self.history)
+            self._files_turns = len(files_turn)
+        self._config = config
+
+    def turns(self):
+        """Returns (role, text) for each exchanged message, without the files turn.
+
+        A user message's last part is the question itself; earlier parts hold retrieved passages.
+        """
+        history = self._chat.history[self._files_turns:] if self._chat is not None and not self._replying else self.history
+        turns = []
+        for content in history:
+            texts = [part.text for part in content.parts if part.text]
+            turns.append((content.role, texts[-1] if content.role == "user" and texts else "".join(texts)))
+        return turns
+
+    def _fit_history(self, model_version, fixed_tokens):
+        """Drops the earliest exchanges until the files, history and new message fit the model's context window.
+
+        Raises ContextLimitExceeded when the files and message alone don't fit.
+        """
+        token_accounting.check_input_tokens(model_version, fixed_tokens)
+        limit, _ = token_accounting.token_limits(model_version)
+        history = self._chat.history[self._files_turns:]
+        history_tokens = [
+            toolkit.estimate_tokens("".join(part.text for part in content.parts if part.text), model_version) for content in history
+        ]
+        dropped = 0
+        while dropped < len(history) and fixed_tokens + sum(history_tokens[dropped:]) > limit:
+            dropped += 2  # a user message and its reply
+        if dropped:
+            self.history = history[dropped:]
+            self._chat.history = self._chat.history[:self._files_turns] + self.history
+            self.trimmed_turns += dropped
+
+    def send(self, message, settings, stream=False, record=None, on_text=None):
+        """Sends one turn (text, or a list of text parts) through the shared scheduler and returns the response.
+
+        A streamed reply is read to the end here, calling on_text with the accumulated text per chunk; if
+        that raises (e.g. the job was cancelled), the unfinished turn is dropped from the chat. The chat
+        history records a turn once its response is complete. Queue time, time to first token and
+        retries are added to `record`, a metrics.CallRecord, when one is given. The earliest turns are
+        dropped when the conversation would no longer fit the model's context window.
+        """
+        self._ensure_chat(settings)
+        model_version = settings.model_version
+        text = message if isinstance(message, str) else "".join(message)
+        message_tokens = toolkit.estimate_tokens(text, model_version)
+        self._fit_history(model_version, message_tokens + (self.context_tokens or 0))
+        # Uncached file context is re-sent, and billed, with every turn
+        estimated_tokens = message_tokens + (0 if self.cached_content else self.context_tokens or 0)
+        previous_history = list(self._chat.history)
+        start = time.perf_counter()
+        self._replying = True
+        try:
+            response = toolkit.get_scheduler().call(
+                lambda: self._chat.send_message(message, stream=stream), model_version, estimated_tokens, record=record
+            )
+            if stream:
+                reply = ""
+                for chunk in response:
+                    if record is not None and record.time_to_first_token is None:
+                        record.time_to_first_token = time.perf_counter() - start
+                    reply += chunk.text
+                    if on_text is not None:
+                        on_text(reply)
+        except BaseException:
+            # An unfinished streamed turn would break the chat history (rewind() can't drop it either)
+            self._chat.history = previous_history
+            raise
+        finally:
+            self._replying = False
+        return response
+
+    def close(self):
+        """Deletes the context cache, if any, instead of leaving it to expire."""
+        if self.cached_content is not None:
+            try:
+                toolkit.delete_context_cache(self.cached_content)
+            except Exception:
+                pass
+        self.cached_content = None
+        self._chat = None
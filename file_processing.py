@@ -0,0 +1,257 @@
+# File parsing for the Gemini-AI Prompt Engineering Toolkit.
+#
+# Turns uploaded files into prompt text: CSVs are serialized compactly under a token budget, and PDFs are
+# extracted page by page with a per-page cache and a process pool for large documents. Nothing here
+# depends on Streamlit, so the app, the benchmarks and scripts share the same code.
+
+import functools
+import hashlib
+import multiprocessing
+import os
+import sys
+import threading
+import types
+import uuid
+from concurrent.futures import ProcessPoolExecutor, wait
+
+import sqlite_store
+from gemini_toolkit import lazy_import
+from token_accounting import count_tokens
+from upload_store import map_file
+
+pd = lazy_import("pandas")
+pdf_extraction = lazy_import("pdf_extraction")  # PyPDF2
+
+CACHE_FOLDER = ".cache"
+
+# Parallel, cached PDF text extraction settings
+PDF_CACHE_PATH = os.path.join(CACHE_FOLDER, "pdf_pages.sqlite3")
+PDF_SPOOL_FOLDER = os.path.join(CACHE_FOLDER, "pdf")
+PDF_MAX_WORKERS = int(os.getenv("PDF_MAX_WORKERS", os.cpu_count() or 1))
+PDF_PAGES_PER_TASK = 16
+PDF_PARALLEL_MIN_PAGES = 32  # below this, process start-up costs more than it saves
+
+# Token-budgeted CSV ingestion settings
+CSV_CHUNK_ROWS = 10000
+CSV_TOKEN_BUDGET = int(os.getenv("CSV_TOKEN_BUDGET", 100000))
+
+
+# Per-page PDF text cache, keyed on the document's content hash
+class PdfPageCache:
+    """SQLite-backed store of extracted page text so the same PDF is never parsed twice."""
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "doc_hash TEXT NOT NULL, page_num INTEGER NOT NULL, text TEXT NOT NULL, PRIMARY KEY (doc_hash, page_num))"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS documents (doc_hash TEXT PRIMARY KEY, num_pages INTEGER NOT NULL)")
+
+    def _connect(self):
+        return sqlite_store.connect(self.path)
+
+    def get_pages(self, doc_hash):
+        """Returns every page's text for a fully extracted document, else None."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT num_pages FROM documents WHERE doc_hash = ?", (doc_hash,)).fetchone()
+            if row is None:
+                return None
+            rows = conn.execute("SELECT text FROM pages WHERE doc_hash = ? ORDER BY page_num", (doc_hash,)).fetchall()
+        return [text for (text,) in rows] if len(rows) == row[0] else None
+
+    def store_pages(self, doc_hash, start, texts):
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO pages (doc_hash, page_num, text) VALUES (?, ?, ?)",
+                [(doc_hash, start + offset, text) for offset, text in enumerate(texts)],
+            )
+
+    def mark_complete(self, doc_hash, num_pages):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO documents (doc_hash, num_pages) VALUES (?, ?)", (doc_hash, num_pages))
+
+
+@functools.lru_cache(maxsize=None)
+def get_pdf_page_cache():
+    os.makedirs(os.path.dirname(PDF_CACHE_PATH), exist_ok=True)
+    return PdfPageCache(PDF_CACHE_PATH)
+
+
+# Workers come from a forkserver that only preloads the worker module, never forked from this process,
+# whose other threads may be holding locks a child would inherit (spawn where there is no forkserver)
+PDF_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+_pdf_base_context = multiprocessing.get_context(PDF_START_METHOD)
+_pdf_worker_main = types.ModuleType("__main__")
+_pdf_worker_main_lock = threading.Lock()
+
+
+class PdfWorkerProcess(_pdf_base_context.Process):
+    """A PDF worker process that starts without re-running this process's __main__.
+
+    A new spawn or forkserver process first re-runs its parent's __main__ (as __mp_main__). Under Streamlit
+    that is the app script, which has no `if __name__ == "__main__"` guard, so every worker would run the
+    whole app. Workers are started while __main__ is a bare module, with no file or spec to re-run.
+    """
+
+    def start(self):
+        with _pdf_worker_main_lock:
+            main = sys.modules["__main__"]
+            sys.modules["__main__"] = _pdf_worker_main
+            try:
+                super().start()
+            finally:
+                # Unless Streamlit has started a script run, with its own __main__, in the meantime
+                if sys.modules["__main__"] is _pdf_worker_main:
+                    sys.modules["__main__"] = main
+
+
+class PdfWorkerContext(type(_pdf_base_context)):
+    Process = PdfWorkerProcess
+
+
+@functools.lru_cache(maxsize=None)
+def get_pdf_process_pool():
+    if PDF_MAX_WORKERS < 2:
+        return None
+    context = PdfWorkerContext()
+    if PDF_START_METHOD == "forkserver":
+        context.set_forkserver_preload(["pdf_extraction"])
+    return ProcessPoolExecutor(max_workers=PDF_MAX_WORKERS, mp_context=context)
+
+
+def iter_pdf_pages(pdf_bytes, path=None):
+    """Lazily yields the text of each page of a PDF, in order.
+
+    Pages come from the page cache when the document has been seen before. Otherwise large documents
+    are extracted across a process pool in page ranges; closing the generator early cancels the rest.
+    `path` names a file holding pdf_bytes, which is then read directly instead of being spooled.
+    """
+    doc_hash = hashlib.sha256(pdf_bytes).hexdigest()
+    cache = get_pdf_page_cache()
+    cached = cache.get_pages(doc_hash)
+    if cached is not None:
+        yield from cached
+        return
+
+    # Workers read the PDF from disk rather than receiving a pickled copy of it per task. Each extraction
+    # spools its own copy, so removing it never pulls the file from under another one.
+    spooled = path is None
+    if spooled:
+        os.makedirs(PDF_SPOOL_FOLDER, exist_ok=True)
+        path = os.path.join(PDF_SPOOL_FOLDER, f"{doc_hash}-{uuid.uuid4().hex}.pdf")
+        with open(path, "wb") as f:
+            f.write(pdf_bytes)
+    try:
+        num_pages = pdf_extraction.count_pages(path)
+        ranges = [(start, min(start + PDF_PAGES_PER_TASK, num_pages)) for start in range(0, num_pages, PDF_PAGES_PER_TASK)]
+        pool = get_pdf_process_pool() if num_pages >= PDF_PARALLEL_MIN_PAGES else None
+        if pool is None:
+            for start, stop in ranges:
+                texts = pdf_extraction.extract_page_range(path, start, stop)
+                cache.store_pages(doc_hash, start, texts)
+                yield from texts
+        else:
+            futures = [pool.submit(pdf_extraction.extract_page_range, path, start, stop) for start, stop in ranges]
+            try:
+                for (start, _), future in zip(ranges, futures):
+                    texts = future.result()
+                    cache.store_pages(doc_hash, start, texts)
+                    yield from texts
+            finally:
+                for future in futures:
+                    future.cancel()
+                # Ranges a worker has already started still read the spool file
+                wait(futures)
+        cache.mark_complete(doc_hash, num_pages)
+    finally:
+        # Whether every page was extracted or not (closed early, or a worker raised)
+        if spooled:
+            os.remove(path)
+
+
+# Chunked CSV serialization under a token budget
+def serialize_csv(uploaded_file, token_budget=CSV_TOKEN_BUDGET, sample_frac=None, stratify_by=None):
+    """Reads a CSV in chunks and returns compact CSV text with a schema/stats header, stopping at token_budget.
+
+    With sample_frac, each chunk is sampled (stratified on the stratify_by column, if given).
+    """
+    rows = []
+    used_tokens = 0
+    rows_read = rows_included = 0
+    columns = dtypes = None
+    truncated = False
+    for chunk in pd.read_csv(uploaded_file, chunksize=CSV_CHUNK_ROWS):
+        if columns is None:
+            columns = list(chunk.columns)
+            dtypes = [str(dtype) for dtype in chunk.dtypes]
+        rows_read += len(chunk)
+        if sample_frac:
+            if stratify_by:
+                chunk = chunk.groupby(stratify_by, group_keys=False).sample(frac=sample_frac, random_state=0)
+            else:
+                chunk = chunk.sample(frac=sample_frac, random_state=0)
+        text = chunk.to_csv(index=False, header=False)
+        tokens = count_tokens(text)
+        if used_tokens + tokens <= token_budget:
+            rows.append(text)
+            used_tokens += tokens
+            rows_included += len(chunk)
+            continue
+        # This chunk crosses the budget: keep as many of its rows as still fit, then stop reading
+        for line in text.splitlines(keepends=True):
+            tokens = count_tokens(line)
+            if used_tokens + tokens > token_budget:
+                break
+            rows.append(line)
+            used_tokens += tokens
+            rows_included += 1
+        truncated = True
+        break
+
+    if columns is None:
+        return ""
+    header = [
+        "# schema: " + ", ".join(f"{column} ({dtype})" for column, dtype in zip(columns, dtypes)),
+        f"# rows: {rows_included} included of {rows_read}{'+' if truncated else ''} read",
+    ]
+    if sample_frac:
+        header.append(f"# sampled: {sample_frac:.0%} of rows" + (f", stratified by {stratify_by}" if stratify_by else ""))
+    if truncated:
+        header.append(f"# truncated at a budget of {token_budget} tokens")
+    header.append(pd.DataFrame(columns=columns).to_csv(index=False).rstrip("\n"))
+    return "\n".join(header) + "\n" + "".join(rows)
+
+
+# Function to process uploaded file
+def process_uploaded_file(uploaded_file, file_type, token_budget=CSV_TOKEN_BUDGET, sample_frac=None, stratify_by=None):
+    if file_type == "text/csv":
+        # CSV handling: chunked, compact and capped at token_budget tokens
+        return serialize_csv(uploaded_file, token_budget, sample_frac, stratify_by)
+    elif file_type == "application/pdf":
+        # PDF handling: parallel, page-cached extraction joined once at the end
+        return "".join(iter_pdf_pages(uploaded_file.getvalue()))
+    elif file_type.startswith('text/'):  # Handle other text files
+        content = uploaded_file.getvalue().decode("utf-8")
+        return content
+    else:  # Handle binary files
+        content = uploaded_file.read()  # Read as bytes
+        return content
+
+
+def process_file(path, file_type, token_budget=CSV_TOKEN_BUDGET, sample_frac=None, stratify_by=None):
+    """process_uploaded_file for a file on disk.
+
+    CSVs are read from the path in chunks, and PDFs and text through mmap, so the file is paged in as it
+    is parsed instead of being copied into memory first.
+    """
+    if file_type == "text/csv":
+        return serialize_csv(path, token_budget, sample_frac, stratify_by)
+    with map_file(path) as data:
+        if file_type == "application/pdf":
+            return "".join(iter_pdf_pages(data, path))
+        if file_type.startswith("text/"):
+            return str(data, "utf-8", errors="replace")
+        return bytes(data)
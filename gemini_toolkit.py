@@ -0,0 +1,859 @@
+# Headless core of the Gemini-AI Prompt Engineering Toolkit.
+#
+# Prompt and test data generation as plain functions that take an explicit GenerationSettings instead of
+# reading st.session_state, and that raise instead of calling st.error. Gemini file uploads and every other
+# API call go through one shared rate limiter and are recorded in the process-wide metrics (metrics.py).
+# Prompts are checked against the model's context window before they are sent (token_accounting.py).
+# The Streamlit app, the batch CLI (batch_generate.py) and the benchmarks are all built on this module.
+
+import atexit
+import functools
+import hashlib
+import importlib.util
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from dataclasses import asdict, dataclass, field
+
+import sqlite_store
+import token_accounting
+from metrics import track_call
+
+
+# Heavy modules are imported lazily, on first use, so importing this module stays cheap
+def lazy_import(name):
+    """Returns the named module, deferring its actual import until one of its attributes is used."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+genai = lazy_import("google.generativeai")
+
+# LangSmith tracing is sampled, and sampled runs are sent in batches from a background thread
+_tracing_client = None
+_tracing_client_lock = threading.Lock()
+
+
+def tracing_enabled():
+    return os.getenv("LANGCHAIN_TRACING_V2", os.getenv("LANGSMITH_TRACING", "")).lower() == "true"
+
+
+def get_tracing_client():
+    """Returns the shared LangSmith client, flushed at exit so queued runs aren't lost."""
+    global _tracing_client
+    with _tracing_client_lock:
+        if _tracing_client is None:
+            from langsmith import Client
+            _tracing_client = Client(auto_batch_tracing=True)
+            atexit.register(_tracing_client.flush)
+        return _tracing_client
+
+
+def traceable(func):
+    """LangSmith's @traceable for a sampled fraction (LANGSMITH_SAMPLE_RATE) of calls.
+
+    Unsampled calls, and every call while tracing is off, run the function directly without importing
+    langsmith, so tracing adds nothing to their latency.
+    """
+    traced = None
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        nonlocal traced
+        if not tracing_enabled() or random.random() >= float(os.getenv("LANGSMITH_SAMPLE_RATE", DEFAULT_TRACE_SAMPLE_RATE)):
+            return func(*args, **kwargs)
+        if traced is None:
+            from langsmith import traceable as langsmith_traceable
+            traced = langsmith_traceable(client=get_tracing_client())(func)
+        return traced(*args, **kwargs)
+    return wrapper
+
+DEFAULT_MODEL_VERSION = "gemini-1.5-flash-exp-0827"
+DEFAULT_TRACE_SAMPLE_RATE = 0.1
+RESPONSE_CACHE_PATH = os.path.join(".cache", "responses.sqlite3")  # shared by the app and the command-line tools
+
+# Sharded dataset generation settings
+DATASET_TOKENS_PER_PAIR_ESTIMATE = 150  # used until the first shard has been measured
+DATASET_MAX_PAIRS_PER_SHARD = 50
+DATASET_OUTPUT_HEADROOM = 0.8  # fraction of max_output_tokens a shard is planned to use
+
+# Client-side rate limits as (requests per minute, tokens per minute), per model. GEMINI_REQUESTS_PER_MINUTE
+# and GEMINI_TOKENS_PER_MINUTE override them for every model, e.g. to match a free-tier key.
+MODEL_RATE_LIMITS = {
+    "gemini-1.5-flash-exp-0827": (2000, 4_000_000),
+    "gemini-1.5-pro-exp-0827": (1000, 4_000_000),
+    "gemini-1.5-flash-8b-exp-0827": (4000, 4_000_000),
+}
+DEFAULT_RATE_LIMIT = (1000, 4_000_000)
+FILES_RATE_LIMIT = 600  # requests per minute for file uploads and status polls
+
+# Call priorities: batch work leaves part of each budget free and yields to waiting interactive calls
+INTERACTIVE = 0
+BATCH = 1
+BATCH_RESERVE = 0.2  # fraction of each bucket batch calls may not use
+
+# Adaptive polling of uploaded files while Gemini processes them
+UPLOAD_POLL_INITIAL_INTERVAL = 0.5  # seconds
+UPLOAD_POLL_MAX_INTERVAL = 10  # seconds
+UPLOAD_POLL_BACKOFF = 1.5
+
+RETRY_MAX_ATTEMPTS = 6
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+
+
+@dataclass(frozen=True)
+class GenerationSettings:
+    """Model and sampling settings for a Gemini call."""
+    model_version: str = DEFAULT_MODEL_VERSION
+    temperature: float = 0.5
+    max_output_tokens: int = 8192
+
+    def generation_config(self):
+        return genai.types.GenerationConfig(temperature=self.temperature, max_output_tokens=self.max_output_tokens)
+
+    def cache_key(self, prompt):
+        return ResponseCache.make_key(prompt, **asdict(self))
+
+
+@dataclass
+class GenerationResult:
+    """The text of a Gemini response and how it was produced."""
+    text: str
+    cached: bool = False
+    latency: float = None
+    time_to_first_token: float = None
+    input_tokens: int = None
+    output_tokens: int = None
+    queue_time: float = None
+    retries: int = 0
+
+
+@dataclass
+class TestDataResult(GenerationResult):
+    """A generated batch of conversation pairs."""
+    pairs: list = field(default_factory=list)
+    truncated: bool = False
+    invalid: int = 0
+
+    @property
+    def tokens_per_pair(self):
+        return self.output_tokens / len(self.pairs) if self.output_tokens and self.pairs else None
+
+
+# Local response cache for generate_prompt and generate_test_data
+class ResponseCache:
+    """SQLite-backed, content-addressed response cache with size- and age-based LRU eviction."""
+
+    def __init__(self, path, max_bytes, max_age):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+
+    def _connect(self):
+        return sqlite_store.connect(self.path)
+
+    @staticmethod
+    def make_key(prompt, **config):
+        payload = json.dumps({"prompt": prompt, "config": config}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if now - created_at > self.max_age:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            return value
+
+    def set(self, key, value):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), now, now),
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.max_age,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used entries until the cache fits in its size budget
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed_at ASC").fetchall():
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+
+
+def open_response_cache(path=RESPONSE_CACHE_PATH):
+    """The ResponseCache at `path`, sized and aged by RESPONSE_CACHE_MAX_BYTES and RESPONSE_CACHE_MAX_AGE."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    return ResponseCache(
+        path,
+        int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 256 * 1024 * 1024)),  # 256 MB
+        int(os.getenv("RESPONSE_CACHE_MAX_AGE", 7 * 24 * 60 * 60)),  # 7 days
+    )
+
+
+# Incremental parser for streamed test data
+class PairStreamParser:
+    """Extracts complete {"human", "ai"} objects from streamed JSON text as soon as each one closes.
+
+    Pairs may be top-level objects (in an array, or one after another) or nested inside a wrapper such as
+    {"pairs": [...]}; either way each pair is yielded when its own closing brace arrives. A wrapper is not
+    counted as invalid. A pair-shaped object nested inside another pair is yielded as well as its parent,
+    since whether the parent is a pair isn't known until it closes.
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._open = []  # [buffer offset, holds pairs] of each unclosed object, outermost first
+        self._in_string = False
+        self._escape = False
+        self.invalid = 0
+
+    @property
+    def truncated(self):
+        """True when the text ended in the middle of an object."""
+        return bool(self._open)
+
+    def feed(self, text):
+        """Consumes a chunk of text and yields every valid pair completed by it."""
+        for char in text:
+            if not self._open:
+                # Anything between objects (array brackets, commas, code fences) is ignored
+                if char == "{":
+                    self._buffer = [char]
+                    self._open = [[0, False]]
+                continue
+            self._buffer.append(char)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._open.append([len(self._buffer) - 1, False])
+            elif char == "}":
+                start, holds_pairs = self._open.pop()
+                pair = self._decode("".join(self._buffer[start:]), holds_pairs)
+                if pair is not None:
+                    yield pair
+
+    def _decode(self, text, holds_pairs):
+        """Returns the just-closed object in text if it is a valid pair, else None, counting invalid objects.
+
+        An object holding pairs (or invalid pair-shaped objects) is a wrapper and isn't invalid itself. Other
+        nested objects, such as a pair's metadata, only count as invalid when they have pair keys.
+        """
+        try:
+            item = json.loads(text)
+        except json.JSONDecodeError:
+            item = None
+        is_pair = isinstance(item, dict) and isinstance(item.get("human"), str) and isinstance(item.get("ai"), str)
+        counted = is_pair or holds_pairs
+        if not counted and (not self._open or isinstance(item, dict) and ("human" in item or "ai" in item)):
+            self.invalid += 1
+            counted = True
+        if counted and self._open:
+            self._open[-1][1] = True
+        return item if is_pair else None
+
+
+# New function to get system prompt
+def get_system_prompt(task, variables, model_version, temperature, max_output_tokens):
+    return f"""You are an advanced AI prompt engineer assistant integrated into a Streamlit app. Your task is to generate a highly effective Chain of Thought (COT) prompt based on the user's input. Follow these steps:
+
+1. Analyze the task:
+   - Identify the main objective of the user's task
+   - Determine the complexity and scope of the task
+   - Consider any specific domain knowledge required
+
+2. Evaluate the variables:
+   - Examine the provided variables (if any)
+   - Determine how these variables should be incorporated into the prompt
+   - Consider additional relevant variables that might enhance the prompt
+
+3. Consider the Gemini model capabilities:
+   - Adapt the prompt to leverage the strengths of the selected Gemini model ({model_version})
+   - Take into account the current temperature setting ({temperature}) and max token limit ({max_output_tokens})
+
+4. Incorporate COT elements:
+   - Break down the task into logical steps or components
+   - Include prompts for explanations or reasoning at each step
+   - Encourage the model to show its work or thought process
+
+5. Optimize for clarity and specificity:
+   - Use clear, concise language
+   - Avoid ambiguity in instructions
+   - Include specific examples or constraints where appropriate
+
+6. Add context and formatting instructions:
+   - Provide any necessary background information
+   - Specify desired output format (e.g., bullet points, paragraphs, JSON)
+   - Include any relevant data or file analysis instructions if applicable
+
+7. Encourage creativity and problem-solving:
+   - Include prompts for alternative approaches or solutions
+   - Ask for pros and cons of different methods if relevant
+
+8. Incorporate error handling and edge cases:
+   - Prompt the model to consider potential issues or limitations
+   - Ask for validation steps or error checking where appropriate
+
+9. Format the final prompt:
+   - Present the COT prompt in a clear, structured manner
+   - Use appropriate line breaks, numbering, or bullet points for readability
+
+Generate a COT prompt that follows these steps and is optimized for the given task, variables, and selected Gemini model. Ensure the prompt is detailed enough to guide the AI but concise enough to fit within token limits.
+
+Task: {task}
+Variables: {variables}
+Selected Model: {model_version}
+Temperature: {temperature}
+Max Tokens: {max_output_tokens}
+
+Based on the above information, generate an optimal Chain of Thought prompt:
+"""
+
+
+# Function to build the test data prompt
+def get_test_data_prompt(topic, num_pairs, subtopic=None):
+    focus = f"\n    Focus every pair on this sub-topic: {subtopic}." if subtopic else ""
+    return f"""Generate {num_pairs} pairs of conversation for the topic: {topic}. {focus}
+    Each pair should consist of a human message and an AI response. 
+    Format the output as a valid JSON array of objects, where each object has 'human' and 'ai' keys.
+    Ensure the output is strictly in this format:
+    [
+        {{"human": "Human message 1", "ai": "AI response 1"}},
+        {{"human": "Human message 2", "ai": "AI response 2"}},
+        ...
+    ]
+    Do not include any text before or after the JSON array.
+    """
+
+
+# Shared rate limiter and retry scheduler for every Gemini call in the process
+class TokenBucket:
+    """Refills continuously up to `per_minute`. The level may go negative when actual usage exceeds the estimate."""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, reserve=0.0):
+        """Seconds until `amount` can be taken while leaving `reserve` of the capacity untouched."""
+        amount = min(amount, self.capacity * (1 - reserve))  # a single oversized request must still fit eventually
+        missing = amount + self.capacity * reserve - self.level
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+
+class NonRetryableError(Exception):
+    """Raised from inside a scheduled call, with the original error as its cause, to stop retries."""
+
+
+def is_retryable(error):
+    """True for rate limiting (429), server errors (5xx), timeouts and dropped connections."""
+    from google.api_core import exceptions as api_exceptions
+    return isinstance(error, (
+        api_exceptions.TooManyRequests,
+        api_exceptions.ResourceExhausted,
+        api_exceptions.ServerError,
+        api_exceptions.DeadlineExceeded,
+        api_exceptions.Aborted,
+        ConnectionError,
+        TimeoutError,
+    ))
+
+
+def retry_hint(error):
+    """Returns the server's suggested retry delay in seconds, if the error carries one."""
+    for detail in getattr(error, "details", None) or ():
+        if isinstance(detail, dict):  # REST transport: {"@type": ".../google.rpc.RetryInfo", "retryDelay": "1.5s"}
+            delay = detail.get("retryDelay")
+            if isinstance(delay, str) and delay.endswith("s"):
+                try:
+                    return float(delay[:-1])
+                except ValueError:
+                    pass
+            continue
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None and hasattr(delay, "seconds"):
+            return delay.seconds + delay.nanos / 1e9
+    response = getattr(error, "response", None)
+    retry_after = getattr(response, "headers", {}).get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    match = re.search(r"retry in ([0-9.]+)s", str(error))
+    return float(match.group(1)) if match else None
+
+
+class GeminiScheduler:
+    """Process-wide client-side scheduler for Gemini calls.
+
+    Each model has a requests-per-minute and a tokens-per-minute bucket; file operations share a
+    requests-only bucket. Calls wait for budget in priority order, and retryable failures are retried
+    with jittered exponential backoff. A 429 pauses the whole model so concurrent sessions back off together.
+    """
+
+    def __init__(self, rate_limits=None, default_limit=DEFAULT_RATE_LIMIT, files_limit=FILES_RATE_LIMIT,
+                 max_attempts=RETRY_MAX_ATTEMPTS, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+        self.rate_limits = rate_limits if rate_limits is not None else MODEL_RATE_LIMITS
+        self.default_limit = default_limit
+        self.files_limit = files_limit
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._cond = threading.Condition()
+        self._buckets = {}
+        self._paused_until = {}
+        self._interactive_waiting = 0
+        self.stats = {"calls": 0, "retries": 0, "failures": 0, "throttled_s": 0.0}
+
+    def _buckets_for(self, key):
+        if key not in self._buckets:
+            if key == "files":
+                self._buckets[key] = (TokenBucket(self.files_limit), None)
+            else:
+                requests_per_minute, tokens_per_minute = self.rate_limits.get(key, self.default_limit)
+                self._buckets[key] = (TokenBucket(requests_per_minute), TokenBucket(tokens_per_minute))
+        return self._buckets[key]
+
+    def acquire(self, key, tokens=0, priority=INTERACTIVE):
+        """Blocks until a request of `tokens` estimated tokens may be sent for `key` (a model name or "files").
+
+        Returns the seconds spent waiting.
+        """
+        reserve = BATCH_RESERVE if priority == BATCH else 0.0
+        start = time.monotonic()
+        with self._cond:
+            if priority == INTERACTIVE:
+                self._interactive_waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    request_bucket, token_bucket = self._buckets_for(key)
+                    request_bucket.refill(now)
+                    delay = max(request_bucket.wait_time(1, reserve), self._paused_until.get(key, 0) - now)
+                    if token_bucket is not None:
+                        token_bucket.refill(now)
+                        delay = max(delay, token_bucket.wait_time(tokens, reserve))
+                    if priority == BATCH and self._interactive_waiting:
+                        delay = max(delay, 0.05)
+                    if delay <= 0:
+                        request_bucket.take(1)
+                        if token_bucket is not None:
+                            token_bucket.take(tokens)
+                        self.stats["calls"] += 1
+                        self.stats["throttled_s"] += now - start
+                        return now - start
+                    self._cond.wait(delay)
+            finally:
+                if priority == INTERACTIVE:
+                    self._interactive_waiting -= 1
+                    self._cond.notify_all()
+
+    def settle(self, key, estimated_tokens, actual_tokens):
+        """Charges or refunds the difference between a call's estimated and actual token usage."""
+        if actual_tokens is None:
+            return
+        with self._cond:
+            _, token_bucket = self._buckets_for(key)
+            if token_bucket is not None:
+                token_bucket.level += estimated_tokens - actual_tokens
+                self._cond.notify_all()
+
+    def pause(self, key, seconds):
+        """Holds back every caller of `key` for `seconds`, e.g. after the server reports a rate limit."""
+        with self._cond:
+            self._paused_until[key] = max(self._paused_until.get(key, 0), time.monotonic() + seconds)
+
+    def call(self, fn, key, tokens=0, priority=INTERACTIVE, record=None):
+        """Runs fn() under the rate limit for `key`, retrying retryable errors with jittered exponential backoff.
+
+        Raise NonRetryableError from fn to give up on an error that would otherwise be retried, e.g. after a
+        stream has already produced output; its cause is re-raised. Queue time and retries are added to
+        `record`, a metrics.CallRecord, when one is given.
+        """
+        from google.api_core import exceptions as api_exceptions
+        for attempt in range(self.max_attempts):
+            waited = self.acquire(key, tokens, priority)
+            if record is not None:
+                record.queue_time += waited
+                record.retries = attempt
+            try:
+                return fn()
+            except NonRetryableError as e:
+                self.stats["failures"] += 1
+                raise e.__cause__
+            except Exception as e:
+                if attempt == self.max_attempts - 1 or not is_retryable(e):
+                    self.stats["failures"] += 1
+                    raise
+                # Full jitter keeps concurrent retries from arriving in lockstep; a server hint is a floor
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                hint = retry_hint(e)
+                if hint is not None:
+                    delay = max(delay, hint)
+                if isinstance(e, (api_exceptions.TooManyRequests, api_exceptions.ResourceExhausted)):
+                    self.pause(key, delay)
+                self.stats["retries"] += 1
+                time.sleep(delay)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Returns the process-wide scheduler, so every session and worker thread shares one budget."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            rate_limits = dict(MODEL_RATE_LIMITS)
+            default_limit = DEFAULT_RATE_LIMIT
+            if os.getenv("GEMINI_REQUESTS_PER_MINUTE") or os.getenv("GEMINI_TOKENS_PER_MINUTE"):
+                default_limit = (
+                    int(os.getenv("GEMINI_REQUESTS_PER_MINUTE", DEFAULT_RATE_LIMIT[0])),
+                    int(os.getenv("GEMINI_TOKENS_PER_MINUTE", DEFAULT_RATE_LIMIT[1])),
+                )
+                rate_limits = {}
+            _scheduler = GeminiScheduler(rate_limits, default_limit)
+        return _scheduler
+
+
+def estimate_tokens(text, model_version=None):
+    """Token estimate used to reserve budget and check context limits before a call, calibrated per model."""
+    return token_accounting.estimate_tokens(model_version, token_accounting.count_tokens(text))
+
+
+def count_input_tokens(model_version, contents, local_tokens=None):
+    """Gemini's own count of the input tokens in contents, via count_tokens through the shared scheduler.
+
+    When local_tokens (the local count of the same contents) is given, it calibrates later estimates.
+    """
+    model = genai.GenerativeModel(model_version)
+    with track_call("count_tokens", model_version) as record:
+        record.input_tokens = get_scheduler().call(lambda: model.count_tokens(contents), model_version, record=record).total_tokens
+    token_accounting.calibrate(model_version, local_tokens, record.input_tokens)
+    return record.input_tokens
+
+
+def record_usage(record, response):
+    """Copies a response's token counts from usage_metadata into a metrics CallRecord."""
+    usage = getattr(response, "usage_metadata", None)
+    record.input_tokens = getattr(usage, "prompt_token_count", None)
+    record.output_tokens = getattr(usage, "candidates_token_count", None)
+
+
+def call_gemini(settings, prompt, stream=False, on_chunk=None, priority=INTERACTIVE, operation="generate_content"):
+    """Sends one prompt through the shared scheduler and returns a GenerationResult with latency and token usage.
+
+    With stream=True, on_chunk(text) is called with each chunk's text as it arrives. A stream that fails
+    after producing output is not retried, since its chunks have already been delivered. The call is
+    recorded in the metrics under `operation`. Raises token_accounting.ContextLimitExceeded, without
+    sending anything, when the prompt can't fit the model's context window.
+    """
+    scheduler = get_scheduler()
+    local_tokens = token_accounting.count_tokens(prompt)
+    model = genai.GenerativeModel(settings.model_version)
+    start = time.perf_counter()
+    first_token_at = None
+
+    def attempt():
+        nonlocal first_token_at
+        response = model.generate_content(prompt, generation_config=settings.generation_config(), stream=stream)
+        if not stream:
+            return response, response.text
+        chunks = []
+        try:
+            for chunk in response:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                chunks.append(chunk.text)
+                if on_chunk is not None:
+                    on_chunk(chunk.text)
+        except Exception as e:
+            if chunks:
+                raise NonRetryableError() from e
+            raise
+        return response, "".join(chunks)
+
+    with track_call(operation, settings.model_version) as record:
+        estimated_tokens = token_accounting.check_input_tokens(
+            settings.model_version,
+            token_accounting.estimate_tokens(settings.model_version, local_tokens),
+            exact_count=lambda: count_input_tokens(settings.model_version, prompt, local_tokens),
+        )
+        response, text = scheduler.call(attempt, settings.model_version, estimated_tokens, priority, record)
+        record.latency = time.perf_counter() - start
+        record_usage(record, response)
+        record.time_to_first_token = first_token_at - start if first_token_at is not None else None
+    scheduler.settle(settings.model_version, estimated_tokens, record.input_tokens)
+    token_accounting.calibrate(settings.model_version, local_tokens, record.input_tokens)
+    return GenerationResult(
+        text=text,
+        latency=record.latency,
+        time_to_first_token=record.time_to_first_token,
+        input_tokens=record.input_tokens,
+        output_tokens=record.output_tokens,
+        queue_time=record.queue_time,
+        retries=record.retries,
+    )
+
+
+@traceable # Langsmith Tracing and Observability
+def generate_prompt(settings, task, variables="", cache=None, bypass_cache=False, stream=False, on_text=None, priority=INTERACTIVE):
+    """Generates a COT prompt for task. With stream=True, on_text is called with the accumulated text per chunk."""
+    system_prompt = get_system_prompt(task, variables, settings.model_version, settings.temperature, settings.max_output_tokens)
+    cache_key = settings.cache_key(system_prompt)
+    if cache is not None and not bypass_cache:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return GenerationResult(text=cached, cached=True)
+
+    chunks = []
+
+    def collect(text):
+        chunks.append(text)
+        on_text("".join(chunks))
+
+    result = call_gemini(
+        settings,
+        system_prompt,
+        stream=stream and on_text is not None,
+        on_chunk=collect if on_text else None,
+        priority=priority,
+        operation="generate_prompt",
+    )
+    if cache is not None:
+        cache.set(cache_key, result.text)
+    return result
+
+
+@traceable # Langsmith Tracing and Observability
+def generate_test_data(settings, topic, num_pairs, subtopic=None, cache=None, bypass_cache=False, stream=False, on_pair=None, priority=INTERACTIVE):
+    """Generates conversation pairs, parsing them as they arrive.
+
+    on_pair(pair, count) is called as each complete pair is parsed. Raises ValueError when the response
+    contains no valid pair; a truncated response keeps every complete pair and is not cached.
+    """
+    prompt = get_test_data_prompt(topic, num_pairs, subtopic)
+    cache_key = settings.cache_key(prompt)
+    parser = PairStreamParser()
+    pairs = []
+
+    def collect(text):
+        for pair in parser.feed(text):
+            pairs.append(pair)
+            if on_pair is not None:
+                on_pair(pair, len(pairs))
+
+    cached = None if cache is None or bypass_cache else cache.get(cache_key)
+    if cached is not None:
+        result = GenerationResult(text=cached, cached=True)
+        collect(cached)
+    else:
+        result = call_gemini(settings, prompt, stream=stream, on_chunk=collect if stream else None, priority=priority, operation="generate_test_data")
+        if not stream:
+            collect(result.text)
+
+    if not pairs:
+        raise ValueError("Could not extract valid JSON from the response")
+    if cache is not None and not result.cached and not parser.truncated:
+        cache.set(cache_key, result.text)
+    return TestDataResult(**asdict(result), pairs=pairs, truncated=parser.truncated, invalid=parser.invalid)
+
+
+# Sharded dataset generation for targets beyond a single completion
+def plan_shards(num_pairs, tokens_per_pair, max_output_tokens):
+    """Splits num_pairs into shard sizes that fit comfortably within max_output_tokens."""
+    shard_size = int(max_output_tokens * DATASET_OUTPUT_HEADROOM / max(tokens_per_pair, 1))
+    shard_size = max(1, min(DATASET_MAX_PAIRS_PER_SHARD, shard_size))
+    shards = [shard_size] * (num_pairs // shard_size)
+    if num_pairs % shard_size:
+        shards.append(num_pairs % shard_size)
+    return shards
+
+
+def generate_subtopics(settings, topic, count, priority=INTERACTIVE):
+    """Asks the model for distinct sub-topics used to seed shards. Falls back to the topic itself."""
+    prompt = f"""List {count} distinct, non-overlapping sub-topics for the topic: {topic}.
+    Format the output as a valid JSON array of strings. Do not include any text before or after the JSON array.
+    """
+    try:
+        text = call_gemini(settings, prompt, priority=priority, operation="generate_subtopics").text
+        subtopics = json.loads(text[text.index("["):text.rindex("]") + 1])
+        subtopics = [subtopic for subtopic in subtopics if isinstance(subtopic, str) and subtopic.strip()]
+    except Exception:
+        subtopics = []
+    return subtopics or [topic]
+
+
+# Gemini file uploads
+def upload_file(path, mime_type=None, display_name=None):
+    """Uploads the given file to Gemini, recording its size and upload duration."""
+    with track_call("upload_file", "files") as record:
+        record.size_bytes = os.path.getsize(path)
+        return get_scheduler().call(lambda: genai.upload_file(path, mime_type=mime_type, display_name=display_name), "files", record=record)
+
+
+def get_file(name):
+    """Fetches a file's current state, rate limited and retried like every other Gemini call."""
+    with track_call("get_file", "files") as record:
+        return get_scheduler().call(lambda: genai.get_file(name), "files", record=record)
+
+
+# Gemini context caches
+def update_context_cache(cached_content, ttl):
+    """Extends a context cache to expire `ttl` (a timedelta) from now, rate limited and retried under its model."""
+    model_version = cached_content.model.removeprefix("models/")
+    with track_call("update_context_cache", model_version) as record:
+        get_scheduler().call(lambda: cached_content.update(ttl=ttl), model_version, record=record)
+
+
+def delete_context_cache(cached_content):
+    """Deletes a context cache, rate limited and retried under its model."""
+    model_version = cached_content.model.removeprefix("models/")
+    with track_call("delete_context_cache", model_version) as record:
+        get_scheduler().call(cached_content.delete, model_version, record=record)
+
+
+def wait_for_file_active(name, stop_event=None):
+    """Polls a single file with adaptive backoff until it leaves PROCESSING. Safe to run in a worker thread.
+
+    The time until the file is ready is recorded as a "file_processing" call.
+    """
+    stop_event = stop_event or threading.Event()
+    interval = UPLOAD_POLL_INITIAL_INTERVAL
+    with track_call("file_processing", "files") as record:
+        file = get_file(name)
+        while file.state.name == "PROCESSING":
+            if stop_event.wait(interval):
+                record.error = "Cancelled"
+                return file
+            interval = min(interval * UPLOAD_POLL_BACKOFF, UPLOAD_POLL_MAX_INTERVAL)
+            file = get_file(name)
+        record.size_bytes = getattr(file, "size_bytes", None)
+        if file.state.name != "ACTIVE":
+            raise Exception(f"File {file.name} failed to process")
+    return file
+
+
+def run_bounded(fn, items, concurrency):
+    """Calls fn(item) for each item concurrently, yielding (item, result, error) as each call finishes.
+
+    At most `concurrency` calls are in flight and at most twice that many items are read ahead, so an
+    arbitrarily long item stream runs in bounded memory. Items that haven't started when the caller stops
+    iterating are dropped.
+    """
+    items = iter(items)
+    pending = {}
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    def submit_next():
+        for item in items:
+            pending[executor.submit(fn, item)] = item
+            return True
+        return False
+
+    try:
+        for _ in range(concurrency * 2):
+            if not submit_next():
+                break
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    yield item, None, e
+                else:
+                    yield item, result, None
+                submit_next()
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def run_prompt_batch(settings, tasks, concurrency=8, cache=None, bypass_cache=False):
+    """Generates a prompt for each {"task", "variables"} dict concurrently, yielding (task, result, error) as each finishes.
+
+    Tasks are read ahead and run as in run_bounded, at BATCH priority.
+    """
+    def run(task):
+        return generate_prompt(settings, task["task"], task.get("variables", ""), cache, bypass_cache, priority=BATCH)
+
+    yield from run_bounded(run, tasks, concurrency)
+
+
+# Model comparison: the same input against several models and sampling settings
+def compare_models(settings_list, task=None, variables="", topic=None, num_pairs=None, concurrency=4):
+    """Runs one prompt task, or one test data shard for `topic`, with each GenerationSettings concurrently.
+
+    Yields (settings, result, error) as each run finishes. Responses are always streamed, so time to first
+    token is measured, and never come from the response cache. Runs that haven't started when the caller
+    stops iterating are dropped.
+    """
+    def run(settings):
+        if task is not None:
+            return generate_prompt(settings, task, variables, stream=True, on_text=lambda text: None)
+        return generate_test_data(settings, topic, num_pairs, stream=True)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(settings_list)))) as executor:
+        futures = {executor.submit(run, settings): settings for settings in settings_list}
+        try:
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result(), None
+                except Exception as e:
+                    yield futures[future], None, e
+        finally:
+            executor.shutdown(cancel_futures=True)
@@ -0,0 +1,41 @@
+# Downloads the app's Lottie animations into media/lottie so the app never fetches them at runtime.
+#
+# Run once from the repository root and commit the resulting JSON files:
+#     python media/lottie/download_lottie_assets.py
+#
+# Until they are vendored, the app shows the static Mobius image in the header and no other animations.
+
+import os
+import sys
+
+import requests
+
+LOTTIE_ASSETS = {
+    "mobius": "https://lottie.host/9dc7375c-8c39-440b-a29f-e118a08c78f1/TCHsASemR7.json",
+    "ai": "https://assets5.lottiefiles.com/packages/lf20_zrqthn6o.json",
+    "analysis": "https://assets5.lottiefiles.com/private_files/lf30_wqypnpu5.json",
+}
+
+
+def main():
+    folder = os.path.dirname(os.path.abspath(__file__))
+    failed = False
+    for name, url in LOTTIE_ASSETS.items():
+        try:
+            r = requests.get(url, timeout=30)
+        except requests.RequestException as e:
+            print(f"Error downloading {name}: {e}")
+            failed = True
+            continue
+        if r.status_code != 200:
+            print(f"Error downloading {name}: HTTP {r.status_code}")
+            failed = True
+            continue
+        with open(os.path.join(folder, f"{name}.json"), "w", encoding="utf-8") as f:
+            f.write(r.text)
+        print(f"Saved {name}.json")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
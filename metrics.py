@@ -0,0 +1,250 @@
+# Per-call performance metrics for the Gemini-AI Prompt Engineering Toolkit.
+#
+# Every Gemini call is recorded as a CallRecord: time spent queued in the rate limiter, time to first
+# token, total latency, token usage and retries, plus sizes for file uploads. Records feed Prometheus-style
+# histograms and counters, which can be rendered in the Prometheus text format or served on /metrics, and
+# a bounded window of recent samples used for percentiles in the app's metrics panel.
+
+import contextlib
+import math
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)  # seconds
+TOKEN_BUCKETS = (100, 500, 1000, 2000, 4000, 8000, 16000, 32000, 128000, 1000000)
+SIZE_BUCKETS = (10_000, 100_000, 1_000_000, 10_000_000, 100_000_000, 1_000_000_000)  # bytes
+RECENT_SAMPLES = 1000  # per series, for percentiles
+RECENT_CALLS = 200
+
+
+@dataclass
+class CallRecord:
+    """Timing and usage of one Gemini call, filled in as the call progresses."""
+    operation: str
+    model: str
+    queue_time: float = 0.0  # seconds waiting for rate limit budget, across attempts
+    time_to_first_token: float = None
+    latency: float = None  # seconds from the first attempt to the complete response
+    input_tokens: int = None
+    output_tokens: int = None
+    retries: int = 0
+    size_bytes: int = None  # uploaded file size
+    error: str = None
+    started_at: float = field(default_factory=time.time)
+
+
+class Histogram:
+    """Cumulative Prometheus buckets plus the most recent samples."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def percentile(self, q):
+        """Nearest-rank percentile (0-100) of the recent samples, or None without samples."""
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+# name -> (type, help, buckets) for every series the registry exports
+SERIES = {
+    "gemini_calls_total": ("counter", "Gemini calls by outcome", None),
+    "gemini_call_retries_total": ("counter", "Retried attempts of Gemini calls", None),
+    "gemini_tokens_total": ("counter", "Tokens reported in usage_metadata", None),
+    "gemini_call_latency_seconds": ("histogram", "Time from the first attempt to the complete response", LATENCY_BUCKETS),
+    "gemini_call_queue_seconds": ("histogram", "Time spent waiting for rate limit budget", LATENCY_BUCKETS),
+    "gemini_call_ttft_seconds": ("histogram", "Time to the first streamed chunk", LATENCY_BUCKETS),
+    "gemini_call_input_tokens": ("histogram", "Input tokens per call", TOKEN_BUCKETS),
+    "gemini_call_output_tokens": ("histogram", "Output tokens per call", TOKEN_BUCKETS),
+    "gemini_file_size_bytes": ("histogram", "Size of uploaded files", SIZE_BUCKETS),
+}
+
+
+class MetricsRegistry:
+    """Thread-safe store of labelled counters and histograms built from CallRecords."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}  # (name, labels) -> float or Histogram
+        self._calls = deque(maxlen=RECENT_CALLS)
+
+    def _inc(self, name, amount, labels):
+        key = (name, labels)
+        self._series[key] = self._series.get(key, 0) + amount
+
+    def _observe(self, name, value, labels):
+        key = (name, labels)
+        if key not in self._series:
+            self._series[key] = Histogram(SERIES[name][2])
+        self._series[key].observe(value)
+
+    def record(self, record):
+        """Adds a finished call to every series it contributes to."""
+        labels = (("operation", record.operation), ("model", record.model))
+        with self._lock:
+            self._calls.append(record)
+            self._inc("gemini_calls_total", 1, labels + (("status", "error" if record.error else "ok"),))
+            if record.retries:
+                self._inc("gemini_call_retries_total", record.retries, labels)
+            self._observe("gemini_call_queue_seconds", record.queue_time, labels)
+            if record.latency is not None:
+                self._observe("gemini_call_latency_seconds", record.latency, labels)
+            if record.time_to_first_token is not None:
+                self._observe("gemini_call_ttft_seconds", record.time_to_first_token, labels)
+            for direction, tokens in (("input", record.input_tokens), ("output", record.output_tokens)):
+                if tokens is not None:
+                    self._inc("gemini_tokens_total", tokens, labels + (("direction", direction),))
+                    self._observe(f"gemini_call_{direction}_tokens", tokens, labels)
+            if record.size_bytes is not None:
+                self._observe("gemini_file_size_bytes", record.size_bytes, labels)
+
+    def recent_calls(self):
+        """The most recent CallRecords as dicts, newest first."""
+        with self._lock:
+            return [asdict(record) for record in reversed(self._calls)]
+
+    def summary(self):
+        """One row per (operation, model): call and error counts, latency percentiles, retries and tokens."""
+        rows = {}
+        with self._lock:
+            for (name, labels), value in self._series.items():
+                label_map = dict(labels)
+                row = rows.setdefault((label_map["operation"], label_map["model"]), {
+                    "operation": label_map["operation"],
+                    "model": label_map["model"],
+                    "calls": 0,
+                    "errors": 0,
+                    "retries": 0,
+                    "latency_p50_s": None,
+                    "latency_p95_s": None,
+                    "latency_p99_s": None,
+                    "ttft_p50_s": None,
+                    "ttft_p95_s": None,
+                    "queue_p50_s": None,
+                    "queue_p95_s": None,
+                    "input_tokens": 0,
+                    "output_tokens": 0,
+                })
+                if name == "gemini_calls_total":
+                    row["calls"] += value
+                    if label_map["status"] == "error":
+                        row["errors"] += value
+                elif name == "gemini_call_retries_total":
+                    row["retries"] += value
+                elif name == "gemini_tokens_total":
+                    row[f"{label_map['direction']}_tokens"] += value
+                elif name in ("gemini_call_latency_seconds", "gemini_call_queue_seconds", "gemini_call_ttft_seconds"):
+                    prefix = name[len("gemini_call_"):-len("_seconds")]
+                    row[f"{prefix}_p50_s"] = value.percentile(50)
+                    row[f"{prefix}_p95_s"] = value.percentile(95)
+                    if prefix == "latency":
+                        row["latency_p99_s"] = value.percentile(99)
+        return sorted(rows.values(), key=lambda row: (row["operation"], row["model"]))
+
+    def prometheus_text(self):
+        """Renders every series in the Prometheus text exposition format."""
+        by_name = {}
+        with self._lock:
+            for (name, labels), value in self._series.items():
+                by_name.setdefault(name, []).append((labels, value))
+            lines = []
+            for name, (kind, help_text, _) in SERIES.items():
+                if name not in by_name:
+                    continue
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in sorted(by_name[name], key=lambda item: item[0]):
+                    if kind == "counter":
+                        lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+                        continue
+                    for bound, count in zip(value.buckets, value.counts):
+                        lines.append(f"{name}_bucket{format_labels(labels + (('le', format_value(bound)),))} {count}")
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {value.count}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {format_value(value.sum)}")
+                    lines.append(f"{name}_count{format_labels(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self._calls.clear()
+
+
+def format_labels(labels):
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in labels) + "}"
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics():
+    """Returns the process-wide registry shared by every session and worker thread."""
+    return _registry
+
+
+@contextlib.contextmanager
+def track_call(operation, model):
+    """Yields a CallRecord to fill in during the call, and records it on exit, with the error if one is raised.
+
+    Latency defaults to the time spent inside the block.
+    """
+    record = CallRecord(operation, model)
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record.error = type(e).__name__
+        raise
+    finally:
+        if record.latency is None:
+            record.latency = time.perf_counter() - start
+        _registry.record(record)
+
+
+# Prometheus scrape endpoint
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = get_metrics().prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve_metrics(port, host="0.0.0.0"):
+    """Serves the registry on http://host:port/metrics from a daemon thread and returns the server."""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,17 @@
+# PDF text extraction workers for the Gemini-AI Prompt Engineering Toolkit.
+#
+# Streamlit runs the app script as __main__, so functions defined there can't be pickled
+# into a process pool. The worker functions live in this importable module instead.
+
+import PyPDF2
+
+
+def count_pages(path):
+    """Returns the number of pages in the PDF at path."""
+    return len(PyPDF2.PdfReader(path).pages)
+
+
+def extract_page_range(path, start, stop):
+    """Extracts the text of pages [start, stop) from the PDF at path. Runs in a worker process."""
+    pdf_reader = PyPDF2.PdfReader(path)
+    return [pdf_reader.pages[page_num].extract_text() or "" for page_num in range(start, stop)]
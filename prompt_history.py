@@ -0,0 +1,174 @@
+# Persistent prompt history for the Gemini-AI Prompt Engineering Toolkit.
+#
+# Every generated prompt is recorded in a local SQLite database with its task, variables, model settings,
+# output, latency and token counts, so nothing is lost when a session ends and nothing is held in session
+# memory. An FTS5 index over task, variables and output serves searches newest first, reading its posting
+# lists backwards and stopping at the result limit, so search stays in the milliseconds with tens of
+# thousands of prompts. Repeated tasks are matched on a normalized form of the task, and near-identical
+# wordings through the same index, so they can be answered from history without calling Gemini.
+
+import hashlib
+import math
+import re
+import sqlite3
+import time
+
+import sqlite_store
+
+NEAR_MATCH_THRESHOLD = 0.9  # Jaccard similarity of two tasks' word sets
+NEAR_MATCH_CANDIDATES = 200  # most recent entries checked for a near match
+SEARCH_LIMIT = 50
+
+WORD_PATTERN = re.compile(r"[^\W_]+")  # the words FTS5's unicode61 tokenizer indexes
+COLUMNS = (
+    "id", "created_at", "task", "variables", "model_version", "temperature", "max_output_tokens", "output",
+    "latency", "time_to_first_token", "input_tokens", "output_tokens",
+)
+
+
+def words(text):
+    return WORD_PATTERN.findall(text.lower())
+
+
+def normalize(text):
+    """Lowercased words of text, so case, punctuation and spacing don't make two tasks differ."""
+    return " ".join(words(text))
+
+
+def task_key(task, variables, settings):
+    payload = "\x1f".join([normalize(task), normalize(variables), settings.model_version, repr(settings.temperature), str(settings.max_output_tokens)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def fts_query(terms, operator="AND", prefix=False):
+    """An FTS5 query for the terms joined with operator; with prefix=True the last term also matches as a prefix."""
+    terms = [f'"{term}"' for term in dict.fromkeys(terms)]
+    if not terms:
+        return None
+    if prefix:
+        terms[-1] += "*"
+    return f" {operator} ".join(terms)
+
+
+class PromptHistory:
+    """SQLite store of generated prompts with an external-content FTS5 index kept in sync by triggers."""
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS prompts ("
+                "id INTEGER PRIMARY KEY, created_at REAL NOT NULL, task TEXT NOT NULL, variables TEXT NOT NULL, "
+                "task_key TEXT NOT NULL, model_version TEXT NOT NULL, temperature REAL NOT NULL, "
+                "max_output_tokens INTEGER NOT NULL, output TEXT NOT NULL, latency REAL, time_to_first_token REAL, "
+                "input_tokens INTEGER, output_tokens INTEGER)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS prompts_task_key ON prompts (task_key)")
+            conn.execute("CREATE INDEX IF NOT EXISTS prompts_model ON prompts (model_version)")
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS prompts_fts USING fts5("
+                "task, variables, output, content='prompts', content_rowid='id', tokenize='unicode61', prefix='2 3')"
+            )
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS prompts_vocab USING fts5vocab(prompts_fts, 'col')")
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS prompts_fts_insert AFTER INSERT ON prompts BEGIN "
+                "INSERT INTO prompts_fts (rowid, task, variables, output) VALUES (new.id, new.task, new.variables, new.output); END"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS prompts_fts_delete AFTER DELETE ON prompts BEGIN "
+                "INSERT INTO prompts_fts (prompts_fts, rowid, task, variables, output) "
+                "VALUES ('delete', old.id, old.task, old.variables, old.output); END"
+            )
+
+    def _connect(self):
+        return sqlite_store.connect(self.path, sqlite3.Row)
+
+    def record(self, task, variables, settings, result):
+        """Stores a generated prompt (a GenerationResult) and returns its id."""
+        with self._connect() as conn:
+            return conn.execute(
+                "INSERT INTO prompts (created_at, task, variables, task_key, model_version, temperature, max_output_tokens, "
+                "output, latency, time_to_first_token, input_tokens, output_tokens) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    time.time(), task, variables, task_key(task, variables, settings), settings.model_version, settings.temperature,
+                    settings.max_output_tokens, result.text, result.latency, result.time_to_first_token, result.input_tokens,
+                    result.output_tokens,
+                ),
+            ).lastrowid
+
+    def find_match(self, task, variables, settings):
+        """Returns the latest entry for the same or a near-identical task with the same variables and settings, or None.
+
+        Tasks are the same when they only differ in case, punctuation or spacing, and near-identical when
+        their word sets are at least NEAR_MATCH_THRESHOLD similar.
+        """
+        columns = ", ".join("p." + column for column in COLUMNS)
+        task_words = set(words(task))
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT {columns} FROM prompts p WHERE p.task_key = ? ORDER BY p.id DESC LIMIT 1",
+                (task_key(task, variables, settings),),
+            ).fetchone()
+            if row is not None:
+                return dict(row)
+            if not task_words:
+                return None
+            # A near-identical task lacks at most `missing` of these words, so it has one of the `missing + 1`
+            # rarest; looking candidates up by those keeps the lookup fast however common the other words are
+            missing = len(task_words) - math.ceil(NEAR_MATCH_THRESHOLD * len(task_words))
+            placeholders = ", ".join("?" * len(task_words))
+            counts = dict(conn.execute(
+                f"SELECT term, doc FROM prompts_vocab WHERE col = 'task' AND term IN ({placeholders})", tuple(task_words)
+            ).fetchall())
+            rarest = sorted(task_words, key=lambda word: counts.get(word, 0))[:missing + 1]
+            candidates = conn.execute(
+                f"SELECT {columns} FROM prompts_fts CROSS JOIN prompts p ON p.id = prompts_fts.rowid "
+                "WHERE prompts_fts MATCH ? AND p.model_version = ? AND p.temperature = ? AND p.max_output_tokens = ? "
+                "ORDER BY prompts_fts.rowid DESC LIMIT ?",
+                (f"task : ({fts_query(rarest, 'OR')})", settings.model_version, settings.temperature, settings.max_output_tokens, NEAR_MATCH_CANDIDATES),
+            ).fetchall()
+        variables = normalize(variables)
+        best, best_score = None, NEAR_MATCH_THRESHOLD
+        for candidate in candidates:
+            if normalize(candidate["variables"]) != variables:
+                continue
+            candidate_words = set(words(candidate["task"]))
+            score = len(task_words & candidate_words) / len(task_words | candidate_words)
+            if score > best_score or (best is None and score == best_score):
+                best, best_score = dict(candidate), score
+        return best
+
+    def search(self, text="", model_version=None, limit=SEARCH_LIMIT):
+        """The latest entries, or the latest containing every word of text (the last word may be a prefix)."""
+        filters, parameters = [], []
+        if model_version:
+            filters.append("p.model_version = ?")
+            parameters.append(model_version)
+        query = fts_query(words(text), prefix=True)
+        columns = ", ".join("p." + column for column in COLUMNS)
+        with self._connect() as conn:
+            if query is None:
+                where = f"WHERE {' AND '.join(filters)} " if filters else ""
+                rows = conn.execute(f"SELECT {columns} FROM prompts p {where}ORDER BY p.id DESC LIMIT ?", (*parameters, limit))
+            else:
+                where = "".join(f" AND {condition}" for condition in filters)
+                rows = conn.execute(
+                    f"SELECT {columns} FROM prompts_fts CROSS JOIN prompts p ON p.id = prompts_fts.rowid "
+                    f"WHERE prompts_fts MATCH ?{where} ORDER BY prompts_fts.rowid DESC LIMIT ?",
+                    (query, *parameters, limit),
+                )
+            return [dict(row) for row in rows.fetchall()]
+
+    def count(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM prompts").fetchone()[0]
+
+    def delete(self, entry_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM prompts WHERE id = ?", (entry_id,))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM prompts")
+            conn.execute("INSERT INTO prompts_fts (prompts_fts) VALUES ('rebuild')")
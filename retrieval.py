@@ -0,0 +1,146 @@
+# Local lexical retrieval for the Gemini-AI Prompt Engineering Toolkit.
+#
+# Documents are split into overlapping word-window chunks and indexed with Okapi BM25. The postings are
+# stored in numpy arrays, one index per document, persisted as a single .npz keyed on the document's
+# content hash. No external vector store or embedding model is involved.
+
+import json
+import os
+import re
+
+import numpy as np
+
+CHUNK_WORDS = 250
+CHUNK_OVERLAP_WORDS = 50
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+WORD_PATTERN = re.compile(r"\S+")
+TERM_PATTERN = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have he her his i if in into is it its me my no not of on or our "
+    "she so such than that the their them then there these they this to was we were what when where which who "
+    "will with you your".split()
+)
+
+
+def tokenize(text):
+    """Lowercased word terms, without stopwords and single characters."""
+    return [term for term in TERM_PATTERN.findall(text.lower()) if len(term) > 1 and term not in STOPWORDS]
+
+
+def chunk_text(text, chunk_words=CHUNK_WORDS, overlap_words=CHUNK_OVERLAP_WORDS):
+    """Splits text into windows of chunk_words words that overlap by overlap_words, keeping the original formatting."""
+    words = [match.span() for match in WORD_PATTERN.finditer(text)]
+    step = max(1, chunk_words - overlap_words)
+    chunks = []
+    for start in range(0, len(words), step):
+        window = words[start:start + chunk_words]
+        chunks.append(text[window[0][0]:window[-1][1]])
+        if start + chunk_words >= len(words):
+            break
+    return chunks
+
+
+class BM25Index:
+    """BM25 over the chunks of one document, with term postings in compressed sparse column form."""
+
+    def __init__(self, chunks, vocabulary, indptr, chunk_ids, term_freqs, chunk_lengths):
+        self.chunks = chunks
+        self.vocabulary = vocabulary  # term -> column in indptr
+        self.indptr = indptr  # postings of term t are chunk_ids/term_freqs[indptr[t]:indptr[t + 1]]
+        self.chunk_ids = chunk_ids
+        self.term_freqs = term_freqs
+        self.chunk_lengths = chunk_lengths
+        self.avg_length = float(chunk_lengths.mean()) if len(chunk_lengths) else 0.0
+        document_freqs = np.diff(indptr)
+        self.idf = np.log1p((len(chunks) - document_freqs + 0.5) / (document_freqs + 0.5))
+
+    @classmethod
+    def build(cls, chunks):
+        postings = {}
+        chunk_lengths = np.zeros(len(chunks), dtype=np.int32)
+        for chunk_id, chunk in enumerate(chunks):
+            terms = tokenize(chunk)
+            chunk_lengths[chunk_id] = len(terms)
+            counts = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+            for term, count in counts.items():
+                postings.setdefault(term, []).append((chunk_id, count))
+
+        vocabulary = {term: column for column, term in enumerate(sorted(postings))}
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        for term, column in vocabulary.items():
+            indptr[column + 1] = len(postings[term])
+        np.cumsum(indptr, out=indptr)
+        chunk_ids = np.empty(indptr[-1], dtype=np.int32)
+        term_freqs = np.empty(indptr[-1], dtype=np.float32)
+        for term, column in vocabulary.items():
+            entries = np.array(postings[term], dtype=np.int64).reshape(-1, 2)
+            chunk_ids[indptr[column]:indptr[column + 1]] = entries[:, 0]
+            term_freqs[indptr[column]:indptr[column + 1]] = entries[:, 1]
+        return cls(chunks, vocabulary, indptr, chunk_ids, term_freqs, chunk_lengths)
+
+    def search(self, query, k=10):
+        """Returns up to k (score, chunk_id) pairs for chunks sharing at least one term with query, best first."""
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        length_norm = BM25_K1 * (1 - BM25_B + BM25_B * self.chunk_lengths / max(self.avg_length, 1e-9))
+        for term in set(tokenize(query)):
+            column = self.vocabulary.get(term)
+            if column is None:
+                continue
+            start, stop = self.indptr[column], self.indptr[column + 1]
+            ids = self.chunk_ids[start:stop]
+            tf = self.term_freqs[start:stop]
+            # Each chunk appears at most once per term, so plain fancy-index accumulation is safe
+            scores[ids] += self.idf[column] * tf * (BM25_K1 + 1) / (tf + length_norm[ids])
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k)[:k]]
+        order = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(float(scores[chunk_id]), int(chunk_id)) for chunk_id in order]
+
+    def save(self, path):
+        """Writes the index to path (.npz) atomically."""
+        meta = json.dumps({"chunks": self.chunks, "terms": sorted(self.vocabulary, key=self.vocabulary.get)})
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            meta=np.frombuffer(meta.encode("utf-8"), dtype=np.uint8),
+            indptr=self.indptr,
+            chunk_ids=self.chunk_ids,
+            term_freqs=self.term_freqs,
+            chunk_lengths=self.chunk_lengths,
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+            vocabulary = {term: column for column, term in enumerate(meta["terms"])}
+            return cls(meta["chunks"], vocabulary, data["indptr"], data["chunk_ids"], data["term_freqs"], data["chunk_lengths"])
+
+
+def retrieve(indexes, query, k, token_budget, count_tokens):
+    """Returns the best passages across named indexes as (name, chunk_id, score, text), within token_budget.
+
+    indexes maps a document name to its BM25Index. Scores come from per-document statistics, so they
+    are comparable only approximately across documents.
+    """
+    candidates = []
+    for name, index in indexes.items():
+        candidates.extend((score, name, chunk_id) for score, chunk_id in index.search(query, k))
+    candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+
+    passages = []
+    used_tokens = 0
+    for score, name, chunk_id in candidates[:k]:
+        text = indexes[name].chunks[chunk_id]
+        tokens = count_tokens(text)
+        if used_tokens + tokens > token_budget:
+            continue
+        passages.append((name, chunk_id, score, text))
+        used_tokens += tokens
+    return passages
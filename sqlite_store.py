@@ -0,0 +1,19 @@
+# SQLite connections for the Gemini-AI Prompt Engineering Toolkit's local stores.
+#
+# The response cache, upload registry, upload store, PDF page cache and prompt history are each shared by
+# every Streamlit session, background job and worker thread in the process. A sqlite3 connection can't be
+# used from more than one thread, so the stores never hold one: each operation opens its own, which is cheap
+# for a local file. The stores use WAL journaling so readers aren't blocked by a writer, and a busy timeout
+# so concurrent writers wait for each other instead of failing with "database is locked".
+
+import sqlite3
+
+BUSY_TIMEOUT = 30  # seconds a connection waits for another writer
+
+
+def connect(path, row_factory=None):
+    """A new connection to the database at path; `with connect(path) as conn:` commits when the block succeeds."""
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+    if row_factory is not None:
+        conn.row_factory = row_factory
+    return conn
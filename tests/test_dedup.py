@@ -0,0 +1,80 @@
+import numpy as np
+
+import dedup
+from dedup import DedupIndex
+
+
+def text(i):
+    """A distinct pair text: no word three-grams in common with text(j) for j != i."""
+    return dedup.pair_text({"human": f"question {i} about topic {i * 7}", "ai": f"answer {i} with detail {i * 13} and note {i}"})
+
+
+PARAPHRASE = "The quick brown fox jumps over the lazy dog near the river bank while the sun sets slowly"
+
+
+def test_shingles():
+    assert dedup.shingles("One two") == {"one two"}
+    assert dedup.shingles("One, two. Three four!") == {"one two three", "two three four"}
+
+
+def test_signatures_are_deterministic_and_match_similar_texts():
+    rows = dedup.signatures([PARAPHRASE, PARAPHRASE, PARAPHRASE + " today", text(1)])
+    assert rows.shape == (4, dedup.NUM_PERM)
+    assert rows.dtype == np.uint32
+    assert (rows[0] == rows[1]).all()
+    assert dedup.similarity(rows[0], rows[2]) >= dedup.DUPLICATE_THRESHOLD
+    assert dedup.similarity(rows[0], rows[3]) < 0.2
+
+
+def test_signatures_span_hash_batches(monkeypatch):
+    texts = [text(i) for i in range(7)]
+    expected = dedup.signatures(texts)
+    monkeypatch.setattr(dedup, "HASH_BATCH_SIZE", 3)
+    assert (dedup.signatures(texts) == expected).all()
+
+
+def test_index_drops_near_duplicates_within_a_batch():
+    kept, kept_signatures = DedupIndex().add([PARAPHRASE, text(1), PARAPHRASE + " today", text(2)])
+    assert kept == [0, 1, 3]
+    assert len(kept_signatures) == 3
+
+
+def test_index_drops_near_duplicates_of_earlier_batches():
+    index = DedupIndex()
+    index.add([PARAPHRASE, text(1)])
+    kept, _ = index.add([text(2), PARAPHRASE + " today", text(1)])
+    assert kept == [0]
+    assert index.size == 3
+
+
+def test_index_keeps_distinct_pairs_across_many_batches():
+    index = DedupIndex()
+    total = 0
+    for start in range(0, 300, 25):
+        kept, _ = index.add([text(i) for i in range(start, start + 25)])
+        total += len(kept)
+    assert total == 300
+    assert index.size == 300
+    assert len(index._runs) < 10
+    kept, _ = index.add([text(42), text(299), text(300)])
+    assert kept == [2]
+
+
+def test_signatures_round_trip_through_a_file(tmp_path):
+    index = DedupIndex()
+    _, first = index.add([PARAPHRASE, text(1)])
+    _, second = index.add([text(2)])
+    path = tmp_path / "signatures.bin"
+    with open(path, "ab") as f:
+        f.write(dedup.signature_bytes(first))
+        f.write(dedup.signature_bytes(second))
+    assert path.stat().st_size == 3 * dedup.SIGNATURE_BYTES
+
+    loaded = dedup.load_signatures(path, 3)
+    assert (loaded == np.concatenate([first, second])).all()
+    assert len(dedup.load_signatures(path, 2)) == 2
+
+    restored = DedupIndex(loaded)
+    assert restored.size == 3
+    kept, _ = restored.add([PARAPHRASE + " today", text(3)])
+    assert kept == [1]
@@ -0,0 +1,93 @@
+import pytest
+
+from gemini_toolkit import PairStreamParser
+
+
+def parse(text, chunk_size=1):
+    parser = PairStreamParser()
+    pairs = []
+    for i in range(0, len(text), chunk_size):
+        pairs.extend(parser.feed(text[i:i + chunk_size]))
+    return pairs, parser
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 1000])
+def test_array_of_pairs_in_any_chunking(chunk_size):
+    pairs, parser = parse('[{"human": "a", "ai": "b"}, {"human": "c", "ai": "d"}]', chunk_size)
+    assert pairs == [{"human": "a", "ai": "b"}, {"human": "c", "ai": "d"}]
+    assert parser.invalid == 0
+    assert not parser.truncated
+
+
+def test_pairs_are_yielded_as_soon_as_they_close():
+    parser = PairStreamParser()
+    assert list(parser.feed('[{"human": "a", "ai": "b"}, {"human": "c"')) == [{"human": "a", "ai": "b"}]
+    assert parser.truncated
+    assert list(parser.feed(', "ai": "d"}]')) == [{"human": "c", "ai": "d"}]
+    assert not parser.truncated
+
+
+def test_braces_and_escaped_quotes_inside_strings():
+    text = r'[{"human": "use {x} here", "ai": "a \"}\" and \\"}]'
+    pairs, parser = parse(text)
+    assert pairs == [{"human": "use {x} here", "ai": 'a "}" and \\'}]
+    assert parser.invalid == 0
+
+
+def test_code_fence_and_text_between_objects_are_ignored():
+    pairs, parser = parse('```json\n{"human": "a", "ai": "b"}\n{"human": "c", "ai": "d"}\n```')
+    assert pairs == [{"human": "a", "ai": "b"}, {"human": "c", "ai": "d"}]
+    assert parser.invalid == 0
+
+
+def test_truncated_text_keeps_complete_pairs():
+    pairs, parser = parse('[{"human": "a", "ai": "b"}, {"human": "c", "ai": "d')
+    assert pairs == [{"human": "a", "ai": "b"}]
+    assert parser.truncated
+    assert parser.invalid == 0
+
+
+def test_nested_metadata_belongs_to_its_pair():
+    pairs, parser = parse('[{"human": "a", "ai": "b", "meta": {"topic": "x"}}]')
+    assert pairs == [{"human": "a", "ai": "b", "meta": {"topic": "x"}}]
+    assert parser.invalid == 0
+
+
+@pytest.mark.parametrize("text", [
+    '{"pairs": [{"human": "a", "ai": "b"}, {"human": "c", "ai": "d"}]}',
+    '```json\n{"data": {"pairs": [{"human": "a", "ai": "b"}, {"human": "c", "ai": "d"}]}}\n```',
+])
+def test_pairs_inside_a_wrapper_object(text):
+    pairs, parser = parse(text)
+    assert pairs == [{"human": "a", "ai": "b"}, {"human": "c", "ai": "d"}]
+    assert parser.invalid == 0
+    assert not parser.truncated
+
+
+def test_truncated_wrapper_keeps_complete_pairs():
+    pairs, parser = parse('{"pairs": [{"human": "a", "ai": "b"}, {"human": "c", "ai"')
+    assert pairs == [{"human": "a", "ai": "b"}]
+    assert parser.truncated
+    assert parser.invalid == 0
+
+
+def test_pair_nested_in_a_pair_is_yielded_with_its_parent():
+    pairs, parser = parse('{"human": "a", "ai": "b", "example": {"human": "c", "ai": "d"}}')
+    assert pairs == [
+        {"human": "c", "ai": "d"},
+        {"human": "a", "ai": "b", "example": {"human": "c", "ai": "d"}},
+    ]
+    assert parser.invalid == 0
+
+
+def test_invalid_objects_are_counted():
+    text = '[{"human": "a", "ai": "b"}, {"human": 1, "ai": "x"}, {"bad" "json"}, {"foo": 1}]'
+    pairs, parser = parse(text)
+    assert pairs == [{"human": "a", "ai": "b"}]
+    assert parser.invalid == 3
+
+
+def test_invalid_pair_inside_a_wrapper_is_counted_once():
+    pairs, parser = parse('{"pairs": [{"human": "a", "ai": "b"}, {"human": "c"}]}')
+    assert pairs == [{"human": "a", "ai": "b"}]
+    assert parser.invalid == 1
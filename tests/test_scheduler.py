@@ -0,0 +1,166 @@
+import threading
+import time
+
+import pytest
+from google.api_core import exceptions as api_exceptions
+
+import gemini_toolkit
+from gemini_toolkit import BATCH, INTERACTIVE, GeminiScheduler, NonRetryableError, TokenBucket, retry_hint
+from metrics import CallRecord
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Records retry backoff instead of sleeping through it."""
+    slept = []
+    monkeypatch.setattr(gemini_toolkit.time, "sleep", slept.append)
+    monkeypatch.setattr(gemini_toolkit.random, "uniform", lambda low, high: high)
+    return slept
+
+
+def make_scheduler(**kwargs):
+    kwargs.setdefault("base_delay", 0.001)
+    return GeminiScheduler({"model": (600, 10_000)}, **kwargs)
+
+
+def test_bucket_starts_full_and_refills_up_to_capacity():
+    bucket = TokenBucket(60)
+    assert bucket.wait_time(60) == 0
+    bucket.take(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    bucket.refill(bucket.updated + 30)
+    assert bucket.level == pytest.approx(30)
+    bucket.refill(bucket.updated + 600)
+    assert bucket.level == 60
+
+
+def test_bucket_reserve_holds_back_part_of_the_capacity():
+    bucket = TokenBucket(100)
+    bucket.level = 25
+    assert bucket.wait_time(5) == 0
+    assert bucket.wait_time(5, reserve=0.2) == 0
+    assert bucket.wait_time(10, reserve=0.2) == pytest.approx(5 / bucket.rate)
+
+
+def test_oversized_request_fits_a_full_bucket():
+    bucket = TokenBucket(100)
+    assert bucket.wait_time(1000) == 0
+    assert bucket.wait_time(1000, reserve=0.2) == 0
+    bucket.take(1000)
+    assert bucket.level == 0
+
+
+def test_acquire_waits_once_the_request_budget_is_spent():
+    scheduler = make_scheduler()
+    for _ in range(600):
+        assert scheduler.acquire("model") < 0.01
+    waited = scheduler.acquire("model")
+    assert waited == pytest.approx(0.1, abs=0.05)
+    assert scheduler.stats["calls"] == 601
+
+
+def test_settle_refunds_overestimated_tokens():
+    scheduler = make_scheduler()
+    scheduler.acquire("model", tokens=8_000)
+    scheduler.settle("model", estimated_tokens=8_000, actual_tokens=1_000)
+    _, token_bucket = scheduler._buckets_for("model")
+    assert token_bucket.level == pytest.approx(9_000, abs=10)
+    scheduler.settle("model", estimated_tokens=1_000, actual_tokens=None)
+    assert token_bucket.level == pytest.approx(9_000, abs=10)
+
+
+def test_files_share_a_requests_only_bucket():
+    scheduler = make_scheduler(files_limit=5)
+    request_bucket, token_bucket = scheduler._buckets_for("files")
+    assert request_bucket.capacity == 5
+    assert token_bucket is None
+
+
+def test_batch_waits_while_an_interactive_call_is_queued():
+    scheduler = make_scheduler()
+    scheduler.pause("model", 0.3)
+    interactive = threading.Thread(target=scheduler.acquire, args=("model",), kwargs={"priority": INTERACTIVE})
+    interactive.start()
+    time.sleep(0.05)
+    # A different, idle model still yields to the queued interactive call
+    waited = scheduler.acquire("other", priority=BATCH)
+    interactive.join()
+    assert waited >= 0.2
+
+
+def test_call_retries_rate_limits_and_records_them(sleeps):
+    scheduler = make_scheduler()
+    attempts = []
+
+    def flaky():
+        attempts.append(None)
+        if len(attempts) < 3:
+            raise api_exceptions.TooManyRequests("slow down")
+        return "ok"
+
+    record = CallRecord("generate_content", "model")
+    assert scheduler.call(flaky, "model", record=record) == "ok"
+    assert len(attempts) == 3
+    assert sleeps == [0.001, 0.002]
+    assert record.retries == 2
+    assert scheduler.stats["retries"] == 2
+    assert scheduler.stats["failures"] == 0
+    assert "model" in scheduler._paused_until
+
+
+def test_call_uses_the_server_retry_hint_as_a_floor(sleeps):
+    scheduler = make_scheduler()
+    outcomes = iter([api_exceptions.ServiceUnavailable("busy, retry in 2.5s"), "ok"])
+
+    def fn():
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert scheduler.call(fn, "model") == "ok"
+    assert sleeps == [2.5]
+
+
+def test_call_does_not_retry_other_errors(sleeps):
+    scheduler = make_scheduler()
+
+    def broken():
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        scheduler.call(broken, "model")
+    assert sleeps == []
+    assert scheduler.stats["failures"] == 1
+
+
+def test_non_retryable_error_reraises_its_cause(sleeps):
+    scheduler = make_scheduler()
+    cause = api_exceptions.ServiceUnavailable("dropped mid-stream")
+
+    def fn():
+        raise NonRetryableError() from cause
+
+    with pytest.raises(api_exceptions.ServiceUnavailable) as raised:
+        scheduler.call(fn, "model")
+    assert raised.value is cause
+    assert sleeps == []
+
+
+def test_call_gives_up_after_max_attempts(sleeps):
+    scheduler = make_scheduler(max_attempts=3)
+
+    def down():
+        raise api_exceptions.InternalServerError("down")
+
+    with pytest.raises(api_exceptions.InternalServerError):
+        scheduler.call(down, "model")
+    assert len(sleeps) == 2
+    assert scheduler.stats["calls"] == 3
+    assert scheduler.stats["failures"] == 1
+
+
+def test_retry_hint_sources():
+    assert retry_hint(api_exceptions.TooManyRequests("quota", details=[{"retryDelay": "1.5s"}])) == 1.5
+    assert retry_hint(api_exceptions.TooManyRequests("Please retry in 3s.")) == 3.0
+    assert retry_hint(api_exceptions.TooManyRequests("quota")) is None
@@ -0,0 +1,114 @@
+import io
+import os
+
+import pytest
+
+import upload_store
+from upload_store import QuotaExceeded, UploadStore
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A store clock that ticks one second per reading, so access order is unambiguous."""
+    now = [1_000_000.0]
+
+    def tick():
+        now[0] += 1
+        return now[0]
+
+    monkeypatch.setattr(upload_store.time, "time", tick)
+    return now
+
+
+@pytest.fixture
+def store(tmp_path, clock):
+    return UploadStore(str(tmp_path / "uploads"), max_bytes=100)
+
+
+def put(store, name, content, session_id="session", **kwargs):
+    return store.put(session_id, name, io.BytesIO(content), **kwargs)
+
+
+def test_identical_content_is_stored_once(store):
+    first = put(store, "a.txt", b"x" * 10, session_id="one")
+    second = put(store, "b.txt", b"x" * 10, session_id="two")
+    assert first.content_hash == second.content_hash
+    assert first.path == second.path
+    assert store.usage() == (10, 1)
+    assert store.get("one", first.content_hash).name == "a.txt"
+    assert store.get("two", first.content_hash).name == "b.txt"
+    assert store.get("three", first.content_hash) is None
+
+
+def test_streamed_content_is_mapped_back(store, monkeypatch):
+    monkeypatch.setattr(upload_store, "UPLOAD_CHUNK_SIZE", 3)
+    stored = put(store, "a.txt", b"hello world", mime_type="text/plain")
+    assert stored.size == 11
+    assert stored.mime_type == "text/plain"
+    with store.mapped(stored) as data:
+        assert data[:] == b"hello world"
+
+
+def test_least_recently_used_content_is_evicted(store):
+    a = put(store, "a", b"a" * 40)
+    b = put(store, "b", b"b" * 40)
+    with store.mapped(a):
+        pass
+    c = put(store, "c", b"c" * 40)
+    assert store.get("session", b.content_hash) is None
+    assert not os.path.exists(b.path)
+    assert [f.name for f in store.files("session")] == ["a", "c"]
+    assert store.usage() == (80, 2)
+    assert store.get("session", c.content_hash) is not None
+
+
+def test_keep_protects_the_rest_of_a_batch(store):
+    old = put(store, "old", b"o" * 30)
+    batch = []
+    for name in ("x", "y", "z"):
+        batch.append(put(store, name, name.encode() * 30, keep=batch[:]).content_hash)
+    assert store.get("session", old.content_hash) is None
+    assert [f.content_hash for f in store.files("session")] == batch
+    assert store.usage() == (90, 3)
+
+
+def test_batch_larger_than_the_quota_keeps_every_file(store):
+    batch = []
+    for name in ("x", "y", "z", "w"):
+        batch.append(put(store, name, name.encode() * 30, keep=batch[:]).content_hash)
+    assert [f.content_hash for f in store.files("session")] == batch
+    assert store.evict() != []
+    assert store.usage()[0] <= 100
+
+
+def test_content_larger_than_the_quota_is_rejected(store):
+    with pytest.raises(QuotaExceeded):
+        put(store, "big", b"b" * 101)
+    assert store.usage() == (0, 0)
+    assert not [name for name in os.listdir(store.blob_folder) if name.endswith(".tmp")]
+
+
+def test_remove_session_keeps_content_other_sessions_use(store):
+    shared = put(store, "shared", b"s" * 10, session_id="one")
+    put(store, "shared", b"s" * 10, session_id="two")
+    own = put(store, "own", b"o" * 10, session_id="one")
+    store.remove_session("one")
+    assert store.files("one") == []
+    assert store.get("two", shared.content_hash) is not None
+    assert os.path.exists(shared.path)
+    assert not os.path.exists(own.path)
+    assert store.usage() == (10, 1)
+
+
+def test_stale_partial_writes_are_removed_on_open(tmp_path, clock):
+    folder = str(tmp_path / "uploads")
+    UploadStore(folder, max_bytes=100)
+    stale = os.path.join(folder, "blobs", "stale.tmp")
+    fresh = os.path.join(folder, "blobs", "fresh.tmp")
+    for path in (stale, fresh):
+        open(path, "wb").close()
+    os.utime(stale, (0, 0))
+    clock[0] = os.path.getmtime(fresh)
+    UploadStore(folder, max_bytes=100)
+    assert not os.path.exists(stale)
+    assert os.path.exists(fresh)
@@ -0,0 +1,155 @@
+# Pre-flight token accounting for the Gemini-AI Prompt Engineering Toolkit.
+#
+# Input tokens are counted locally with tiktoken and memoized by content hash. Each model then scales the
+# count by a ratio calibrated against the token counts Gemini itself reports (usage_metadata and
+# count_tokens). Requests are checked against the model's context window before they are sent, so an
+# oversized request fails in milliseconds instead of after a network round trip.
+
+import functools
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+
+# (input, output) token limits per model
+MODEL_TOKEN_LIMITS = {
+    "gemini-1.5-flash-exp-0827": (1_048_576, 8192),
+    "gemini-1.5-pro-exp-0827": (2_097_152, 8192),
+    "gemini-1.5-flash-8b-exp-0827": (1_048_576, 8192),
+}
+DEFAULT_TOKEN_LIMITS = (1_048_576, 8192)
+
+MEMO_MIN_CHARS = 256  # shorter texts are cheaper to encode again than to hash and look up
+MEMO_MAX_ENTRIES = 4096
+CALIBRATION_SMOOTHING = 0.2  # weight of each new observation in the per-model ratio
+CALIBRATION_MIN_TOKENS = 100  # smaller requests say little about the tokenizers' ratio
+EXACT_COUNT_MARGIN = 0.1  # estimates this close to the limit are confirmed with Gemini's count_tokens
+
+
+class ContextLimitExceeded(ValueError):
+    """Raised before sending a request whose input would not fit in the model's context window."""
+
+    def __init__(self, model_version, tokens, limit):
+        super().__init__(f"The request is about {tokens:,} input tokens, more than {model_version}'s limit of {limit:,}")
+        self.model_version = model_version
+        self.tokens = tokens
+        self.limit = limit
+
+
+def token_limits(model_version):
+    """Returns (input, output) token limits for the model."""
+    return MODEL_TOKEN_LIMITS.get(model_version.removeprefix("models/"), DEFAULT_TOKEN_LIMITS)
+
+
+# Local counting (tiktoken's cl100k_base is a close, local stand-in for Gemini's tokenizer)
+@functools.lru_cache(maxsize=None)
+def get_token_encoder():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None  # encoding files could not be downloaded; fall back to an estimate
+
+
+def encode_count(text):
+    """Counts the tokens in text without memoization."""
+    encoder = get_token_encoder()
+    if encoder is None:
+        return len(text) // 4 + 1
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+class TokenCounter:
+    """Bounded LRU of token counts keyed by content hash."""
+
+    def __init__(self, max_entries=MEMO_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def count_content(self, content_hash, get_text):
+        """Returns the token count stored for content_hash, calling get_text() to count it on a miss."""
+        with self._lock:
+            if content_hash in self._counts:
+                self._counts.move_to_end(content_hash)
+                return self._counts[content_hash]
+        tokens = encode_count(get_text())
+        with self._lock:
+            self._counts[content_hash] = tokens
+            if len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+        return tokens
+
+    def count(self, text):
+        if len(text) < MEMO_MIN_CHARS:
+            return encode_count(text)
+        return self.count_content(hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest(), lambda: text)
+
+
+class TokenCalibration:
+    """Per-model moving average of Gemini's token count divided by the local count."""
+
+    def __init__(self, smoothing=CALIBRATION_SMOOTHING):
+        self.smoothing = smoothing
+        self._ratios = {}
+        self._lock = threading.Lock()
+
+    def ratio(self, model_version):
+        return self._ratios.get(model_version, 1.0)
+
+    def observe(self, model_version, local_tokens, gemini_tokens):
+        if not local_tokens or not gemini_tokens or local_tokens < CALIBRATION_MIN_TOKENS:
+            return
+        observed = gemini_tokens / local_tokens
+        with self._lock:
+            current = self._ratios.get(model_version)
+            self._ratios[model_version] = observed if current is None else current + self.smoothing * (observed - current)
+
+    def ratios(self):
+        with self._lock:
+            return dict(self._ratios)
+
+
+_counter = TokenCounter()
+_calibration = TokenCalibration()
+
+
+def count_tokens(text):
+    """Local token count of text, memoized by content hash for longer texts."""
+    return _counter.count(text)
+
+
+def count_content_tokens(content_hash, get_text):
+    """Local token count of a document identified by content_hash; get_text() is only called on a miss."""
+    return _counter.count_content(content_hash, get_text)
+
+
+def calibrate(model_version, local_tokens, gemini_tokens):
+    """Records a token count reported by Gemini for input that counted local_tokens locally."""
+    _calibration.observe(model_version, local_tokens, gemini_tokens)
+
+
+def calibration_ratios():
+    return _calibration.ratios()
+
+
+def estimate_tokens(model_version, local_tokens):
+    """Scales a local count into an estimate of Gemini's count for the model."""
+    return math.ceil(local_tokens * _calibration.ratio(model_version))
+
+
+def check_input_tokens(model_version, tokens, exact_count=None):
+    """Returns the input token count if it fits the model's context window, else raises ContextLimitExceeded.
+
+    When the estimate is within EXACT_COUNT_MARGIN of the limit, either side, and exact_count is given,
+    exact_count() (e.g. Gemini's count_tokens) settles it; a failing exact count leaves the estimate in charge.
+    """
+    limit, _ = token_limits(model_version)
+    if exact_count is not None and abs(tokens - limit) <= limit * EXACT_COUNT_MARGIN:
+        try:
+            tokens = exact_count()
+        except Exception:
+            pass
+    if tokens > limit:
+        raise ContextLimitExceeded(model_version, tokens, limit)
+    return tokens
@@ -0,0 +1,72 @@
+# Registry of the Gemini uploads behind Analyze File, for the Gemini-AI Prompt Engineering Toolkit.
+#
+# Gemini file handles are remembered by the SHA-256 of their content in a local SQLite database shared by
+# every session, so uploading identical content again, on a rerun or in another session, reuses the existing
+# Gemini file instead of sending it again. Handles are scoped to the API key they were uploaded with, and are
+# checked with Gemini before reuse: expired and deleted files are forgotten, and a failed one once it is returned.
+
+import hashlib
+import time
+
+import gemini_toolkit as toolkit
+import sqlite_store
+
+
+class UploadRegistry:
+    """Remembers Gemini file handles by content hash so identical uploads are reused across reruns and sessions."""
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS uploads ("
+                "owner TEXT NOT NULL, content_hash TEXT NOT NULL, name TEXT NOT NULL, uri TEXT NOT NULL, "
+                "display_name TEXT, expires_at REAL, PRIMARY KEY (owner, content_hash))"
+            )
+
+    def _connect(self):
+        return sqlite_store.connect(self.path)
+
+    @staticmethod
+    def owner_for(key):
+        # Gemini files are scoped to the API key's project, so never share handles across keys
+        return hashlib.sha256((key or "").encode("utf-8")).hexdigest()[:16]
+
+    def lookup(self, owner, content_hash):
+        """Returns the remote file if it is ACTIVE, PROCESSING or FAILED, else None.
+
+        A FAILED file is forgotten as it is returned, so a later upload of the same content starts afresh.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT name, expires_at FROM uploads WHERE owner = ? AND content_hash = ?", (owner, content_hash)
+            ).fetchone()
+        if row is None:
+            return None
+        name, expires_at = row
+        if expires_at is not None and expires_at <= time.time():
+            self.forget(owner, content_hash)
+            return None
+        try:
+            file = toolkit.get_file(name)
+        except Exception:
+            self.forget(owner, content_hash)
+            return None
+        if file.state.name not in ("ACTIVE", "PROCESSING"):
+            self.forget(owner, content_hash)
+            if file.state.name != "FAILED":
+                return None
+        return file
+
+    def record(self, owner, content_hash, file):
+        expires_at = file.expiration_time.timestamp() if file.expiration_time else None
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO uploads (owner, content_hash, name, uri, display_name, expires_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (owner, content_hash, file.name, file.uri, file.display_name, expires_at),
+            )
+
+    def forget(self, owner, content_hash):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM uploads WHERE owner = ? AND content_hash = ?", (owner, content_hash))
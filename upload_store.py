@@ -0,0 +1,208 @@
+# Per-session, content-addressed storage for Analyze File uploads.
+#
+# Uploads are streamed into the store in chunks, hashed as they are written, and saved under their SHA-256,
+# so identical content is stored once however it was named and however many sessions uploaded it. Each
+# session only sees its own uploads: a namespace of references to the stored content, kept in SQLite. Users
+# can't overwrite each other's files, and clearing a session's uploads only deletes content no other session
+# refers to. The store's total size is capped by a quota, and the least recently used content is evicted
+# first. Local processing reads stored files through mmap, so they are paged in on demand instead of being
+# copied into memory.
+
+import contextlib
+import hashlib
+import mmap
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+
+import sqlite_store
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # bytes per streamed write
+STALE_TMP_AGE = 60 * 60  # seconds after which a partial write is assumed abandoned
+
+
+class QuotaExceeded(Exception):
+    """Raised when a single upload is larger than the store's whole quota."""
+
+
+@dataclass(frozen=True)
+class StoredFile:
+    """One upload in a session's namespace."""
+    content_hash: str
+    name: str
+    mime_type: str
+    size: int
+    path: str
+
+
+@contextlib.contextmanager
+def map_file(path):
+    """Read-only mmap of a file (b"" when it is empty, which can't be mapped)."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield data
+
+
+class UploadStore:
+    """Content-addressed blobs under `folder`, with per-session references and LRU eviction above `max_bytes`."""
+
+    def __init__(self, folder, max_bytes):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.blob_folder = os.path.join(folder, "blobs")
+        self.path = os.path.join(folder, "index.sqlite3")
+        self._lock = threading.Lock()  # orders blob renames and deletions with the index updates
+        os.makedirs(self.blob_folder, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS blobs (content_hash TEXT PRIMARY KEY, size INTEGER NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS blobs_accessed_at ON blobs (accessed_at)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS session_files ("
+                "session_id TEXT NOT NULL, content_hash TEXT NOT NULL, name TEXT NOT NULL, mime_type TEXT NOT NULL, "
+                "added_at REAL NOT NULL, PRIMARY KEY (session_id, content_hash))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS session_files_content_hash ON session_files (content_hash)")
+        # Partial writes left behind by a crash
+        for name in os.listdir(self.blob_folder):
+            tmp_path = os.path.join(self.blob_folder, name)
+            if name.endswith(".tmp") and os.path.getmtime(tmp_path) < time.time() - STALE_TMP_AGE:
+                os.remove(tmp_path)
+
+    def _connect(self):
+        return sqlite_store.connect(self.path)
+
+    def blob_path(self, content_hash):
+        return os.path.join(self.blob_folder, content_hash[:2], content_hash)
+
+    def put(self, session_id, name, stream, mime_type="application/octet-stream", keep=()):
+        """Streams a file-like object, from its current position, into the session's namespace. Returns a StoredFile.
+
+        Making room for it never evicts the content hashes in `keep`, e.g. the rest of the batch it was uploaded
+        with. Raises QuotaExceeded, keeping nothing, if the content alone is larger than the quota.
+        """
+        tmp_path = os.path.join(self.blob_folder, f"{uuid.uuid4().hex}.tmp")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                while chunk := stream.read(UPLOAD_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise QuotaExceeded(f"{name} is larger than the upload quota of {self.max_bytes / 2**20:.0f} MB")
+                    digest.update(chunk)
+                    f.write(chunk)
+            content_hash = digest.hexdigest()
+            path = self.blob_path(content_hash)
+            with self._lock:
+                if os.path.exists(path):
+                    os.remove(tmp_path)  # the same content is already stored
+                else:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    os.replace(tmp_path, path)
+                now = time.time()
+                with self._connect() as conn:
+                    conn.execute(
+                        "INSERT INTO blobs (content_hash, size, accessed_at) VALUES (?, ?, ?) "
+                        "ON CONFLICT (content_hash) DO UPDATE SET accessed_at = excluded.accessed_at",
+                        (content_hash, size, now),
+                    )
+                    conn.execute(
+                        "INSERT OR REPLACE INTO session_files (session_id, content_hash, name, mime_type, added_at) VALUES (?, ?, ?, ?, ?)",
+                        (session_id, content_hash, name, mime_type, now),
+                    )
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.evict(keep={content_hash, *keep})
+        return StoredFile(content_hash, name, mime_type, size, path)
+
+    def get(self, session_id, content_hash):
+        """Returns the session's StoredFile for this content, or None if it was never stored or has been evicted."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT s.name, s.mime_type, b.size FROM session_files s JOIN blobs b ON b.content_hash = s.content_hash "
+                "WHERE s.session_id = ? AND s.content_hash = ?",
+                (session_id, content_hash),
+            ).fetchone()
+        if row is None:
+            return None
+        return StoredFile(content_hash, row[0], row[1], row[2], self.blob_path(content_hash))
+
+    def files(self, session_id):
+        """The session's stored files, oldest first."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT s.content_hash, s.name, s.mime_type, b.size FROM session_files s JOIN blobs b ON b.content_hash = s.content_hash "
+                "WHERE s.session_id = ? ORDER BY s.added_at",
+                (session_id,),
+            ).fetchall()
+        return [StoredFile(content_hash, name, mime_type, size, self.blob_path(content_hash)) for content_hash, name, mime_type, size in rows]
+
+    def touch(self, content_hash):
+        with self._connect() as conn:
+            conn.execute("UPDATE blobs SET accessed_at = ? WHERE content_hash = ?", (time.time(), content_hash))
+
+    @contextlib.contextmanager
+    def mapped(self, stored_file):
+        """Read-only mmap of a stored file's content, counted as a use for eviction."""
+        self.touch(stored_file.content_hash)
+        with map_file(stored_file.path) as data:
+            yield data
+
+    def usage(self):
+        """Returns (bytes stored, number of distinct files stored)."""
+        with self._connect() as conn:
+            size, count = conn.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM blobs").fetchone()
+        return size, count
+
+    def _delete(self, conn, content_hashes):
+        """Deletes blobs and every reference to them; ones that can't be removed yet (e.g. mapped on Windows) are kept."""
+        deleted = []
+        for content_hash in content_hashes:
+            try:
+                os.remove(self.blob_path(content_hash))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue
+            conn.execute("DELETE FROM session_files WHERE content_hash = ?", (content_hash,))
+            conn.execute("DELETE FROM blobs WHERE content_hash = ?", (content_hash,))
+            deleted.append(content_hash)
+        return deleted
+
+    def evict(self, keep=()):
+        """Deletes the least recently used content until the store fits its quota. Returns the evicted hashes.
+
+        Sessions that referred to evicted content see it disappear from their namespace, and store it again
+        if they still need it. Content hashes in `keep` are never evicted.
+        """
+        with self._lock, self._connect() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            victims = []
+            if total > self.max_bytes:
+                for content_hash, size in conn.execute("SELECT content_hash, size FROM blobs ORDER BY accessed_at"):
+                    if total <= self.max_bytes:
+                        break
+                    if content_hash not in keep:
+                        victims.append(content_hash)
+                        total -= size
+            return self._delete(conn, victims)
+
+    def remove_session(self, session_id):
+        """Clears a session's namespace, deleting content that no other session refers to."""
+        with self._lock, self._connect() as conn:
+            content_hashes = [row[0] for row in conn.execute("SELECT content_hash FROM session_files WHERE session_id = ?", (session_id,))]
+            conn.execute("DELETE FROM session_files WHERE session_id = ?", (session_id,))
+            orphans = [
+                content_hash for content_hash in content_hashes
+                if conn.execute("SELECT 1 FROM session_files WHERE content_hash = ? LIMIT 1", (content_hash,)).fetchone() is None
+            ]
+            self._delete(conn, orphans)
@@ -8,33 +8,86 @@ import logging
 logging.getLogger('absl').setLevel(logging.ERROR)
 
 import streamlit as st
-import google.generativeai as genai
-import io
 from dotenv import load_dotenv
-from langsmith import traceable
-import pandas as pd
 import json
-import base64
-from streamlit_extras.colored_header import colored_header
-from streamlit_extras.app_logo import add_logo
+import itertools
 from annotated_text import annotated_text, annotation
 from streamlit_option_menu import option_menu
 from streamlit_lottie import st_lottie
-import requests
-import re
 import time
-import shutil
-
-# Import PyPDF2
-import PyPDF2
-
-# Create a 'docs' folder if it doesn't exist
-DOCS_FOLDER = "docs"
-os.makedirs(DOCS_FOLDER, exist_ok=True)
+import mimetypes
+import uuid
+import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict
+
+# Headless prompt/test data generation core, shared with the batch CLI
+import background_jobs
+import dataset_jobs
+import evaluation
+import gemini_toolkit as toolkit
+import metrics
+import prompt_history
+import token_accounting
+import upload_registry
+import upload_store
+from file_chat import FileChatSession
+from gemini_toolkit import GenerationSettings, lazy_import
+
+# Heavy modules are imported lazily, on first use, so startup and reruns don't pay for pages that aren't open
+genai = lazy_import("google.generativeai")
+pd = lazy_import("pandas")
+file_processing = lazy_import("file_processing")  # pandas, PyPDF2
+retrieval = lazy_import("retrieval")  # numpy
 
 # Load environment variables
 load_dotenv()
 
+# Bundled Lottie animations
+LOTTIE_FOLDER = os.path.join("media", "lottie")
+
+# Create a 'comparisons' folder for saved model comparison benchmarks
+COMPARISONS_FOLDER = "comparisons"
+os.makedirs(COMPARISONS_FOLDER, exist_ok=True)
+
+# Create a '.cache' folder for the local response cache
+CACHE_FOLDER = ".cache"
+os.makedirs(CACHE_FOLDER, exist_ok=True)
+RESPONSE_CACHE_PATH = os.path.join(CACHE_FOLDER, "responses.sqlite3")
+UPLOAD_REGISTRY_PATH = os.path.join(CACHE_FOLDER, "uploads.sqlite3")
+
+# Analyze File uploads: stored once per content in per-session namespaces, with LRU eviction above the quota
+UPLOAD_STORE_FOLDER = os.path.join(CACHE_FOLDER, "upload_store")
+UPLOAD_STORE_MAX_BYTES = int(os.getenv("UPLOAD_STORE_MAX_BYTES", 2 * 1024 * 1024 * 1024))  # 2 GB
+PROMPT_HISTORY_PATH = os.path.join(CACHE_FOLDER, "prompt_history.sqlite3")
+
+# Concurrent upload and adaptive polling settings
+UPLOAD_MAX_WORKERS = int(os.getenv("UPLOAD_MAX_WORKERS", 4))
+
+# Local retrieval for Analyze File: text documents are indexed here and only relevant passages are sent
+RETRIEVAL_FOLDER = os.path.join(CACHE_FOLDER, "retrieval")
+os.makedirs(RETRIEVAL_FOLDER, exist_ok=True)
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", 8))
+RETRIEVAL_TOKEN_BUDGET = int(os.getenv("RETRIEVAL_TOKEN_BUDGET", 4000))
+RETRIEVAL_MAX_CACHED_INDEXES = 32
+
+# Prometheus endpoint for the per-call metrics; 0 leaves it off (the sidebar panel can still export them)
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+
+# Model comparisons
+COMPARISON_MAX_CONCURRENCY = int(os.getenv("COMPARISON_MAX_CONCURRENCY", 6))
+COMPARISON_TEMPERATURES = [round(step * 0.1, 1) for step in range(16)]  # the sidebar slider's range
+COMPARISON_COLUMNS = 3  # outputs shown side by side per row
+
+# Prompt evaluation (metrics live in evaluation.py)
+EVALUATION_MAX_CONCURRENCY = max(1, int(os.getenv("EVALUATION_MAX_CONCURRENCY", evaluation.EVALUATION_CONCURRENCY)))
+EVALUATION_MAX_ROWS = 100_000
+EVALUATION_HISTORY_CHOICES = 20  # recent prompts offered as templates
+
+# Background jobs (the worker pool size is BACKGROUND_MAX_WORKERS, see background_jobs.py)
+BACKGROUND_POLL_INTERVAL = 1.0  # seconds between refreshes of a running job's status
+BACKGROUND_MAX_SESSION_JOBS = 20  # finished job handles kept per session
+
 # Streamlit app
 st.set_page_config(page_title="Gemini-AI Prompt Engineering Toolkit", page_icon="⭕", layout="wide")
 
@@ -51,47 +104,45 @@ st.markdown("<h3 style='text-align: center; color: #6590F7;'>Gemini-AI Prompt En
     # professional''')
 
 
-# Lottie Animation JSON.  Perfectly centered
-url = requests.get("https://lottie.host/9dc7375c-8c39-440b-a29f-e118a08c78f1/TCHsASemR7.json")
-url_json = dict()
+# Function to load Lottie animations bundled under media/lottie (no network access at startup)
+@st.cache_data
+def load_lottie_file(name):
+    try:
+        with open(os.path.join(LOTTIE_FOLDER, f"{name}.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
 
-if url.status_code == 200:
-    url_json = url.json()
-else:
-    print("Error in URL")
+# Lottie Animation JSON.  Perfectly centered
+mobius_json = load_lottie_file("mobius")
 
 # Create three columns, with the middle one containing the animation
 col1, col2, col3 = st.columns([1, 2, 1])
 
 with col2:
-    st_lottie(url_json,
-        reverse=True,
-        height=400,
-        width=400,
-        speed=1.5,
-        loop=True,
-        quality='high',
-        key='Mobius',
-    )
+    if mobius_json:
+        st_lottie(mobius_json,
+            reverse=True,
+            height=400,
+            width=400,
+            speed=1.5,
+            loop=True,
+            quality='high',
+            key='Mobius',
+        )
+    else:
+        st.image("media/images/400px350p-mobius.png", width=400)
 
 # Add logo
-add_logo("media/images/app-logo.png")
+st.logo("media/images/app-logo.png")
 
 tracing_enabled = os.getenv("LANGCHAIN_TRACING_V2")  # Default to False if not set
 os.environ["LANGCHAIN_ENDPOINT"] = "https://api.smith.langchain.com"
 api_key = os.getenv("LANGCHAIN_API_KEY")
 
-# Function to load Lottie animations
-@st.cache_data
-def load_lottieurl(url: str):
-    r = requests.get(url)
-    if r.status_code != 200:
-        return None
-    return r.json()
-
 # Load Lottie animations
-lottie_ai = load_lottieurl("https://assets5.lottiefiles.com/packages/lf20_zrqthn6o.json")
-lottie_analysis = load_lottieurl("https://assets5.lottiefiles.com/private_files/lf30_wqypnpu5.json")
+lottie_ai = load_lottie_file("ai")
+lottie_analysis = load_lottie_file("analysis")
 
 # Initialize session state variables
 if 'temperature' not in st.session_state:
@@ -102,6 +153,20 @@ if 'model_version' not in st.session_state:
     st.session_state.model_version = "gemini-1.5-flash-exp-0827"
 if 'api_configured' not in st.session_state:
     st.session_state.api_configured = False
+if 'bypass_response_cache' not in st.session_state:
+    st.session_state.bypass_response_cache = False
+if 'stream_responses' not in st.session_state:
+    st.session_state.stream_responses = True
+if 'file_chat' not in st.session_state:
+    st.session_state.file_chat = None
+if 'upload_session_id' not in st.session_state:
+    st.session_state.upload_session_id = uuid.uuid4().hex
+if 'stored_uploads' not in st.session_state:
+    st.session_state.stored_uploads = {}  # uploader file_id -> StoredFile
+if 'failed_uploads' not in st.session_state:
+    st.session_state.failed_uploads = {}  # content hash -> why the upload was left out
+if 'background_jobs' not in st.session_state:
+    st.session_state.background_jobs = []
 
 # Sidebar for API key and model settings
 st.sidebar.title("Settings")
@@ -117,31 +182,102 @@ st.session_state.temperature = st.sidebar.slider("Temperature", min_value=0.0, m
 # Max output tokens slider
 st.session_state.max_output_tokens = st.sidebar.slider("Max Output Tokens", min_value=1024, max_value=8192, value=st.session_state.max_output_tokens, step=1024, key="max_output_tokens_slider")
 
-# Function to generate a download link
-def get_download_link(content, filename, text):
-    b64 = base64.b64encode(content.encode()).decode()
-    return f'<a href="data:file/txt;base64,{b64}" download="{filename}">{text}</a>'
-
-# Function to process uploaded file
-def process_uploaded_file(uploaded_file, file_type):
-    if file_type == "text/csv":
-        df = pd.read_csv(uploaded_file)
-        return df.to_string()
-    elif file_type == "application/pdf":
-        # PDF handling using PyPDF2
-        pdf_reader = PyPDF2.PdfReader(uploaded_file)
-        num_pages = len(pdf_reader.pages)
-        content = ""
-        for page_num in range(num_pages):
-            page = pdf_reader.pages[page_num]
-            content += page.extract_text()
-        return content
-    elif file_type.startswith('text/'):  # Handle other text files
-        content = uploaded_file.getvalue().decode("utf-8")
-        return content
-    else:  # Handle binary files
-        content = uploaded_file.read()  # Read as bytes
-        return content
+# Response cache controls
+st.session_state.bypass_response_cache = st.sidebar.checkbox("Bypass response cache (refresh)", value=st.session_state.bypass_response_cache, key="bypass_response_cache_checkbox", help="Always call Gemini and overwrite any cached response for the same request, instead of reusing a cached response or a prompt from history")
+
+# Streaming toggle
+st.session_state.stream_responses = st.sidebar.checkbox("Stream responses", value=st.session_state.stream_responses, key="stream_responses_checkbox", help="Render generated prompts and chat replies as they arrive")
+
+# Local response cache for generate_prompt and generate_test_data
+@st.cache_resource
+def get_response_cache():
+    return toolkit.open_response_cache(RESPONSE_CACHE_PATH)
+
+if st.sidebar.button("Clear response cache", key="clear_response_cache_button"):
+    get_response_cache().clear()
+    st.sidebar.success("Response cache cleared.")
+
+# Every generated prompt is kept in a local, full-text searchable history shared by all sessions
+@st.cache_resource
+def get_prompt_history():
+    return prompt_history.PromptHistory(PROMPT_HISTORY_PATH)
+
+# Latency display for Gemini calls (every call is also recorded in the process-wide metrics)
+def show_latency(total, ttft=None, queue_time=None):
+    """Shows total latency and, when known, time-to-first-token and rate limiter queue time (all in seconds)."""
+    parts = []
+    if queue_time and queue_time >= 0.01:
+        parts.append(f"Queued: {queue_time:.2f}s")
+    if ttft is not None:
+        parts.append(f"Time to first token: {ttft:.2f}s")
+    parts.append(f"Total: {total:.2f}s")
+    st.caption(" | ".join(parts))
+
+def show_generation_result(result):
+    """Notes a cache hit or shows the latency of a toolkit GenerationResult."""
+    if result.cached:
+        st.caption("Served from local response cache")
+    else:
+        show_latency(result.latency, result.time_to_first_token, result.queue_time)
+
+def get_generation_settings():
+    """The sidebar's model settings."""
+    return GenerationSettings(st.session_state.model_version, st.session_state.temperature, st.session_state.max_output_tokens)
+
+# Background jobs: long calls run on the process-wide worker pool and the page polls their handles
+def submit_job(kind, label, fn, *args, key=None, info=None, **kwargs):
+    """Starts fn(job, *args, **kwargs) in the background and keeps the job's handle in this session."""
+    return keep_job(background_jobs.get_executor().submit(kind, label, fn, *args, key=key, info=info, **kwargs))
+
+def keep_job(job):
+    """Adds a job handle to this session's jobs."""
+    jobs = st.session_state.background_jobs
+    if job not in jobs:
+        jobs.append(job)
+    # Drop the oldest finished handles; unfinished ones are always kept
+    finished = [old_job for old_job in jobs if old_job.done]
+    for old_job in finished[:max(0, len(jobs) - BACKGROUND_MAX_SESSION_JOBS)]:
+        jobs.remove(old_job)
+    return job
+
+def session_jobs(kind):
+    """This session's jobs of one kind, oldest first."""
+    return [job for job in st.session_state.background_jobs if job.kind == kind]
+
+def show_jobs(jobs, render):
+    """Renders each job with render(job), refreshing every BACKGROUND_POLL_INTERVAL seconds while any is unfinished.
+
+    Only this part of the page refreshes while the jobs run; the whole page reruns once they have all
+    finished, so anything drawn from their results is brought up to date. If any of them failed, the page
+    is left as it is, so its error stays shown and the rerun doesn't submit the same work again.
+    """
+    if all(job.done for job in jobs):
+        for job in jobs:
+            render(job)
+        return
+
+    def render_jobs():
+        for job in jobs:
+            render(job)
+        if all(job.done for job in jobs) and not any(job.status == background_jobs.FAILED for job in jobs):
+            st.rerun()
+
+    st.fragment(render_jobs, run_every=BACKGROUND_POLL_INTERVAL)()
+
+def show_job_status(job, cancellable=True):
+    """Shows a job's progress, with a Cancel button, while it runs, or why it didn't succeed."""
+    if not job.done:
+        text = job.message or ("Queued..." if job.status == background_jobs.QUEUED else "Running...")
+        if job.progress is not None:
+            st.progress(min(job.progress, 1.0), text=text)
+        else:
+            st.caption(f"{text} ({job.elapsed:.0f}s)")
+        if cancellable and st.button("Cancel", key=f"cancel_job_{job.job_id}"):
+            job.cancel()
+    elif job.status == background_jobs.FAILED:
+        st.error(f"An error occurred: {job.error}")
+    elif job.status == background_jobs.CANCELLED:
+        st.caption("Cancelled.")
 
 # Gemini API setup
 def setup_gemini_api():
@@ -150,126 +286,267 @@ def setup_gemini_api():
         return True
     return False
 
-# New function to get system prompt
-def get_system_prompt(task, variables, model_version, temperature, max_output_tokens):
-    return f"""You are an advanced AI prompt engineer assistant integrated into a Streamlit app. Your task is to generate a highly effective Chain of Thought (COT) prompt based on the user's input. Follow these steps:
-
-1. Analyze the task:
-   - Identify the main objective of the user's task
-   - Determine the complexity and scope of the task
-   - Consider any specific domain knowledge required
-
-2. Evaluate the variables:
-   - Examine the provided variables (if any)
-   - Determine how these variables should be incorporated into the prompt
-   - Consider additional relevant variables that might enhance the prompt
-
-3. Consider the Gemini model capabilities:
-   - Adapt the prompt to leverage the strengths of the selected Gemini model ({model_version})
-   - Take into account the current temperature setting ({temperature}) and max token limit ({max_output_tokens})
-
-4. Incorporate COT elements:
-   - Break down the task into logical steps or components
-   - Include prompts for explanations or reasoning at each step
-   - Encourage the model to show its work or thought process
-
-5. Optimize for clarity and specificity:
-   - Use clear, concise language
-   - Avoid ambiguity in instructions
-   - Include specific examples or constraints where appropriate
-
-6. Add context and formatting instructions:
-   - Provide any necessary background information
-   - Specify desired output format (e.g., bullet points, paragraphs, JSON)
-   - Include any relevant data or file analysis instructions if applicable
-
-7. Encourage creativity and problem-solving:
-   - Include prompts for alternative approaches or solutions
-   - Ask for pros and cons of different methods if relevant
-
-8. Incorporate error handling and edge cases:
-   - Prompt the model to consider potential issues or limitations
-   - Ask for validation steps or error checking where appropriate
-
-9. Format the final prompt:
-   - Present the COT prompt in a clear, structured manner
-   - Use appropriate line breaks, numbering, or bullet points for readability
-
-Generate a COT prompt that follows these steps and is optimized for the given task, variables, and selected Gemini model. Ensure the prompt is detailed enough to guide the AI but concise enough to fit within token limits.
-
-Task: {task}
-Variables: {variables}
-Selected Model: {model_version}
-Temperature: {temperature}
-Max Tokens: {max_output_tokens}
-
-Based on the above information, generate an optimal Chain of Thought prompt:
-"""
-
-@traceable # Langsmith Tracing and Observability
-# Function to generate prompt
-def generate_prompt(task, variables=""):
-    model = genai.GenerativeModel(st.session_state.model_version)
-    system_prompt = get_system_prompt(
-        task, 
-        variables, 
-        st.session_state.model_version, 
-        st.session_state.temperature, 
-        st.session_state.max_output_tokens
-    )
-    
-    try:
-        response = model.generate_content(system_prompt,
-                                          generation_config=genai.types.GenerationConfig(
-                                              temperature=st.session_state.temperature,
-                                              max_output_tokens=st.session_state.max_output_tokens,
-                                          ))
-        return response.text
-    except Exception as e:
-        st.error(f"An error occurred: {str(e)}")
-        return None
+# Prompt generation job
+def run_prompt_job(job, settings, task, variables, cache, bypass_cache, stream, history):
+    """Background job body: generates a COT prompt, publishing the streamed text as the job's partial result.
 
-@traceable # Langsmith Tracing and Observability
-# Function to generate test data
-def generate_test_data(topic, num_pairs):
-    model = genai.GenerativeModel(st.session_state.model_version)
-    prompt = f"""Generate {num_pairs} pairs of conversation for the topic: {topic}. 
-    Each pair should consist of a human message and an AI response. 
-    Format the output as a valid JSON array of objects, where each object has 'human' and 'ai' keys.
-    Ensure the output is strictly in this format:
-    [
-        {{"human": "Human message 1", "ai": "AI response 1"}},
-        {{"human": "Human message 2", "ai": "AI response 2"}},
-        ...
-    ]
-    Do not include any text before or after the JSON array.
+    Only fresh generations are added to the prompt history; a response cache hit repeats an earlier one.
     """
-    
-    try:
-        response = model.generate_content(prompt,
-                                          generation_config=genai.types.GenerationConfig(
-                                              temperature=st.session_state.temperature,
-                                              max_output_tokens=st.session_state.max_output_tokens,
-                                          ))
-        
-        # Attempt to parse the response as JSON
-        try:
-            json_data = json.loads(response.text)
-            if isinstance(json_data, list) and all(isinstance(item, dict) and 'human' in item and 'ai' in item for item in json_data):
-                return json_data
-            else:
-                raise ValueError("Response is not in the expected format")
-        except json.JSONDecodeError:
-            # If JSON parsing fails, try to extract JSON from the response
-            json_match = re.search(r'\[.*\]', response.text, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(0)
-                return json.loads(json_str)
+    result = toolkit.generate_prompt(
+        settings, task, variables, cache=cache, bypass_cache=bypass_cache, stream=stream, on_text=lambda text: job.update(partial=text)
+    )
+    if not result.cached:
+        history.record(task, variables, settings, result)
+    return result
+
+def format_history_time(created_at):
+    return datetime.datetime.fromtimestamp(created_at).strftime("%Y-%m-%d %H:%M")
+
+def render_prompt_job(job):
+    """Shows one prompt generation: the text streamed so far while it runs, then the prompt and its downloads."""
+    with st.container(border=True):
+        st.caption(f"Task: {job.label[:200]}")
+        # Only a streamed generation can stop part way; any other can only be cancelled before it starts
+        show_job_status(job, cancellable=job.status == background_jobs.QUEUED or job.info.get("stream", False))
+        if job.status == background_jobs.SUCCEEDED:
+            generated_prompt = job.result.text
+            match = job.info.get("history_match")
+            if match is not None:
+                st.caption(f"Served from prompt history (generated {format_history_time(match['created_at'])})")
             else:
-                raise ValueError("Could not extract valid JSON from the response")
-    except Exception as e:
-        st.error(f"An error occurred while generating test data: {str(e)}")
-        return None
+                show_generation_result(job.result)
+            st.subheader("Generated Prompt:")
+            annotated_text(
+                annotation(generated_prompt, "AI-Generated", "#ff4b4b")
+            )
+
+            # Download options
+            st.subheader("Download Options")
+            st.download_button("Download Prompt as TXT", generated_prompt, file_name="generated_prompt.txt", mime="text/plain", on_click="ignore", key=f"download_prompt_txt_{job.job_id}")
+
+            # Create JSONL file
+            jsonl_content = json.dumps({"prompt": generated_prompt, "completion": ""}) + "\n"
+            st.download_button("Download Prompt as JSONL", jsonl_content, file_name="generated_prompt.jsonl", mime="application/jsonl", on_click="ignore", key=f"download_prompt_jsonl_{job.job_id}")
+        elif job.partial and not job.done:
+            annotated_text(annotation(job.partial, "AI-Generated", "#ff4b4b"))
+
+def reuse_prompt(entry):
+    """Loads a history entry's task and variables into the Generate Prompt inputs (a button callback, run before they are drawn)."""
+    st.session_state.task_input = entry["task"]
+    st.session_state.variables_input = entry["variables"]
+
+def show_prompt_history():
+    """Searchable panel of every prompt generated so far, with re-use and delete buttons."""
+    history = get_prompt_history()
+    with st.expander(f"Prompt History ({history.count():,} saved)"):
+        search_col, model_col = st.columns([3, 1])
+        query = search_col.text_input("Search tasks, variables and prompts", key="prompt_history_query")
+        model_filter = model_col.selectbox("Model", ["All models"] + model_options, key="prompt_history_model")
+        entries = history.search(query, None if model_filter == "All models" else model_filter)
+        if not entries:
+            st.caption("No matching prompts." if query else "Generated prompts will appear here.")
+            return
+        st.caption(f"Latest {len(entries)} matches" if query else f"Latest {len(entries)} prompts")
+        with st.container(height=600, border=False):
+            for entry in entries:
+                with st.container(border=True):
+                    details = [format_history_time(entry["created_at"]), entry["model_version"], f"temperature {entry['temperature']}"]
+                    if entry["latency"] is not None:
+                        details.append(f"{entry['latency']:.2f}s")
+                    if entry["input_tokens"] is not None and entry["output_tokens"] is not None:
+                        details.append(f"{entry['input_tokens']} in / {entry['output_tokens']} out tokens")
+                    st.caption(" | ".join(details))
+                    st.markdown(f"**Task:** {entry['task'][:300]}")
+                    if entry["variables"]:
+                        st.markdown(f"**Variables:** {entry['variables']}")
+                    if st.toggle("Show prompt", key=f"prompt_history_show_{entry['id']}"):
+                        st.text(entry["output"])
+                    reuse_col, delete_col = st.columns(2)
+                    reuse_col.button("Reuse", key=f"prompt_history_reuse_{entry['id']}", on_click=reuse_prompt, args=(entry,))
+                    delete_col.button("Delete", key=f"prompt_history_delete_{entry['id']}", on_click=history.delete, args=(entry["id"],))
+        if st.button("Clear prompt history", key="clear_prompt_history_button"):
+            history.clear()
+            st.rerun()
+
+# Dataset generation jobs (checkpointing, resume and exports live in dataset_jobs.py)
+def start_dataset_job(job, concurrency):
+    """Generates or resumes a dataset job in the background. A job already running, in any session, is reused."""
+    return submit_job(
+        "dataset",
+        job.manifest["topic"][:80],
+        dataset_jobs.run_dataset_background,
+        job,
+        concurrency,
+        get_response_cache(),
+        st.session_state.bypass_response_cache,
+        st.session_state.stream_responses,
+        key=f"dataset:{job.job_id}",
+        info={"dataset_job_id": job.job_id},
+    )
+
+def render_dataset_job(handle):
+    """Shows a dataset job's progress while it runs, then its duration and any warnings."""
+    with st.container(border=True):
+        st.caption(f"Job ID: {handle.info['dataset_job_id']} | {handle.label}")
+        show_job_status(handle)
+        if handle.status == background_jobs.SUCCEEDED:
+            show_latency(handle.elapsed)
+            for warning in handle.result:
+                st.warning(warning)
+
+# Model comparison benchmarks
+def comparison_row(settings, result, error):
+    """One comparison run's settings and measurements, as saved in its benchmark record."""
+    row = asdict(settings)
+    if error is not None:
+        row["error"] = str(error)
+        return row
+    row.update(
+        latency_s=result.latency,
+        ttft_s=result.time_to_first_token,
+        queue_s=result.queue_time,
+        input_tokens=result.input_tokens,
+        output_tokens=result.output_tokens,
+        output_tokens_per_s=result.output_tokens / result.latency if result.output_tokens and result.latency else None,
+        retries=result.retries,
+    )
+    if isinstance(result, toolkit.TestDataResult):
+        row["pairs"] = len(result.pairs)
+    row["output"] = result.text
+    return row
+
+def save_comparison(record):
+    """Saves a comparison as <comparison_id>.json in COMPARISONS_FOLDER."""
+    path = os.path.join(COMPARISONS_FOLDER, f"{record['comparison_id']}.json")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(record, f, indent=2)
+    os.replace(tmp_path, path)
+
+def list_comparisons():
+    records = []
+    for name in os.listdir(COMPARISONS_FOLDER):
+        if name.endswith(".json"):
+            with open(os.path.join(COMPARISONS_FOLDER, name), encoding="utf-8") as f:
+                records.append(json.load(f))
+    return sorted(records, key=lambda record: record["created_at"], reverse=True)
+
+def run_comparison_job(job, comparison_input, settings_list, concurrency):
+    """Background job body: runs the comparison, publishing rows as runs finish, and saves its benchmark record.
+
+    `comparison_input` is {"task", "variables"} for a prompt or {"topic", "num_pairs"} for a dataset shard.
+    """
+    rows = {}
+    for settings, result, error in toolkit.compare_models(settings_list, concurrency=concurrency, **comparison_input):
+        rows[settings] = comparison_row(settings, result, error)
+        job.update(len(rows) / len(settings_list), f"{len(rows)} of {len(settings_list)} runs done", list(rows.values()))
+    record = {
+        "comparison_id": uuid.uuid4().hex[:12],
+        "label": job.label,
+        "created_at": time.time(),
+        "input": comparison_input,
+        "runs": [rows[settings] for settings in settings_list],  # in the order requested, not finished
+    }
+    save_comparison(record)
+    return record
+
+def show_comparison(runs):
+    """Shows a comparison's measurements in a table, the fastest runs, and each run's output side by side."""
+    st.dataframe(
+        [{name: round(value, 3) if isinstance(value, float) else value for name, value in run.items() if name != "output"} for run in runs],
+        hide_index=True,
+    )
+    succeeded = [run for run in runs if not run.get("error")]
+    if succeeded:
+        fastest = min(succeeded, key=lambda run: run["latency_s"])
+        summary = f"Fastest: {fastest['model_version']} at temperature {fastest['temperature']} ({fastest['latency_s']:.2f}s)"
+        timed = [run for run in succeeded if run["ttft_s"] is not None]
+        if timed:
+            first = min(timed, key=lambda run: run["ttft_s"])
+            summary += f" | Fastest first token: {first['model_version']} at temperature {first['temperature']} ({first['ttft_s']:.2f}s)"
+        st.caption(summary)
+    for start in range(0, len(runs), COMPARISON_COLUMNS):
+        for column, run in zip(st.columns(COMPARISON_COLUMNS), runs[start:start + COMPARISON_COLUMNS]):
+            with column:
+                st.markdown(f"**{run['model_version']}** (temperature {run['temperature']})")
+                with st.container(height=300):
+                    if run.get("error"):
+                        st.error(run["error"])
+                    else:
+                        st.text(run["output"])
+
+def render_comparison_job(job):
+    """Shows a comparison's runs as they finish, then where its benchmark record was saved."""
+    with st.container(border=True):
+        st.caption(job.label)
+        show_job_status(job)
+        runs = job.result["runs"] if job.status == background_jobs.SUCCEEDED else job.partial
+        if runs:
+            show_comparison(runs)
+        if job.status == background_jobs.SUCCEEDED:
+            record = job.result
+            st.caption(f"Saved as {os.path.join(COMPARISONS_FOLDER, record['comparison_id'] + '.json')}")
+            st.download_button(
+                "Download comparison as JSON",
+                json.dumps(record, indent=2),
+                file_name=f"comparison-{record['comparison_id']}.json",
+                mime="application/json",
+                on_click="ignore",
+                key=f"download_comparison_{job.job_id}",
+            )
+
+# Prompt evaluation against a dataset
+def run_evaluation_job(job, settings, template, rows, variables, metric_names, concurrency, cache, bypass_cache):
+    """Background job body: scores the template on every row, publishing the running summary as rows finish."""
+    summary = evaluation.EvaluationSummary(metric_names, total=len(rows))
+    records = []
+    for record in evaluation.run_evaluation(settings, template, rows, variables, metric_names, concurrency, cache, bypass_cache):
+        records.append(record)
+        summary.add(record)
+        job.update(summary.rows / len(rows), f"{summary.rows} of {len(rows)} rows scored", summary.as_dict())
+    return {"summary": summary.as_dict(), "records": sorted(records, key=lambda record: record["row"])}
+
+def show_evaluation_summary(summary):
+    """Shows the mean of each metric, then counts, latency, tokens and throughput."""
+    scores = {name[len("mean_"):]: value for name, value in summary.items() if name.startswith("mean_")}
+    for column, (name, value) in zip(st.columns(max(1, len(scores))), scores.items()):
+        column.metric(name, "-" if value is None else f"{value:.3f}")
+    parts = [f"{summary['rows']} of {summary['total']} rows", f"{summary['failed']} failed", f"{summary['cached']} from cache"]
+    if summary["p50_latency_s"] is not None:
+        parts.append(f"Latency p50 {summary['p50_latency_s']:.2f}s, p95 {summary['p95_latency_s']:.2f}s")
+    parts.append(f"{summary['input_tokens']} in / {summary['output_tokens']} out tokens")
+    if summary["rows_per_s"]:
+        parts.append(f"{summary['rows_per_s']:.1f} rows/s")
+    st.caption(" | ".join(parts))
+
+def render_evaluation_job(job):
+    """Shows an evaluation's aggregate scores as rows finish, then every row's result and a download."""
+    with st.container(border=True):
+        st.caption(job.label)
+        show_job_status(job)
+        summary = job.result["summary"] if job.status == background_jobs.SUCCEEDED else job.partial
+        if summary:
+            show_evaluation_summary(summary)
+        if job.status == background_jobs.SUCCEEDED:
+            records = job.result["records"]
+            st.dataframe(
+                [{**{name: value for name, value in record.items() if name != "scores"}, **record["scores"]} for record in records],
+                hide_index=True,
+                height=300,
+            )
+            st.download_button(
+                "Download results as JSONL",
+                "".join(json.dumps(record) + "\n" for record in records),
+                file_name=f"evaluation-{job.job_id}.jsonl",
+                mime="application/jsonl",
+                on_click="ignore",
+                key=f"download_evaluation_{job.job_id}",
+            )
+
+def use_history_template(entry):
+    """Loads a saved prompt and its variables into the evaluation inputs (a button callback)."""
+    st.session_state.evaluation_template = entry["output"]
+    st.session_state.evaluation_variables = entry["variables"]
 
 # Setup Gemini API
 if not st.session_state.api_configured:
@@ -278,26 +555,234 @@ if not st.session_state.api_configured:
 if st.session_state.api_configured:
     st.sidebar.success("API key configured successfully!")
 
-# Advanced Gemini File Upload functions
-def upload_to_gemini(path, mime_type=None):
-    """Uploads the given file to Gemini."""
-    file = genai.upload_file(path, mime_type=mime_type)
-    st.write(f"Uploaded file '{file.display_name}' as: {file.uri}")
-    return file
-
-def wait_for_files_active(files):
-    """Waits for the given files to be active."""
+# Advanced Gemini File Upload functions (uploads and polling live in gemini_toolkit)
+def run_file_processing_job(job, names):
+    """Background job body: waits for the named files to be active, polling them concurrently and failing fast on the first failure."""
+    start = time.time()
+    ready = []
+    with ThreadPoolExecutor(max_workers=UPLOAD_MAX_WORKERS) as executor:
+        futures = [executor.submit(toolkit.wait_for_file_active, name, job.cancel_event) for name in names]
+        try:
+            for future in as_completed(futures):
+                file = future.result()
+                ready.append(f"'{file.display_name}' ready after {time.time() - start:.1f}s")
+                job.update(len(ready) / len(names), f"{len(ready)} of {len(names)} files ready", list(ready))
+        except Exception:
+            # Stop the remaining pollers instead of waiting on files we no longer need
+            job.cancel_event.set()
+            raise
+    return ready
+
+def render_file_processing_job(job):
     st.write("Waiting for file processing...")
-    for name in (file.name for file in files):
-        file = genai.get_file(name)
-        while file.state.name == "PROCESSING":
-            st.write(".", end="")
-            time.sleep(10)
-            file = genai.get_file(name)
-        if file.state.name != "ACTIVE":
-            raise Exception(f"File {file.name} failed to process")
-    st.write("...all files ready")
-    st.write()
+    for line in job.partial or []:
+        st.write(line)
+    show_job_status(job, cancellable=False)
+
+# Registry of files already uploaded to Gemini, keyed on content hash
+@st.cache_resource
+def get_upload_registry():
+    return upload_registry.UploadRegistry(UPLOAD_REGISTRY_PATH)
+
+# Local copies of uploads, one namespace per session
+@st.cache_resource
+def get_upload_store():
+    return upload_store.UploadStore(UPLOAD_STORE_FOLDER, UPLOAD_STORE_MAX_BYTES)
+
+def store_uploads(uploaded_files):
+    """Streams each new upload into this session's namespace of the upload store and returns their StoredFiles.
+
+    Uploads already stored on an earlier rerun are not read again, unless their content has been evicted since.
+    Storing a new upload never evicts another file of the same batch.
+    """
+    store = get_upload_store()
+    session_id = st.session_state.upload_session_id
+    previous = st.session_state.stored_uploads
+    stored = {}
+    new_files = []
+    for uploaded_file in uploaded_files:
+        stored_file = previous.get(uploaded_file.file_id)
+        if stored_file is not None and store.get(session_id, stored_file.content_hash) is not None:
+            stored[uploaded_file.file_id] = stored_file
+        else:
+            new_files.append(uploaded_file)
+    for uploaded_file in new_files:
+        uploaded_file.seek(0)
+        mime_type = uploaded_file.type or mimetypes.guess_type(uploaded_file.name)[0] or "application/octet-stream"
+        batch = [stored_file.content_hash for stored_file in stored.values()]
+        stored[uploaded_file.file_id] = store.put(session_id, uploaded_file.name, uploaded_file, mime_type, keep=batch)
+    st.session_state.stored_uploads = stored
+    return [stored[uploaded_file.file_id] for uploaded_file in uploaded_files]
+
+def _resolve_upload(registry, owner, stored_file):
+    """Returns (file, uploaded): a registered upload, including one that failed, or a new upload of the stored file.
+
+    Runs in a worker thread, so no st.* calls.
+    """
+    file = registry.lookup(owner, stored_file.content_hash)
+    if file is not None:
+        return file, False
+
+    # Upload to Gemini straight from the store, under the file's original name
+    file = toolkit.upload_file(stored_file.path, mime_type=stored_file.mime_type, display_name=stored_file.name)
+    registry.record(owner, stored_file.content_hash, file)
+    return file, True
+
+def get_or_upload_files(stored_files):
+    """Returns (files, uploaded_files, processing_files), reusing existing Gemini uploads and uploading the rest concurrently.
+
+    uploaded_files are the ones this call uploaded; processing_files were uploaded earlier (on another rerun,
+    or by another session) and are not active yet. Files that could not be uploaded, or that Gemini failed to
+    process, are left out and remembered in st.session_state.failed_uploads, so they are not uploaded again
+    on every rerun.
+    """
+    if 'gemini_files' not in st.session_state:
+        st.session_state.gemini_files = {}
+    failed_uploads = st.session_state.failed_uploads
+    registry = get_upload_registry()
+    owner = upload_registry.UploadRegistry.owner_for(api_key)
+
+    files = [None] * len(stored_files)
+    uploaded_files = []
+    processing_files = []
+    jobs = {}
+    for index, stored_file in enumerate(stored_files):
+        if stored_file.content_hash in failed_uploads:
+            continue
+        # Handles verified earlier in this session are reused without any network call
+        cached = st.session_state.gemini_files.get(stored_file.content_hash)
+        if cached is not None and (not cached.expiration_time or cached.expiration_time.timestamp() > time.time()):
+            files[index] = cached
+        else:
+            jobs[index] = stored_file
+
+    if jobs:
+        with ThreadPoolExecutor(max_workers=UPLOAD_MAX_WORKERS) as executor:
+            futures = {
+                executor.submit(_resolve_upload, registry, owner, stored_file): (index, stored_file.content_hash)
+                for index, stored_file in jobs.items()
+            }
+            for future in as_completed(futures):
+                index, content_hash = futures[future]
+                try:
+                    file, uploaded = future.result()
+                except Exception as e:
+                    failed_uploads[content_hash] = f"Could not upload '{jobs[index].name}' ({e})"
+                    continue
+                if file.state.name == "FAILED":
+                    failed_uploads[content_hash] = f"Gemini failed to process '{jobs[index].name}'"
+                    continue
+                files[index] = file
+                if uploaded:
+                    st.write(f"Uploaded file '{file.display_name}' as: {file.uri}")
+                    uploaded_files.append(file)
+                elif file.state.name == "PROCESSING":
+                    processing_files.append(file)
+                if file.state.name == "ACTIVE":
+                    st.session_state.gemini_files[content_hash] = file
+    return [file for file in files if file is not None], uploaded_files, processing_files
+
+# Persistent Analyze File chat (the chat itself lives in file_chat.py)
+def get_file_chat(files, documents=()):
+    """Returns this session's chat for the given files, starting a new one when the file set changes."""
+    chat = st.session_state.file_chat
+    if chat is None or not chat.matches(files, documents):
+        if chat is not None:
+            chat.close()
+        chat = st.session_state.file_chat = FileChatSession(files, documents)
+    return chat
+
+# Local retrieval over text documents
+def is_text_document(stored_file):
+    """PDF, CSV and text uploads can be indexed locally; everything else goes to Gemini as a file."""
+    return stored_file.mime_type in ("application/pdf", "text/csv") or stored_file.mime_type.startswith("text/") \
+        or stored_file.name.lower().endswith((".md", ".txt", ".csv", ".pdf"))
+
+def estimate_upload_tokens(stored_files, model_version):
+    """Calibrated local estimate of the input tokens in a set of uploads, before any of them is sent.
+
+    Text rarely has more tokens than bytes, so documents are only counted (memoized by content hash) when
+    their combined size could exceed the context window. Images and other binary files count as 0.
+    """
+    text_files = [stored_file for stored_file in stored_files if is_text_document(stored_file)]
+    limit, _ = token_accounting.token_limits(model_version)
+    if token_accounting.estimate_tokens(model_version, sum(text_file.size for text_file in text_files)) <= limit:
+        return 0
+
+    def read_text(stored_file):
+        with get_upload_store().mapped(stored_file) as data:
+            if stored_file.mime_type == "application/pdf" or stored_file.name.lower().endswith(".pdf"):
+                return "".join(file_processing.iter_pdf_pages(data, stored_file.path))
+            return str(data, "utf-8", errors="replace")
+
+    local_tokens = sum(
+        token_accounting.count_content_tokens(text_file.content_hash, lambda: read_text(text_file))
+        for text_file in text_files
+    )
+    return token_accounting.estimate_tokens(model_version, local_tokens)
+
+@st.cache_resource(max_entries=RETRIEVAL_MAX_CACHED_INDEXES, show_spinner=False)
+def get_document_index(content_hash, _stored_file):
+    """Returns the BM25 index of a text document, loading it from disk or building and persisting it."""
+    path = os.path.join(RETRIEVAL_FOLDER, f"{content_hash}.npz")
+    if os.path.exists(path):
+        return retrieval.BM25Index.load(path)
+    get_upload_store().touch(content_hash)
+    file_type = _stored_file.mime_type if _stored_file.mime_type in ("application/pdf", "text/csv") else "text/plain"
+    # The whole document is indexed, so CSVs are not cut at the prompt token budget
+    text = file_processing.process_file(_stored_file.path, file_type, token_budget=float("inf"))
+    if isinstance(text, bytes):
+        text = text.decode("utf-8", errors="replace")
+    index = retrieval.BM25Index.build(retrieval.chunk_text(text))
+    index.save(path)
+    return index
+
+def build_retrieval_message(question, passages):
+    """Returns the message parts for a question: the retrieved passages first, the question last."""
+    if not passages:
+        return [question]
+    excerpts = "\n\n".join(f"[{name}, passage {chunk_id + 1}]\n{text}" for name, chunk_id, score, text in passages)
+    return [
+        "Relevant excerpts from the uploaded documents. Answer using them and cite the passages you rely on; "
+        "say so if they don't contain the answer.\n\n" + excerpts,
+        question,
+    ]
+
+def show_context_usage(response):
+    """Shows how many of a turn's input tokens came from the context cache."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    cached_tokens = getattr(usage, "cached_content_token_count", 0) or 0
+    st.caption(f"Input tokens: {usage.prompt_token_count - cached_tokens} sent, {cached_tokens} from context cache")
+
+def show_passages(passages):
+    with st.expander(f"Retrieved {len(passages)} passages"):
+        for name, chunk_id, score, text in passages:
+            st.caption(f"{name}, passage {chunk_id + 1} (score {score:.2f})")
+            st.text(text[:500])
+
+def run_chat_job(job, file_chat, message, settings, stream):
+    """Background job body: sends one chat message, publishing the streamed reply, and returns (response, record)."""
+    with metrics.track_call("send_message", settings.model_version) as record:
+        response = file_chat.send(message, settings, stream=stream, record=record, on_text=lambda text: job.update(partial=text))
+        toolkit.record_usage(record, response)
+    return response, record
+
+def render_chat_job(job):
+    """Shows the latest chat message: the question and the reply so far while it runs, then its latency and usage."""
+    if not job.done:
+        with st.chat_message("user"):
+            st.write(job.info["question"])
+        with st.chat_message("assistant"):
+            st.write(job.partial or "...")
+    show_job_status(job, cancellable=job.status == background_jobs.QUEUED or job.info["stream"])
+    if job.status == background_jobs.SUCCEEDED:
+        response, record = job.result
+        show_latency(record.latency, record.time_to_first_token, record.queue_time)
+        show_context_usage(response)
+    if job.info["passages"] is not None:
+        show_passages(job.info["passages"])
 
 # Main content area st.subheader("_Become_  :red[Prompt] :blue[Engineering] :red[Pro] :cyclone:")
 # st.markdown('''
@@ -308,8 +793,8 @@ st.markdown("<p style='text-align: center; color: #F0F0F0;'>Easily become a Prom
 # Horizontal menu
 selected = option_menu(
     menu_title=None,
-    options=["Generate Prompt", "Analyze File", "Generate Dataset", "Help"],
-    icons=["robot", "file-earmark-text", "database", "question-circle"],
+    options=["Generate Prompt", "Analyze File", "Generate Dataset", "Compare Models", "Evaluate Prompt", "Help"],
+    icons=["robot", "file-earmark-text", "database", "bar-chart", "clipboard-check", "question-circle"],
     menu_icon="cast",
     default_index=0,
     orientation="horizontal",
@@ -333,28 +818,43 @@ if selected == "Generate Prompt":
         
         if st.button("Generate Prompt", key="generate_button"):
             if task:
-                with st.spinner("Generating prompt..."):
-                    generated_prompt = generate_prompt(task, variables)
-                    if generated_prompt:
-                        st.subheader("Generated Prompt:")
-                        annotated_text(
-                            annotation(generated_prompt, "AI-Generated", "#ff4b4b")
-                        )
-                        
-                        # Download options
-                        st.subheader("Download Options")
-                        prompt_download = get_download_link(generated_prompt, "generated_prompt.txt", "Download Prompt as TXT")
-                        st.markdown(prompt_download, unsafe_allow_html=True)
-                        
-                        # Create JSONL file
-                        jsonl_content = json.dumps({"prompt": generated_prompt, "completion": ""}) + "\n"
-                        jsonl_download = get_download_link(jsonl_content, "generated_prompt.jsonl", "Download Prompt as JSONL")
-                        st.markdown(jsonl_download, unsafe_allow_html=True)
+                settings = get_generation_settings()
+                # The same or a near-identical task with the same variables and settings is answered from history
+                match = None if st.session_state.bypass_response_cache else get_prompt_history().find_match(task, variables, settings)
+                if match is not None:
+                    keep_job(background_jobs.Job.succeeded(
+                        "prompt", task, toolkit.GenerationResult(text=match["output"], cached=True), info={"history_match": match}
+                    ))
+                else:
+                    # Generated in the background, so several prompts can be queued while you keep working
+                    submit_job(
+                        "prompt",
+                        task,
+                        run_prompt_job,
+                        settings,
+                        task,
+                        variables,
+                        get_response_cache(),
+                        st.session_state.bypass_response_cache,
+                        st.session_state.stream_responses,
+                        get_prompt_history(),
+                        info={"stream": st.session_state.stream_responses},
+                    )
             else:
                 st.warning("Please enter a task.")
+
+        prompt_jobs = session_jobs("prompt")
+        if any(job.done for job in prompt_jobs) and st.button("Clear finished prompts", key="clear_prompt_jobs_button"):
+            st.session_state.background_jobs = [job for job in st.session_state.background_jobs if job.kind != "prompt" or not job.done]
+            prompt_jobs = session_jobs("prompt")
+        if prompt_jobs:
+            show_jobs(prompt_jobs[::-1], render_prompt_job)
+
+        show_prompt_history()
     
     with col2:
-        st_lottie(lottie_ai, height=300, key="lottie_ai")
+        if lottie_ai:
+            st_lottie(lottie_ai, height=300, key="lottie_ai")
 
 elif selected == "Analyze File":
     col1, col2 = st.columns([2, 1])
@@ -363,113 +863,365 @@ elif selected == "Analyze File":
         st.subheader("Analyze Uploaded File")
         uploaded_files = st.file_uploader("Upload files", key="file_uploader", accept_multiple_files=True) 
         
-        if uploaded_files:
-            files = []
-            for uploaded_file in uploaded_files:
-                # Save uploaded file to the 'docs' folder
-                file_path = os.path.join(DOCS_FOLDER, uploaded_file.name)
-                with open(file_path, "wb") as f:
-                    f.write(uploaded_file.getbuffer())
-
-                # Upload to Gemini
-                file = upload_to_gemini(file_path)
-                files.append(file)
-
-            # Wait for files to be active
-            wait_for_files_active(files)
-
-            # Create the model
-            generation_config = {
-                "temperature": st.session_state.temperature,  # Use session state temperature
-                "top_p": 0.95,
-                "top_k": 64,
-                "max_output_tokens": st.session_state.max_output_tokens,  # Use session state max tokens
-                "response_mime_type": "text/plain",
-            }
-
-            model = genai.GenerativeModel(
-                model_name=st.session_state.model_version,  # Use session state model version
-                generation_config=generation_config,
-                tools='code_execution',
-            )
+        retrieval_mode = st.checkbox(
+            "Retrieval mode: send only the passages relevant to each message from text documents (PDF, CSV, TXT, MD)",
+            key="retrieval_mode",
+        )
 
-            # Start chat session with all uploaded files
-            chat_session = model.start_chat(
-                history=[
-                    {
-                        "role": "user",
-                        "parts": files,  # Include all uploaded files
-                    }
-                ]
-            )
-
-            # Chat interface
-            user_input = st.text_area("Enter your message:")
-            if st.button("Send"):
-                response = chat_session.send_message(user_input)
-                st.write("Gemini:", response.text)
-
-            # Option to clear the docs folder
-            if st.button("Clear Uploaded Files"):
-                shutil.rmtree(DOCS_FOLDER)
-                os.makedirs(DOCS_FOLDER)
-                st.success("All uploaded files have been cleared.")
+        if uploaded_files:
+            # Keep this session's own copy of each upload, stored once per content
+            try:
+                stored_files = store_uploads(uploaded_files)
+            except upload_store.QuotaExceeded as e:
+                st.error(str(e))
+                st.stop()
+
+            documents = {}
+            if retrieval_mode:
+                # Index text documents locally instead of uploading them whole
+                text_files = [stored_file for stored_file in stored_files if is_text_document(stored_file)]
+                stored_files = [stored_file for stored_file in stored_files if not is_text_document(stored_file)]
+                with st.spinner("Indexing documents..."):
+                    for text_file in text_files:
+                        documents[text_file.name] = get_document_index(text_file.content_hash, text_file)
+                st.caption(f"Indexed {len(documents)} documents ({sum(len(index.chunks) for index in documents.values())} passages) locally.")
+
+            files, pending_files = [], []
+            if stored_files:
+                # Reject file sets that can't fit the model's context window before uploading anything
+                try:
+                    token_accounting.check_input_tokens(
+                        st.session_state.model_version, estimate_upload_tokens(stored_files, st.session_state.model_version)
+                    )
+                except token_accounting.ContextLimitExceeded as e:
+                    st.error(f"{e}. Remove some files or turn on retrieval mode.")
+                    st.stop()
+
+                # Reuse earlier Gemini uploads of the same content, otherwise upload them in parallel
+                files, uploaded_files, processing_files = get_or_upload_files(stored_files)
+                for stored_file in stored_files:
+                    failure = st.session_state.failed_uploads.get(stored_file.content_hash)
+                    if failure is not None:
+                        st.error(f"{failure}, so it is left out. Clear uploaded files to try it again.")
+
+                # New uploads, and earlier ones Gemini is still processing, are polled in the background until they are active
+                pending_files = uploaded_files + processing_files
+                if pending_files:
+                    names = sorted(file.name for file in pending_files)
+                    processing_job = submit_job(
+                        "file_processing", f"Processing {len(names)} files", run_file_processing_job, names, key="files:" + ",".join(names)
+                    )
+                    show_jobs([processing_job], render_file_processing_job)
+
+            if not pending_files:
+                # Keep one chat per file set across reruns, with large file sets in a context cache
+                file_chat = get_file_chat(files, sorted(documents))
+                if file_chat.cache_error:
+                    st.caption("Context caching is unavailable for this model; files are sent with every message.")
+                if file_chat.trimmed_turns:
+                    st.caption(f"The earliest {file_chat.trimmed_turns} messages were dropped to fit the model's context window.")
+
+                for role, text in file_chat.turns():
+                    with st.chat_message("user" if role == "user" else "assistant"):
+                        st.write(text)
+
+                # The latest reply is generated in the background and shown below the conversation
+                chat_jobs = [job for job in session_jobs("chat") if job.info["chat_id"] == file_chat.chat_id]
+                if chat_jobs:
+                    show_jobs(chat_jobs[-1:], render_chat_job)
+                replying = bool(chat_jobs) and not chat_jobs[-1].done
+
+                # Chat interface
+                user_input = st.text_area("Enter your message:")
+                if st.button("Send", disabled=replying):
+                    try:
+                        message, passages = user_input, None
+                        if documents:
+                            passages = retrieval.retrieve(documents, user_input, RETRIEVAL_TOP_K, RETRIEVAL_TOKEN_BUDGET, token_accounting.count_tokens)
+                            message = build_retrieval_message(user_input, passages)
+                        submit_job(
+                            "chat",
+                            user_input[:80],
+                            run_chat_job,
+                            file_chat,
+                            message,
+                            get_generation_settings(),
+                            st.session_state.stream_responses,
+                            key=f"chat:{file_chat.chat_id}",
+                            info={"chat_id": file_chat.chat_id, "question": user_input, "passages": passages, "stream": st.session_state.stream_responses},
+                        )
+                    except Exception as e:
+                        st.error(f"An error occurred: {str(e)}")
+                    else:
+                        st.rerun()
+
+                # Option to clear this session's stored uploads; other sessions' files are untouched
+                if st.button("Clear Uploaded Files"):
+                    file_chat.close()
+                    st.session_state.file_chat = None
+                    get_upload_store().remove_session(st.session_state.upload_session_id)
+                    st.session_state.stored_uploads = {}
+                    st.session_state.failed_uploads = {}
+                    st.success("Your uploaded files have been cleared.")
     
     with col2:
-        st_lottie(lottie_analysis, height=300, key="lottie_analysis")
+        if lottie_analysis:
+            st_lottie(lottie_analysis, height=300, key="lottie_analysis")
 
 elif selected == "Generate Dataset":
     st.subheader("Generate Test Dataset for Fine Tuning an LLM")
     topic = st.text_input("Enter your text or topic here:", key="test_data_topic")
-    num_pairs = st.number_input("Number of conversation pairs to generate:", min_value=1, max_value=100, value=10, step=1, key="num_pairs")
+    num_pairs = st.number_input("Number of conversation pairs to generate:", min_value=1, max_value=100000, value=10, step=1, key="num_pairs")
+    concurrency = st.number_input("Parallel requests (large datasets are generated in shards):", min_value=1, max_value=16, value=dataset_jobs.DATASET_MAX_CONCURRENCY, step=1, key="dataset_concurrency")
+    
+    settings = get_generation_settings()
     
     if st.button("Generate Test Data", key="generate_test_data_button"):
         if topic:
-            with st.spinner("Generating test data..."):
-                test_data = generate_test_data(topic, num_pairs)
-                if test_data:
-                    st.json(test_data)
-                    
-                    # Download options
-                    st.subheader("Download Options")
-                    json_download = get_download_link(json.dumps(test_data, indent=2), "test_data.json", "Download as JSON")
-                    st.markdown(json_download, unsafe_allow_html=True)
-                    
-                    # Create JSONL file
-                    jsonl_content = "\n".join(json.dumps(item) for item in test_data)
-                    jsonl_download = get_download_link(jsonl_content, "test_data.jsonl", "Download as JSONL")
-                    st.markdown(jsonl_download, unsafe_allow_html=True)
+            job = dataset_jobs.DatasetJob.create(topic, num_pairs, settings)
+            st.session_state.dataset_job_id = job.job_id
+            start_dataset_job(job, concurrency)
         else:
             st.warning("Please enter a topic for test data generation.")
 
+    # Resume an interrupted job or reopen a finished one
+    jobs = dataset_jobs.DatasetJob.list_jobs()
+    if jobs:
+        with st.expander("Dataset Jobs"):
+            job_labels = {
+                manifest["job_id"]: f"{manifest['job_id']} | {manifest['topic'][:40]} | {manifest['pairs_written']}/{manifest['num_pairs']} pairs | {manifest['status']}"
+                for manifest in jobs
+            }
+            selected_job_id = st.selectbox("Select a job:", list(job_labels), format_func=job_labels.get, key="dataset_job_select")
+            if st.button("Resume / Open Job", key="resume_dataset_job_button"):
+                job = dataset_jobs.DatasetJob.load(selected_job_id)
+                if not job.is_complete:
+                    start_dataset_job(job, concurrency)
+                st.session_state.dataset_job_id = job.job_id
+
+    # Running jobs, and the last one started in this session, with their progress
+    dataset_handles = session_jobs("dataset")
+    if dataset_handles:
+        show_jobs([handle for handle in dataset_handles[::-1] if not handle.done or handle is dataset_handles[-1]], render_dataset_job)
+
+    # Show the current job's dataset (read back from its JSONL file, so it survives reruns)
+    if st.session_state.get("dataset_job_id"):
+        job = dataset_jobs.DatasetJob.load(st.session_state.dataset_job_id)
+        total_pairs = min(job.pairs_written, job.manifest["num_pairs"])
+        duplicate_summary = job.duplicate_summary()
+        if duplicate_summary:
+            st.caption(duplicate_summary)
+            with st.expander("Duplicate rate per shard"):
+                st.dataframe(
+                    [
+                        {
+                            "shard": shard["index"],
+                            "subtopic": shard["subtopic"],
+                            "pairs": shard["pairs"],
+                            "duplicates": shard.get("duplicates", 0),
+                            "duplicate_rate": round(shard.get("duplicates", 0) / max(shard["pairs"] + shard.get("duplicates", 0), 1), 3),
+                        }
+                        for shard in job.manifest["shards"]
+                        if shard["status"] == "done"
+                    ],
+                    hide_index=True,
+                )
+        if total_pairs:
+            if total_pairs > 100:
+                st.caption(f"Showing the first 100 of {total_pairs} pairs.")
+            st.json(list(itertools.islice(job.read_pairs(), 100)))
+            
+            # Download options: files are written and read only when a button is clicked
+            st.subheader("Download Options")
+            download_columns = st.columns(len(dataset_jobs.DATASET_EXPORT_FORMATS))
+            for column, (export_format, (extension, mime)) in zip(download_columns, dataset_jobs.DATASET_EXPORT_FORMATS.items()):
+                column.download_button(
+                    f"Download as {export_format}",
+                    data=lambda export_format=export_format: dataset_jobs.read_dataset_export(job, export_format),
+                    file_name=f"test_data{extension}",
+                    mime=mime,
+                    on_click="ignore",
+                    key=f"download_dataset_{extension}",
+                )
+
+elif selected == "Compare Models":
+    st.subheader("Compare Models on the Same Input")
+    compare_on = st.radio("Compare on:", ["Prompt", "Dataset shard"], horizontal=True, key="compare_on")
+    if compare_on == "Prompt":
+        compare_task = st.text_area("Enter your question or task:", height=100, key="compare_task")
+        compare_variables = st.text_input("Enter input variables (comma-separated):", key="compare_variables")
+        comparison_input = {"task": compare_task, "variables": compare_variables} if compare_task else None
+    else:
+        compare_topic = st.text_input("Enter your text or topic here:", key="compare_topic")
+        compare_pairs = st.number_input(
+            "Conversation pairs per run:", min_value=1, max_value=toolkit.DATASET_MAX_PAIRS_PER_SHARD, value=10, step=1, key="compare_pairs"
+        )
+        comparison_input = {"topic": compare_topic, "num_pairs": int(compare_pairs)} if compare_topic else None
+    selected_models = st.multiselect("Models:", model_options, default=model_options, key="compare_models")
+    selected_temperatures = st.multiselect(
+        "Temperatures:", COMPARISON_TEMPERATURES, default=[round(st.session_state.temperature, 1)], key="compare_temperatures"
+    )
+    st.caption(f"Every model runs at every temperature, with the sidebar's max output tokens ({st.session_state.max_output_tokens}). Responses are never served from the cache.")
+
+    if st.button("Run Comparison", key="run_comparison_button"):
+        if comparison_input is None:
+            st.warning("Please enter a task or topic.")
+        elif not selected_models or not selected_temperatures:
+            st.warning("Please select at least one model and one temperature.")
+        else:
+            settings_list = [
+                GenerationSettings(model_version, temperature, st.session_state.max_output_tokens)
+                for model_version in selected_models
+                for temperature in selected_temperatures
+            ]
+            label = (comparison_input.get("task") or comparison_input.get("topic"))[:80]
+            submit_job("comparison", label, run_comparison_job, comparison_input, settings_list, COMPARISON_MAX_CONCURRENCY)
+
+    comparison_jobs = session_jobs("comparison")
+    if comparison_jobs:
+        show_jobs([job for job in comparison_jobs[::-1] if not job.done or job is comparison_jobs[-1]], render_comparison_job)
+
+    # Benchmark records from earlier comparisons
+    comparisons = list_comparisons()
+    if comparisons:
+        with st.expander("Saved Comparisons"):
+            comparison_labels = {
+                record["comparison_id"]: f"{record['comparison_id']} | {datetime.datetime.fromtimestamp(record['created_at']).strftime('%Y-%m-%d %H:%M')} | {record['label']}"
+                for record in comparisons
+            }
+            selected_comparison_id = st.selectbox("Select a comparison:", list(comparison_labels), format_func=comparison_labels.get, key="comparison_select")
+            record = next(record for record in comparisons if record["comparison_id"] == selected_comparison_id)
+            show_comparison(record["runs"])
+            st.download_button(
+                "Download comparison as JSON",
+                json.dumps(record, indent=2),
+                file_name=f"comparison-{selected_comparison_id}.json",
+                mime="application/json",
+                on_click="ignore",
+                key="download_saved_comparison",
+            )
+
+elif selected == "Evaluate Prompt":
+    st.subheader("Evaluate a Prompt on a Dataset")
+    saved_prompts = get_prompt_history().search(limit=EVALUATION_HISTORY_CHOICES)
+    if saved_prompts:
+        history_col, use_col = st.columns([4, 1], vertical_alignment="bottom")
+        saved_prompt = history_col.selectbox(
+            "Start from a saved prompt:",
+            saved_prompts,
+            format_func=lambda entry: f"{format_history_time(entry['created_at'])} | {entry['task'][:80]}",
+            key="evaluation_history_select",
+        )
+        use_col.button("Use prompt", key="evaluation_use_history_button", on_click=use_history_template, args=(saved_prompt,))
+    template = st.text_area("Prompt template:", height=200, key="evaluation_template")
+    evaluation_variables = st.text_input("Input variables (comma-separated):", key="evaluation_variables")
+    st.caption(
+        "Placeholders like {question} or {{question}} are filled with each row's field of that name, or with its `human` message "
+        "when the name is one of the input variables. A template without placeholders gets the `human` message appended. "
+        "Outputs are scored against each row's `ai` response."
+    )
+
+    dataset_source = st.radio("Dataset:", ["Upload JSON/JSONL", "Generated dataset"], horizontal=True, key="evaluation_dataset_source")
+    if dataset_source == "Upload JSON/JSONL":
+        dataset_file = st.file_uploader("Upload a dataset", type=["json", "jsonl"], key="evaluation_dataset_upload")
+        dataset_job_id = None
+    else:
+        dataset_file = None
+        manifests = [manifest for manifest in dataset_jobs.DatasetJob.list_jobs() if manifest["pairs_written"]]
+        dataset_job_id = st.selectbox(
+            "Select a dataset:",
+            [manifest["job_id"] for manifest in manifests],
+            format_func=lambda job_id: next(
+                f"{job_id} | {manifest['topic'][:60]} | {manifest['pairs_written']} pairs" for manifest in manifests if manifest["job_id"] == job_id
+            ),
+            key="evaluation_dataset_job",
+        )
+    max_rows = st.number_input("Rows to evaluate (at most):", min_value=1, max_value=EVALUATION_MAX_ROWS, value=1000, step=100, key="evaluation_max_rows")
+    metric_names = st.multiselect("Metrics:", list(evaluation.SCORERS), default=list(evaluation.SCORERS), key="evaluation_metrics")
+    concurrency = st.slider("Requests in flight:", min_value=1, max_value=max(64, EVALUATION_MAX_CONCURRENCY), value=EVALUATION_MAX_CONCURRENCY, key="evaluation_concurrency")
+    st.caption(f"Rows run with the sidebar's model settings ({st.session_state.model_version}, temperature {st.session_state.temperature}) under the shared rate limits.")
+
+    if st.button("Run Evaluation", key="run_evaluation_button"):
+        if not template:
+            st.warning("Please enter a prompt template.")
+        elif not metric_names:
+            st.warning("Please select at least one metric.")
+        elif dataset_file is None and dataset_job_id is None:
+            st.warning("Please upload or select a dataset.")
+        else:
+            try:
+                if dataset_file is not None:
+                    rows = evaluation.parse_dataset(dataset_file.getvalue())[:int(max_rows)]
+                else:
+                    rows = list(dataset_jobs.DatasetJob.load(dataset_job_id).read_pairs(limit=int(max_rows)))
+            except ValueError as e:
+                st.error(f"Could not read the dataset: {e}")
+            else:
+                if not rows:
+                    st.warning("The dataset has no rows.")
+                else:
+                    dataset_name = dataset_file.name if dataset_file is not None else dataset_job_id
+                    submit_job(
+                        "evaluation",
+                        f"{dataset_name}: {len(rows)} rows | {template[:60]}",
+                        run_evaluation_job,
+                        get_generation_settings(),
+                        template,
+                        rows,
+                        evaluation_variables,
+                        metric_names,
+                        concurrency,
+                        get_response_cache(),
+                        st.session_state.bypass_response_cache,
+                    )
+
+    evaluation_jobs = session_jobs("evaluation")
+    if evaluation_jobs:
+        show_jobs([job for job in evaluation_jobs[::-1] if not job.done or job is evaluation_jobs[-1]], render_evaluation_job)
+
 elif selected == "Help":
     st.subheader("How to Use This App")
     st.markdown("""
 1. **Generate Prompt**:
    - Enter your task in the text area.
    - Optionally, provide input variables separated by commas.
-   - Click "Generate Prompt" to create an AI-generated prompt.
+   - Click "Generate Prompt" to create an AI-generated prompt. Prompts are generated in the background, so you can queue several and keep working; each one can be cancelled while it runs.
    - Download the generated prompt as a .txt or JSONL file.
+   - Every generated prompt is saved to "Prompt History". Search it by any word of the task, variables or prompt, filter by model, and click "Reuse" to load a task back into the inputs. A task you have already generated with the same variables and settings, give or take case, punctuation or a word, is answered from history instantly.
 
 2. **Analyze File**:
    - **Upload multiple files** of any type supported by Gemini (CSV, TXT, MD, PDF, images, audio, video, etc.).
    - **Enter an analysis prompt** to guide the AI in analyzing the uploaded files.
    - Click "Analyze File" to initiate the analysis. The AI will process the files and provide insights based on your prompt.
-   - **Engage in a chat with the AI** about the uploaded files. Enter your message in the text area and click "Send". The AI will respond based on the file content and your previous messages.
-   - Use the "Clear Uploaded Files" button to remove all uploaded files from the app.
+   - **Engage in a chat with the AI** about the uploaded files. Enter your message in the text area and click "Send". The AI will respond based on the file content and your previous messages. Replies, and the wait for newly uploaded files to be processed, run in the background, so the rest of the app stays responsive.
+   - Uploads are kept only for your session, and identical files are stored once. Use the "Clear Uploaded Files" button to remove your uploaded files from the app.
 
 3. **Generate Synthetic Data conversation pairs and datasets for Fine Tuning AI/LLM Models**:
    - Enter a topic or text for test data (also referred to as synthetic data) generation.
    - Specify the number of conversation pairs to generate.
-   - Click "Generate Test Data" to create conversation pairs.
-   - Download the generated conversation pairs data in JSON or JSONL format for fine tuning an LLM.
-
-4. **Sidebar Options**:
+   - Click "Generate Test Data" to create conversation pairs. Generation runs in the background with a progress bar and a Cancel button; a cancelled job can be resumed from "Dataset Jobs".
+   - Near-duplicate pairs are dropped automatically; the duplicate rate of each shard is shown under "Duplicate rate per shard".
+   - Download the generated conversation pairs data in JSON, JSONL, compressed JSONL or Parquet format for fine tuning an LLM.
+
+4. **Compare Models**:
+   - Enter a task (or a topic, to compare on a dataset shard), then select the models and temperatures to try.
+   - Click "Run Comparison" to run every combination at once. Latency, time to first token, tokens and output are shown side by side as each run finishes.
+   - Each comparison is saved under `comparisons/` as a benchmark record, and can be reopened or downloaded from "Saved Comparisons".
+
+5. **Evaluate Prompt**:
+   - Enter a prompt template, or start from a saved prompt, and the input variables it uses.
+   - Upload a JSON or JSONL dataset, or pick one generated on "Generate Dataset". Each row's fields fill the template's `{placeholders}`, and each output is scored against the row's `ai` response.
+   - Choose the metrics (exact match, token overlap, length ratio, JSON validity) and click "Run Evaluation". Rows run concurrently in the background, and the mean scores update as they finish.
+   - Download every row's output and scores as JSONL when the run is done.
+
+6. **Sidebar Options**:
    - Enter your Gemini API key.
    - Select the Gemini model version.
    - Adjust temperature and max output tokens for generation.
+   - Repeated requests are answered from a local response cache. Tick "Bypass response cache (refresh)" to force a fresh generation, or click "Clear response cache" to empty it.
+   - Toggle "Stream responses" to see generated prompts and chat replies as they are written, with time-to-first-token and total latency shown below each one.
 
-5. **Tips for Better Results**:
+7. **Tips for Better Results**:
    - Be specific in your task description.
    - Experiment with different temperature settings.
    - For file analysis, provide clear instructions in the analysis prompt.
@@ -502,16 +1254,52 @@ st.sidebar.warning(
 )
 
 # Add version information
-st.sidebar.info(f"App Version: 1.9.0 | Using Gemini Model: {st.session_state.model_version}")
-# Debug Information (only visible when running in debug mode)
-if os.environ.get("DEBUG_MODE") == "True":
-    st.sidebar.subheader("Debug Information")
-    st.sidebar.json({
-        "Temperature": st.session_state.temperature,
-        "Max Output Tokens": st.session_state.max_output_tokens,
-        "Model Version": st.session_state.model_version,
-        "API Configured": st.session_state.api_configured
-    })
+st.sidebar.info(f"App Version: 1.10.0 | Using Gemini Model: {st.session_state.model_version}")
+
+# Per-call performance metrics, shared by every session in this process
+@st.cache_resource
+def start_metrics_server(port):
+    """Starts the Prometheus /metrics endpoint once per process. Returns the error if the port is unavailable."""
+    try:
+        return metrics.serve_metrics(port)
+    except OSError as e:
+        return e
+
+def format_metric_row(row):
+    """Rounds seconds for display and shows a call's start as a local time."""
+    row = {name: round(value, 3) if isinstance(value, float) else value for name, value in row.items()}
+    if "started_at" in row:
+        row["started_at"] = datetime.datetime.fromtimestamp(row["started_at"]).strftime("%H:%M:%S")
+    return row
+
+if METRICS_PORT:
+    metrics_server = start_metrics_server(METRICS_PORT)
+    if isinstance(metrics_server, OSError):
+        st.sidebar.warning(f"Could not serve metrics on port {METRICS_PORT}: {metrics_server}")
+
+with st.sidebar.expander("Performance Metrics"):
+    registry = metrics.get_metrics()
+    summary = registry.summary()
+    if summary:
+        st.dataframe([format_metric_row(row) for row in summary], hide_index=True)
+        st.caption("Recent calls")
+        st.dataframe([format_metric_row(row) for row in registry.recent_calls()[:20]], hide_index=True)
+    else:
+        st.caption("No Gemini calls yet.")
+    scheduler_stats = toolkit.get_scheduler().stats
+    st.caption(
+        f"Rate limiter: {scheduler_stats['calls']} calls, {scheduler_stats['retries']} retries, "
+        f"{scheduler_stats['failures']} failures, {scheduler_stats['throttled_s']:.1f}s throttled"
+    )
+    calibration = token_accounting.calibration_ratios()
+    if calibration:
+        st.caption("Gemini tokens per local token: " + ", ".join(f"{model} {ratio:.2f}" for model, ratio in sorted(calibration.items())))
+    st.download_button("Download Prometheus metrics", registry.prometheus_text(), file_name="gemini_metrics.prom", mime="text/plain", key="download_metrics_button")
+    if METRICS_PORT:
+        st.caption(f"Scrape endpoint: http://localhost:{METRICS_PORT}/metrics")
+    if st.button("Reset metrics", key="reset_metrics_button"):
+        registry.reset()
+        st.rerun()
 
 # Error Handling
 def handle_error(error):
@@ -530,6 +1318,74 @@ except Exception as e:
 with st.sidebar.expander("Release Notes"):
     st.markdown("""
     
+    ### Version 1.10.0 - Performance and Scale
+
+- **Local Response Cache:**
+    - Identical Generate Prompt and Generate Test Data requests are served from a local on-disk cache.
+    - Use "Bypass response cache (refresh)" or "Clear response cache" in the sidebar to force fresh results.
+- **Upload Reuse:**
+    - Analyze File remembers uploaded files by content hash and reuses the existing Gemini upload on reruns and in later sessions.
+    - New files are uploaded in parallel and their processing state is polled concurrently with adaptive backoff.
+- **Streaming Responses:**
+    - Generated prompts and chat replies render as they stream in (toggle "Stream responses" in the sidebar).
+    - Time to first token and total latency are shown under each response.
+- **Incremental Test Data Parsing:**
+    - Conversation pairs are parsed as they stream in, and a truncated response keeps every complete pair.
+- **Large Datasets:**
+    - Requests beyond 50 pairs are split into shards sized from the measured tokens per pair, seeded with distinct sub-topics and generated in parallel (up to 100,000 pairs).
+    - Every generation runs as a job with an ID. Completed shards are appended to `datasets/<job_id>.jsonl` and checkpointed, so an interrupted job can be resumed from "Dataset Jobs".
+    - Downloads are written from the job file only when clicked, as JSON, JSONL, gzip/zstd JSONL or Parquet.
+- **Faster Startup:**
+    - Lottie animations are read from `media/lottie` (vendored with `media/lottie/download_lottie_assets.py`) and nothing is fetched over the network at startup.
+    - Gemini, pandas, PDF and tokenizer libraries are imported only when a feature needs them.
+- **Batch Prompt Generation:**
+    - `batch_generate.py` generates prompts for a JSONL file of tasks concurrently from the command line and streams the results to a JSONL file.
+    - Generation logic lives in `gemini_toolkit.py`, which takes explicit settings and can be used outside Streamlit.
+- **Rate Limiting and Retries:**
+    - Every Gemini call goes through one shared scheduler with per-model requests-per-minute and tokens-per-minute limits.
+    - Rate-limit (429) and server errors are retried with jittered exponential backoff, honouring the server's retry hints.
+    - Interactive requests take priority over dataset jobs and batch runs.
+- **Persistent File Chat:**
+    - The Analyze File chat keeps its conversation across reruns and remembers earlier questions.
+    - Large file sets are stored once in a Gemini context cache, so follow-up questions only send the new turn.
+- **Local Retrieval Mode:**
+    - Turn on "Retrieval mode" in Analyze File to index PDF, CSV, TXT and Markdown uploads locally instead of sending them whole.
+    - Each message sends only the best-matching passages (BM25 ranking) within a token budget, and shows which passages were used.
+    - Indexes are saved per document under `.cache/retrieval`, so re-uploading the same document is instant.
+- **Offline Benchmarks:**
+    - `benchmarks/gemini_benchmark.py` measures generation, uploads and file parsing against a local mock Gemini server, with no API key needed.
+    - Reports p50/p95/p99 latency and throughput, and fails when a scenario regresses against the recorded baseline.
+- **Performance Metrics:**
+    - Every Gemini call records queue time, time to first token, total latency, tokens and retries; uploads record file size and processing time.
+    - The "Performance Metrics" sidebar panel shows percentiles per operation and recent calls, and exports Prometheus metrics (set `METRICS_PORT` to serve `/metrics`).
+    - LangSmith tracing is sampled (`LANGSMITH_SAMPLE_RATE`, default 10%) and sent in the background.
+- **Context Window Checks:**
+    - Prompts, uploads and chat messages are checked against the model's context window before they are sent, using local token counts calibrated against Gemini's.
+    - Oversized requests are rejected immediately, and the earliest chat messages are dropped when a conversation outgrows the window.
+- **Background Jobs:**
+    - Prompt generation, dataset generation, file processing waits and chat replies run on a shared worker pool instead of blocking the page.
+    - Their status, streamed partial results and a Cancel button refresh in place every second, and clicking around the app no longer abandons them.
+    - Several prompts can be queued at once; a dataset job that is already running is never started twice.
+- **Model Comparison:**
+    - "Compare Models" runs the same prompt, or a dataset shard, with several models and temperatures concurrently.
+    - Latency, time to first token, tokens, throughput and output are shown side by side, and each comparison is saved as a benchmark record under `comparisons/`.
+- **Dataset Deduplication:**
+    - Each generated shard is checked against every pair already in the dataset with a MinHash/LSH index, and near-duplicate pairs are dropped before they are written.
+    - The duplicate rate is reported per shard, and shards are topped up to make up for dropped pairs.
+    - The index is saved next to the dataset (`datasets/<job_id>.minhash`) and resumes with it.
+- **Prompt History:**
+    - Every generated prompt is saved with its task, variables, model settings, latency and token counts in a local SQLite database (`.cache/prompt_history.sqlite3`).
+    - The "Prompt History" panel searches them with a full-text index, filters by model, and reuses or deletes entries.
+    - Repeating a task, or a near-identical wording of it, with the same variables and settings returns the saved prompt instantly.
+- **Prompt Evaluation:**
+    - "Evaluate Prompt" scores a prompt template against a JSON/JSONL or generated dataset, filling its variable placeholders from each row.
+    - Rows run concurrently under the shared rate limits, and mean exact match, token overlap, length ratio and JSON validity update as they finish.
+    - `evaluate_prompt.py` runs the same evaluation from the command line.
+- **Upload Storage:**
+    - Analyze File uploads are kept per session under `.cache/upload_store`, so one user's files can no longer overwrite or clear another's.
+    - Files are streamed to disk and stored once per content hash, and the least recently used are evicted above a size quota (`UPLOAD_STORE_MAX_BYTES`, default 2 GB).
+    - Local parsing reads stored files through mmap instead of copying them into memory.
+
     ### Version 1.9.0 - AUG 28, 2024 Gemini Model Updates
 
 - **Advanced File Upload and Chat:**
@@ -581,8 +1437,6 @@ def load_static_resources():
 
 load_static_resources()
 
-@traceable # Langsmith Tracing and Observability
-
 # Ensure all session state variables are initialized
 def initialize_session_state():
     default_values = {
@@ -590,7 +1444,6 @@ def initialize_session_state():
         "max_output_tokens": 8192,
         "model_version": "gemini-1.5-flash",
         "api_configured": False,
-        "generated_prompts": [],
         "analyzed_files": []
     }
     for key, value in default_values.items():